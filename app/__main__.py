@@ -1,28 +1,78 @@
+import argparse
 import sys
-from http.server import HTTPServer
+from pathlib import Path
 
-from app.config import config
 from app.container import container
 from app.database.db_init import init_db
-from app.routing.request_handler import RequestHandler
+from app.server import serve
 
+IMPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+IMPORT_EXTENSIONS = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
 
-def main() -> None:
+
+def parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("serve", help="run the HTTP server (default)")
+    import_parser = commands.add_parser(
+        "import",
+        help="insert or update exchange rates from a CSV or NDJSON file",
+    )
+    import_parser.add_argument("path", help="file to import, - for stdin")
+    import_parser.add_argument(
+        "--format",
+        choices=sorted(IMPORT_FORMATS),
+        help="file format, by default taken from the file extension",
+    )
+    return parser.parse_args(argv)
+
+
+def import_rates(path: str, file_format: str | None) -> int:
+    """Import exchange rates file, print the report and return exit code."""
+    file_format = file_format or IMPORT_EXTENSIONS.get(Path(path).suffix)
+    if file_format is None:
+        print("Cannot tell the file format, use --format", file=sys.stderr)
+        return 2
+
+    if path == "-":
+        report = container.exchange_rates_controller.import_lines(
+            sys.stdin, IMPORT_FORMATS[file_format]
+        )
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as file:
+            report = container.exchange_rates_controller.import_lines(
+                file, IMPORT_FORMATS[file_format]
+            )
+
+    for error in report.errors:
+        print(f"line {error.line}: {error.error}", file=sys.stderr)
+    print(
+        f"Created {report.created}, updated {report.updated} exchange rates, "
+        f"{len(report.errors)} rows failed"
+    )
+    return 1 if report.errors else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
     init_db()
-    RequestHandler.configurate(container.router, container.response_renderer)
+    if args.command == "import":
+        return import_rates(args.path, args.format)
 
-    server = HTTPServer((config.host, config.port), RequestHandler)
-    print(f"Start server on: {config.host}:{config.port}")
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        server.server_close()
-        print("Server has stopped")
+    serve(
+        container.dispatcher,
+        on_stop=container.exchange_rates_service.flush_rate_updates,
+    )
+    print("Server has stopped")
+    return 0
 
 
 if __name__ == "__main__":
     try:
-        main()
+        sys.exit(main())
     except Exception as error:
         print(f"Unexpected error: {error}")
         sys.exit(1)
@@ -0,0 +1,354 @@
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+
+from app.config import config
+from app.event_broker import rate_events
+from app.metrics import WRITE, RequestTimer, metrics
+from app.routing.dispatcher import SUPPORTED_METHODS, RequestDispatcher
+from app.view.response import Response
+
+
+class BadRequest(Exception):
+    """Malformed HTTP request, the connection is closed after reply."""
+
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class AsyncHTTPServer:
+    """
+    Minimal HTTP/1.1 server on top of asyncio streams.
+
+    Every connection is a coroutine, so idle keep-alive connections cost
+    no threads. Requests are read and answered one after another, which
+    keeps pipelined responses in order. The dispatcher (router, services,
+    DAO) is blocking, so it runs on a bounded thread pool.
+    """
+
+    def __init__(
+        self,
+        dispatcher: RequestDispatcher,
+        host: str = config.host,
+        port: int = config.port,
+        max_workers: int = config.server_max_workers,
+    ) -> None:
+        self.dispatcher = dispatcher
+        self.host = host
+        self.port = port
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="async-worker"
+        )
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            self.host,
+            self.port,
+            limit=config.max_request_header_bytes,
+            backlog=config.server_request_queue_size,
+        )
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        assert self._server is not None
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        self._executor.shutdown(wait=True)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Serve requests of one connection until it should be closed."""
+        loop = asyncio.get_running_loop()
+        served = 0
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        self._read_request(reader),
+                        timeout=config.keep_alive_timeout,
+                    )
+                except BadRequest as e:
+                    await self._write_response(
+                        writer,
+                        Response.render({"message": e.message}, e.status),
+                        keep_alive=False,
+                    )
+                    break
+                if request is None:
+                    break
+
+                method, target, version, headers, body = request
+                timer = RequestTimer(method)
+                served += 1
+                keep_alive = self._should_keep_alive(
+                    version, headers, served
+                )
+
+                if method not in SUPPORTED_METHODS:
+                    response = Response.render(
+                        {"message": f"Unsupported method ({method})"},
+                        HTTPStatus.NOT_IMPLEMENTED,
+                    )
+                else:
+                    response = await loop.run_in_executor(
+                        self._executor,
+                        self.dispatcher.dispatch,
+                        method,
+                        target,
+                        headers,
+                        body,
+                        timer,
+                    )
+                timer.restart()
+                if isinstance(response[0], bytes):
+                    await self._write_response(writer, response, keep_alive)
+                else:
+                    # Without chunked encoding the end of the body is
+                    # marked by closing the connection
+                    chunked = version != "HTTP/1.0"
+                    keep_alive = keep_alive and chunked
+                    await self._write_stream(
+                        writer, response, keep_alive, chunked
+                    )
+                timer.mark(WRITE)
+                metrics.finish_request(timer, response[1])
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    @staticmethod
+    async def _read_request(
+        reader: asyncio.StreamReader,
+    ) -> tuple[str, str, str, dict[str, str], bytes] | None:
+        """
+        Read one request from the stream.
+
+        Returns None when the client closed the connection between requests.
+        """
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial.strip():
+                return None
+            raise BadRequest(HTTPStatus.BAD_REQUEST, "Incomplete request")
+        except asyncio.LimitOverrunError:
+            raise BadRequest(
+                HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                "Request header too large",
+            )
+
+        lines = head.decode("latin-1").split("\r\n")
+        # Tolerate empty lines preceding the request line (RFC 9112 2.2)
+        while lines and not lines[0]:
+            lines.pop(0)
+        try:
+            method, target, version = lines[0].split(" ")
+        except (IndexError, ValueError):
+            raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad request line")
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise BadRequest(
+                HTTPStatus.HTTP_VERSION_NOT_SUPPORTED,
+                f"Unsupported HTTP version ({version})",
+            )
+
+        headers: dict[str, str] = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, sep, value = line.partition(":")
+            if not sep or not name or name != name.strip():
+                raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad header line")
+            name = name.lower()
+            value = value.strip()
+            if name in headers:
+                headers[name] = f"{headers[name]}, {value}"
+            else:
+                headers[name] = value
+
+        body = await AsyncHTTPServer._read_body(reader, headers)
+        return method, target, version, headers, body
+
+    @staticmethod
+    async def _read_body(
+        reader: asyncio.StreamReader, headers: dict[str, str]
+    ) -> bytes:
+        """Read request body framed by Content-Length or chunked encoding."""
+        transfer_encoding = headers.get("transfer-encoding", "").lower()
+        if transfer_encoding:
+            if transfer_encoding != "chunked":
+                raise BadRequest(
+                    HTTPStatus.NOT_IMPLEMENTED,
+                    "Unsupported Transfer-Encoding",
+                )
+            return await AsyncHTTPServer._read_chunked_body(reader)
+
+        raw_length = headers.get("content-length", "0")
+        if not raw_length.isdigit():
+            raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad Content-Length")
+        content_length = int(raw_length)
+        if content_length > config.max_request_body_bytes:
+            raise BadRequest(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large"
+            )
+        if content_length == 0:
+            return b""
+        try:
+            return await reader.readexactly(content_length)
+        except asyncio.IncompleteReadError:
+            raise BadRequest(HTTPStatus.BAD_REQUEST, "Incomplete body")
+
+    @staticmethod
+    async def _read_chunked_body(reader: asyncio.StreamReader) -> bytes:
+        chunks: list[bytes] = []
+        total = 0
+        try:
+            while True:
+                size_line = await reader.readuntil(b"\r\n")
+                size_str = size_line.split(b";", 1)[0].strip()
+                try:
+                    size = int(size_str, 16)
+                except ValueError:
+                    raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad chunk size")
+                if size == 0:
+                    # Skip optional trailer fields
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    return b"".join(chunks)
+                total += size
+                if total > config.max_request_body_bytes:
+                    raise BadRequest(
+                        HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                        "Request body too large",
+                    )
+                chunks.append(await reader.readexactly(size))
+                if await reader.readexactly(2) != b"\r\n":
+                    raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad chunk")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            raise BadRequest(HTTPStatus.BAD_REQUEST, "Bad chunked body")
+
+    @staticmethod
+    def _should_keep_alive(
+        version: str, headers: dict[str, str], served: int
+    ) -> bool:
+        connection = headers.get("connection", "").lower()
+        if served >= config.keep_alive_max_requests:
+            return False
+        if version == "HTTP/1.1":
+            return "close" not in connection
+        return "keep-alive" in connection
+
+    @staticmethod
+    async def _write_response(
+        writer: asyncio.StreamWriter,
+        response: tuple[bytes, int, dict[str, str]],
+        keep_alive: bool,
+    ) -> None:
+        body, status, headers = response
+        if status != HTTPStatus.NOT_MODIFIED:
+            headers.setdefault("Content-Length", str(len(body)))
+        writer.write(
+            AsyncHTTPServer._response_head(status, headers, keep_alive) + body
+        )
+        await writer.drain()
+
+    @staticmethod
+    def _response_head(
+        status: int, headers: dict[str, str], keep_alive: bool
+    ) -> bytes:
+        status = HTTPStatus(status)
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        headers["Date"] = formatdate(usegmt=True)
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _write_stream(
+        self,
+        writer: asyncio.StreamWriter,
+        response: tuple[
+            Iterator[bytes] | AsyncIterator[bytes], int, dict[str, str]
+        ],
+        keep_alive: bool,
+        chunked: bool,
+    ) -> None:
+        """
+        Write a streamed body as its chunks are produced on the thread
+        pool, or on the event loop if the body is an async iterator
+        (event streams). If producing fails midway the connection is
+        closed without the last chunk, so the client sees the response
+        is incomplete.
+        """
+        chunks, status, headers = response
+        if chunked:
+            headers["Transfer-Encoding"] = "chunked"
+        writer.write(self._response_head(status, headers, keep_alive))
+
+        if isinstance(chunks, AsyncIterator):
+            try:
+                async for chunk in chunks:
+                    await self._write_chunk(writer, chunk, chunked)
+            finally:
+                aclose = getattr(chunks, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+        else:
+            loop = asyncio.get_running_loop()
+            while True:
+                try:
+                    chunk = await loop.run_in_executor(
+                        self._executor, next, chunks, None
+                    )
+                except Exception as e:
+                    writer.close()
+                    raise ConnectionError(
+                        f"Streaming response failed: {e!r}"
+                    )
+                if chunk is None:
+                    break
+                await self._write_chunk(writer, chunk, chunked)
+        if chunked:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+    @staticmethod
+    async def _write_chunk(
+        writer: asyncio.StreamWriter, chunk: bytes, chunked: bool
+    ) -> None:
+        if not chunk:
+            return
+        if chunked:
+            chunk = b"%x\r\n%b\r\n" % (len(chunk), chunk)
+        writer.write(chunk)
+        await writer.drain()
+
+
+def serve_async(dispatcher: RequestDispatcher) -> None:
+    """Run the asyncio front end until interrupted."""
+    server = AsyncHTTPServer(dispatcher)
+    print(f"Start server on: {config.host}:{config.port} (asyncio)")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rate_events.close()
+        server.close()
@@ -1,3 +1,4 @@
+import os
 from dataclasses import dataclass
 from decimal import Decimal
 from pathlib import Path
@@ -5,17 +6,59 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
 DATA_DIR.mkdir(exist_ok=True)
-DEFAULT_DB_PATH = DATA_DIR / "database.db"
+DEFAULT_DB_PATH = Path(
+    os.environ.get("CURRENCY_EXCHANGE_DB_PATH", DATA_DIR / "database.db")
+)
 
 
 @dataclass(frozen=True)
 class Configuration:
     # Server
-    host: str = "127.0.0.1"
-    port: int = 8000
+    host: str = os.environ.get("CURRENCY_EXCHANGE_HOST", "127.0.0.1")
+    port: int = int(os.environ.get("CURRENCY_EXCHANGE_PORT", 8000))
+    # "single" - one request at a time,
+    # "threaded" - bounded pool of worker threads,
+    # "prefork" - several processes sharing the port via SO_REUSEPORT,
+    # "asyncio" - event loop front end, handlers run on a thread pool
+    server_mode: str = os.environ.get(
+        "CURRENCY_EXCHANGE_SERVER_MODE", "threaded"
+    )
+    server_max_workers: int = 16
+    server_processes: int = os.cpu_count() or 1
+    server_request_queue_size: int = 128
+    keep_alive_timeout: float = 5.0
+    keep_alive_max_requests: int = 100
+    max_request_header_bytes: int = 64 * 1024
+    max_request_body_bytes: int = 1024 * 1024
 
     # Database
     db_path: Path = DEFAULT_DB_PATH
+    db_pool_size: int = 16
+    db_pool_timeout: float = 5.0
+    db_pool_health_check_interval: float = 30.0
+    db_busy_timeout: float = 5.0
+    db_journal_mode: str = "WAL"
+    db_synchronous: str = "NORMAL"
+    db_mmap_size: int = 256 * 1024 * 1024
+    # Negative value is in KiB
+    db_cache_size: int = -16 * 1024
+    # Compiled statements kept per connection, at least all registered
+    # queries are kept
+    db_statement_cache_size: int = 128
+    # Statements taking longer are logged and their plan is captured,
+    # None disables the slow query log
+    db_slow_query_ms: float | None = 100.0
+    # Latest slow executions kept for GET /admin/queries
+    db_slow_query_log_size: int = 100
+    # Admin endpoints (GET /admin/queries) are served only to requests
+    # with an X-Admin-Token header equal to this, not set disables them
+    admin_token: str | None = (
+        os.environ.get("CURRENCY_EXCHANGE_ADMIN_TOKEN") or None
+    )
+    # Seconds between checks for writes of other processes sharing the
+    # database, which drop the in-process state of the written tables.
+    # 0 checks on every request, None disables the checks
+    db_change_poll_interval: float | None = 0.1
 
     # Domain constraints, "magic numbers" centralized here
     code_length: int = 3
@@ -27,6 +70,57 @@ class Configuration:
     max_decimal_rate_places: int = 6
     max_decimal_amount_places: int = 2
 
+    # Exchange calculation
+    cross_rate_currency: str = "USD"
+    rate_graph_max_hops: int = 3
+    # Precompute rates of all currency pairs, worth it for dense rate sets
+    rate_matrix_enabled: bool = False
+    max_batch_items: int = 10000
+
+    # Write-behind of PATCH /exchangeRate/{pair} updates: updates of a
+    # pair within the window are coalesced, the latest wins, and written
+    # in one transaction. 0 writes every update right away
+    rate_write_behind_window: float = 0.0
+    # Respond to a buffered update only once it is committed
+    rate_write_behind_durable: bool = False
+
+    # Rendered responses of the list endpoints, invalidated by writes
+    response_cache_enabled: bool = True
+
+    # Server-sent events of rate changes. Events queued per subscriber,
+    # a subscriber falling further behind is dropped
+    sse_queue_size: int = 256
+    sse_max_subscribers: int = 10000
+    # Subscribers in the thread pool modes, where each one holds a worker
+    # thread while connected. Kept well below server_max_workers so other
+    # requests are still served. "single" mode serves no event streams
+    sse_thread_max_subscribers: int = 4
+    # Seconds without events before a heartbeat comment is sent
+    sse_heartbeat_interval: float = 15.0
+    # Reconnection delay suggested to clients
+    sse_retry_ms: int = 3000
+
+    # Request profiling with cProfile and tracemalloc, reports are
+    # written to profiling_dir. Profile this fraction of requests, 0
+    # disables sampling
+    profiling_sample_rate: float = 0.0
+    # Requests with an X-Profile-Token header equal to this are always
+    # profiled, not set disables the header
+    profiling_token: str | None = (
+        os.environ.get("CURRENCY_EXCHANGE_PROFILING_TOKEN") or None
+    )
+    profiling_dir: Path = DATA_DIR / "profiles"
+    # Reports kept per route, the oldest one is overwritten
+    profiling_max_reports: int = 20
+    # Functions and allocating lines listed in a report
+    profiling_top_entries: int = 30
+
+    # List endpoints
+    max_page_size: int = 1000
+    # Rows read per query when streaming a whole list
+    stream_page_size: int = 500
+    # Streamed JSON is sent in chunks of at least this many bytes
+    stream_chunk_bytes: int = 16 * 1024
 
 
 config = Configuration()
@@ -1,17 +1,32 @@
+from app.config import config
 from app.controllers.currency_controller import CurrencyController
 from app.controllers.exchange_controller import ExchangeController
 from app.controllers.exchange_rates_controller import ExchangeRatesController
+from app.controllers.metrics_controller import MetricsController
+from app.database.change_tracker import (
+    CURRENCIES_TABLE,
+    EXCHANGE_RATES_TABLE,
+    change_tracker,
+)
 from app.database.currency_dao import CurrencyDAO
+from app.database.data_version import data_version
 from app.database.exchange_rate_dao import ExchangeRateDAO
+from app.database.query_registry import query_registry
+from app.event_broker import rate_events
 from app.mappers.currency_mapper import CurrencyMapper
 from app.mappers.exchange_rate_mapper import ExchangeRateMapper
+from app.metrics import metrics
+from app.profiler import RequestProfiler
+from app.routing.dispatcher import RequestDispatcher
 from app.routing.router import Router
 from app.routing.routes import setup_currency_routes
 from app.services.currency_service import CurrencyService
 from app.services.exchange_rate_service import ExchangeRateService
 from app.validations.currency_validator import CurrencyValidator
 from app.validations.exchange_rate_validator import ExchangeRateValidator
+from app.validations.pagination_validator import PaginationValidator
 from app.view.response import Response
+from app.view.response_cache import ResponseCache
 
 
 class Container:
@@ -22,7 +37,16 @@ class Container:
     # Utils
     currency_validator = CurrencyValidator()
     exchange_rates_validator = ExchangeRateValidator(currency_validator)
+    pagination_validator = PaginationValidator()
     response_renderer = Response()
+    response_cache = ResponseCache(enabled=config.response_cache_enabled)
+    profiler = RequestProfiler(
+        config.profiling_dir,
+        sample_rate=config.profiling_sample_rate,
+        token=config.profiling_token,
+        max_reports=config.profiling_max_reports,
+        top_entries=config.profiling_top_entries,
+    )
 
     # Mappers
     currency_mapper = CurrencyMapper()
@@ -33,29 +57,50 @@ class Container:
     exchange_rates_dao = ExchangeRateDAO(exchange_rates_mapper)
 
     # Services
-    currency_service = CurrencyService(currency_dao, currency_mapper)
+    currency_service = CurrencyService(
+        currency_dao, currency_mapper, response_cache
+    )
     exchange_rates_service = ExchangeRateService(
         exchange_rates_dao,
         currency_dao,
         exchange_rates_mapper,
-        currency_mapper
+        currency_mapper,
+        response_cache,
+        write_behind_window=config.rate_write_behind_window,
+        write_behind_durable=config.rate_write_behind_durable,
+        rate_matrix_enabled=config.rate_matrix_enabled,
+    )
+    # Writes of other processes drop the state derived from the table
+    change_tracker.subscribe(
+        CURRENCIES_TABLE, currency_service.invalidate_cached_currencies
+    )
+    change_tracker.subscribe(
+        EXCHANGE_RATES_TABLE, exchange_rates_service.invalidate_cached_rates
     )
 
     # Controllers
     currency_controller = CurrencyController(
-        currency_service, currency_validator, currency_mapper
+        currency_service,
+        currency_validator,
+        currency_mapper,
+        pagination_validator,
     )
     exchange_rates_controller = ExchangeRatesController(
         exchange_rates_service,
         exchange_rates_validator,
         exchange_rates_mapper,
-        currency_validator
+        currency_validator,
+        pagination_validator,
+        rate_events,
     )
     exchange_controller = ExchangeController(
         exchange_rates_service,
         exchange_rates_validator,
         currency_validator
     )
+    metrics_controller = MetricsController(
+        metrics, response_cache, query_registry
+    )
 
     # Router
     router = Router()
@@ -63,7 +108,17 @@ class Container:
         router,
         currency_controller,
         exchange_rates_controller,
-        exchange_controller
+        exchange_controller,
+        metrics_controller,
+    )
+    dispatcher = RequestDispatcher(
+        router,
+        response_renderer,
+        response_cache,
+        data_version,
+        profiler,
+        change_tracker,
+        admin_token=config.admin_token,
     )
 
 container = Container()
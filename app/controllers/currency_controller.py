@@ -1,9 +1,11 @@
+from collections.abc import Iterator
 from http import HTTPStatus
 
 from app.dtos.currency_dto import CurrencyDTO
 from app.mappers.currency_mapper import CurrencyMapper
 from app.services.currency_service import CurrencyService
 from app.validations.currency_validator import CurrencyValidator
+from app.validations.pagination_validator import PaginationValidator
 
 
 class CurrencyController:
@@ -12,16 +14,33 @@ class CurrencyController:
         currency_service: CurrencyService,
         currency_validator: CurrencyValidator,
         currency_mapper: CurrencyMapper,
+        pagination_validator: PaginationValidator,
     ) -> None:
         self.currency_service = currency_service
         self.currency_validator = currency_validator
         self.currency_mapper = currency_mapper
+        self.pagination_validator = pagination_validator
 
     def handle_get_currencies(
-        self, **_kwargs
-    ) -> tuple[list[CurrencyDTO], HTTPStatus]:
-        """Get all currencies."""
-        currencies = self.currency_service.get_currencies()
+        self, limit: str = "", after: str = "", stream: str = "", **_kwargs
+    ) -> tuple[list[CurrencyDTO] | Iterator[CurrencyDTO], HTTPStatus]:
+        """
+        Get all currencies, or a page of ``limit`` currencies with ids
+        greater than ``after``. With ``stream`` they are streamed.
+        """
+        validated_limit, validated_after, validated_stream = (
+            self.pagination_validator.validate_page_params(
+                limit, after, stream
+            )
+        )
+        if validated_stream:
+            currencies = self.currency_service.iter_currencies(
+                validated_after, validated_limit
+            )
+        else:
+            currencies = self.currency_service.get_currencies(
+                validated_after, validated_limit
+            )
         return currencies, HTTPStatus.OK
 
     def handle_get_currency(
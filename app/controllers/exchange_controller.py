@@ -1,6 +1,15 @@
+from decimal import Decimal
 from http import HTTPStatus
+from typing import Any
 
+from app.config import config
+from app.dtos.batch_exchange_item_dto import BatchExchangeItemDTO
 from app.dtos.calculated_exchange_dto import CalculatedExchangeDTO
+from app.exceptions import (
+    ApplicationException,
+    InvalidBatchError,
+    ValidationError,
+)
 from app.services.exchange_rate_service import ExchangeRateService
 from app.validations.currency_validator import CurrencyValidator
 from app.validations.exchange_rate_validator import ExchangeRateValidator
@@ -20,23 +29,121 @@ class ExchangeController:
     def handle_get_exchange(
         self, **kwargs: dict
     ) -> tuple[CalculatedExchangeDTO, HTTPStatus]:
-        """Handles currency exchange calculation."""
+        """
+        Handles currency exchange calculation, with the rates of the
+        moment ``at`` if it is given.
+        """
         from_code = str(kwargs.get("from", ""))
         to_code = str(kwargs.get("to", ""))
         amount = str(kwargs.get("amount", ""))
+        at = str(kwargs.get("at", ""))
 
-        validated_from = self.currency_validator.validate_currency_code(
-            from_code
-        )
-        validated_to = self.currency_validator.validate_currency_code(to_code)
-        validated_amount = self.exchange_rates_validator.validate_amount(
-            amount
+        validated_from, validated_to, validated_amount = (
+            self._validate_exchange(from_code, to_code, amount)
         )
+        validated_at = self.exchange_rates_validator.validate_timestamp(at)
 
         calculated_dto = self.exchange_rates_service.calculate_exchange(
             from_code=validated_from,
             to_code=validated_to,
             amount=validated_amount,
+            at=validated_at,
         )
 
         return calculated_dto, HTTPStatus.OK
+
+    def handle_post_exchange_batch(
+        self, items: Any = None, **kwargs: Any
+    ) -> tuple[list[BatchExchangeItemDTO], HTTPStatus]:
+        """
+        Handles calculation of many exchanges in one request.
+
+        Items come either as a JSON array (or ``{"items": [...]}``) of
+        ``{"from", "to", "amount"}`` objects or ``[from, to, amount]``
+        arrays, or as parallel ``from[]``, ``to[]``, ``amount[]`` form
+        fields. Every item gets either a result or an error, in input order.
+        """
+        raw_items = self._collect_batch_items(items, kwargs)
+
+        results: list[BatchExchangeItemDTO | None] = []
+        valid_items: list[tuple[str, str, Decimal]] = []
+        for raw_item in raw_items:
+            try:
+                valid_items.append(
+                    self._validate_exchange(*self._unpack_item(raw_item))
+                )
+                results.append(None)
+            except ValidationError as e:
+                results.append(BatchExchangeItemDTO(None, e.message))
+
+        calculated = iter(
+            self.exchange_rates_service.calculate_exchanges(valid_items)
+        )
+        for index, result in enumerate(results):
+            if result is not None:
+                continue
+            outcome = next(calculated)
+            if isinstance(outcome, ApplicationException):
+                results[index] = BatchExchangeItemDTO(None, outcome.message)
+            else:
+                results[index] = BatchExchangeItemDTO(outcome, None)
+
+        return results, HTTPStatus.OK
+
+    def _validate_exchange(
+        self, from_code: str, to_code: str, amount: str
+    ) -> tuple[str, str, Decimal]:
+        validated_from = self.currency_validator.validate_currency_code(
+            from_code
+        )
+        validated_to = self.currency_validator.validate_currency_code(to_code)
+        validated_amount = self.exchange_rates_validator.validate_amount(
+            amount
+        )
+        return validated_from, validated_to, validated_amount
+
+    @staticmethod
+    def _collect_batch_items(items: Any, form: dict[str, Any]) -> list[Any]:
+        """Collect raw batch items from JSON or parallel form fields."""
+        if items is None:
+            from_codes = form.get("from", [])
+            to_codes = form.get("to", [])
+            amounts = form.get("amount", [])
+            if not all(
+                isinstance(values, list)
+                for values in (from_codes, to_codes, amounts)
+            ) or not len(from_codes) == len(to_codes) == len(amounts):
+                raise InvalidBatchError(
+                    "Batch form fields from[], to[] and amount[] "
+                    "must have the same number of values"
+                )
+            items = [list(item) for item in zip(from_codes, to_codes, amounts)]
+
+        if not isinstance(items, list) or not items:
+            raise InvalidBatchError("Batch must be a non-empty list of items")
+        if len(items) > config.max_batch_items:
+            raise InvalidBatchError(
+                f"Batch cannot contain more than "
+                f"{config.max_batch_items} items"
+            )
+        return items
+
+    @staticmethod
+    def _unpack_item(raw_item: Any) -> tuple[str, str, str]:
+        """Get (from, to, amount) strings of one raw batch item."""
+        if isinstance(raw_item, dict):
+            values = [
+                raw_item.get(key, "") for key in ("from", "to", "amount")
+            ]
+        elif isinstance(raw_item, list) and len(raw_item) == 3:
+            values = raw_item
+        else:
+            raise InvalidBatchError(
+                "Batch item must be an object with from, to and amount "
+                "or a [from, to, amount] array"
+            )
+        if not all(isinstance(value, str) for value in values):
+            raise InvalidBatchError(
+                "Batch item from, to and amount must be strings or numbers"
+            )
+        return values[0], values[1], values[2]
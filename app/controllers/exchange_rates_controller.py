@@ -1,11 +1,29 @@
+import csv
+import io
+import json
+from collections.abc import Iterable, Iterator
 from http import HTTPStatus
+from typing import Any
 
+from app.dtos.create_exchange_rate_dto import CreateExchangeRateDTO
 from app.dtos.exchange_rate_dto import ExchangeRateDTO
+from app.dtos.import_report_dto import ImportReportDTO
 from app.dtos.update_exchange_rate_dto import UpdateExchangeRateDTO
+from app.event_broker import EventBroker, EventStream
+from app.exceptions import (
+    ApplicationException,
+    InvalidImportError,
+    ValidationError,
+)
 from app.mappers.exchange_rate_mapper import ExchangeRateMapper
 from app.services.exchange_rate_service import ExchangeRateService
 from app.validations.currency_validator import CurrencyValidator
 from app.validations.exchange_rate_validator import ExchangeRateValidator
+from app.validations.pagination_validator import PaginationValidator
+
+IMPORT_FIELDS = ("baseCurrencyCode", "targetCurrencyCode", "rate")
+CSV_MEDIA_TYPES = ("text/csv",)
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson")
 
 
 class ExchangeRatesController:
@@ -15,30 +33,70 @@ class ExchangeRatesController:
         exchange_rates_validator: ExchangeRateValidator,
         exchange_rates_mapper: ExchangeRateMapper,
         currency_validator: CurrencyValidator,
+        pagination_validator: PaginationValidator,
+        rate_events: EventBroker,
     ) -> None:
         self.exchange_rates_service = exchange_rates_service
         self.currency_validator = currency_validator
         self.exchange_rates_validator = exchange_rates_validator
         self.exchange_rates_mapper = exchange_rates_mapper
+        self.pagination_validator = pagination_validator
+        self.rate_events = rate_events
 
     def handle_get_exchange_rates(
-        self,
-    ) -> tuple[list[ExchangeRateDTO], HTTPStatus]:
-        """Get all exchange rates."""
-        exchange_rates = self.exchange_rates_service.get_exchange_rates()
+        self, limit: str = "", after: str = "", stream: str = "", **_kwargs
+    ) -> tuple[list[ExchangeRateDTO] | Iterator[ExchangeRateDTO], HTTPStatus]:
+        """
+        Get all exchange rates, or a page of ``limit`` rates with ids
+        greater than ``after``. With ``stream`` they are streamed.
+        """
+        validated_limit, validated_after, validated_stream = (
+            self.pagination_validator.validate_page_params(
+                limit, after, stream
+            )
+        )
+        if validated_stream:
+            exchange_rates = self.exchange_rates_service.iter_exchange_rates(
+                validated_after, validated_limit
+            )
+        else:
+            exchange_rates = self.exchange_rates_service.get_exchange_rates(
+                validated_after, validated_limit
+            )
         return exchange_rates, HTTPStatus.OK
 
+    def handle_get_exchange_rate_events(
+        self, pairs: str = "", **_kwargs
+    ) -> tuple[EventStream, HTTPStatus]:
+        """
+        Stream written rates as server-sent events, only of the comma
+        separated currency ``pairs`` if they are given.
+        """
+        topics = None
+        if pairs:
+            topics = [
+                self.exchange_rates_validator.validate_currency_code_pair(
+                    pair
+                )
+                for pair in pairs.split(",")
+            ]
+        return self.rate_events.subscribe(topics), HTTPStatus.OK
+
     def handle_get_exchange_rate(
-        self, currency_code_pair: str = "", **_kwargs
+        self, currency_code_pair: str = "", at: str = "", **_kwargs
     ) -> tuple[ExchangeRateDTO, HTTPStatus]:
-        """Get specific exchange rate by currency code pair."""
+        """
+        Get specific exchange rate by currency code pair, as it was at
+        the moment ``at`` if it is given.
+        """
         validated_code_pair = (
             self.exchange_rates_validator.validate_currency_code_pair(
                 currency_code_pair
             )
         )
+        validated_at = self.exchange_rates_validator.validate_timestamp(at)
         exchange_rate = self.exchange_rates_service.get_exchange_rate(
-            validated_code_pair
+            validated_code_pair, validated_at
         )
         return exchange_rate, HTTPStatus.OK
 
@@ -89,3 +147,111 @@ class ExchangeRatesController:
         )
         return exchange_rate, HTTPStatus.OK
 
+    def handle_post_exchange_rates_import(
+        self, raw_body: bytes = b"", media_type: str = "", **_kwargs: dict
+    ) -> tuple[ImportReportDTO, HTTPStatus]:
+        """Insert or update exchange rates from a CSV or NDJSON body."""
+        try:
+            text = raw_body.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise InvalidImportError("Import body must be UTF-8 text")
+        report = self.import_lines(io.StringIO(text, newline=""), media_type)
+        return report, HTTPStatus.OK
+
+    def import_lines(
+        self, lines: Iterable[str], media_type: str
+    ) -> ImportReportDTO:
+        """
+        Insert or update exchange rates from CSV or NDJSON lines.
+
+        CSV rows are ``baseCurrencyCode,targetCurrencyCode,rate``, with an
+        optional header row naming the columns. NDJSON lines are objects
+        with the same keys or ``[base, target, rate]`` arrays. Lines are
+        parsed and validated as they are imported, every invalid line is
+        reported and skipped.
+        """
+        if media_type in CSV_MEDIA_TYPES:
+            raw_rows = self._parse_csv(lines)
+        elif media_type in NDJSON_MEDIA_TYPES:
+            raw_rows = self._parse_ndjson(lines)
+        else:
+            raise InvalidImportError(
+                "Import body must be text/csv or application/x-ndjson"
+            )
+        return self.exchange_rates_service.import_exchange_rates(
+            (line, self._validate_import_row(raw_row))
+            for line, raw_row in raw_rows
+        )
+
+    def _validate_import_row(
+        self, raw_row: tuple[str, str, str] | ApplicationException
+    ) -> CreateExchangeRateDTO | ApplicationException:
+        if isinstance(raw_row, ApplicationException):
+            return raw_row
+        try:
+            validated_data = (
+                self.exchange_rates_validator.validate_exchange_rate_data(
+                    *raw_row
+                )
+            )
+        except ValidationError as e:
+            return e
+        return self.exchange_rates_mapper.dict_to_dto(validated_data)
+
+    @staticmethod
+    def _parse_csv(
+        lines: Iterable[str],
+    ) -> Iterator[tuple[int, tuple[str, str, str] | ApplicationException]]:
+        """Get (line number, raw row or error) of every non-empty row."""
+        reader = csv.reader(lines)
+        columns = None
+        for row in reader:
+            if not any(cell.strip() for cell in row):
+                continue
+            if columns is None:
+                columns = {name.strip(): i for i, name in enumerate(row)}
+                if all(field in columns for field in IMPORT_FIELDS):
+                    continue
+                columns = {field: i for i, field in enumerate(IMPORT_FIELDS)}
+            values = [
+                row[columns[field]] if columns[field] < len(row) else None
+                for field in IMPORT_FIELDS
+            ]
+            if None in values:
+                yield reader.line_num, InvalidImportError(
+                    "Row must have baseCurrencyCode, targetCurrencyCode "
+                    "and rate columns"
+                )
+            else:
+                yield reader.line_num, (values[0], values[1], values[2])
+
+    @staticmethod
+    def _parse_ndjson(
+        lines: Iterable[str],
+    ) -> Iterator[tuple[int, tuple[str, str, str] | ApplicationException]]:
+        """Get (line number, raw row or error) of every non-empty line."""
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                item: Any = json.loads(line, parse_float=str, parse_int=str)
+            except ValueError:
+                yield line_number, InvalidImportError("Line is not valid JSON")
+                continue
+            if isinstance(item, dict):
+                values = [item.get(field, "") for field in IMPORT_FIELDS]
+            elif isinstance(item, list) and len(item) == 3:
+                values = item
+            else:
+                yield line_number, InvalidImportError(
+                    "Line must be an object with baseCurrencyCode, "
+                    "targetCurrencyCode and rate or a [base, target, rate] "
+                    "array"
+                )
+                continue
+            if not all(isinstance(value, str) for value in values):
+                yield line_number, InvalidImportError(
+                    "Currency codes and rate must be strings or numbers"
+                )
+                continue
+            yield line_number, (values[0], values[1], values[2])
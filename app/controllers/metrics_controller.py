@@ -0,0 +1,37 @@
+from http import HTTPStatus
+from typing import Any
+
+from app.database.query_registry import QueryRegistry
+from app.metrics import PROMETHEUS_CONTENT_TYPE, Metrics
+from app.view.response import TextPayload
+from app.view.response_cache import ResponseCache
+
+
+class MetricsController:
+    def __init__(
+        self,
+        metrics: Metrics,
+        response_cache: ResponseCache,
+        query_registry: QueryRegistry,
+    ) -> None:
+        self.metrics = metrics
+        self.response_cache = response_cache
+        self.query_registry = query_registry
+
+    def handle_get_metrics(
+        self, **_kwargs
+    ) -> tuple[TextPayload, HTTPStatus]:
+        """Get metrics of this process in the Prometheus text format."""
+        text = self.metrics.render(
+            self.response_cache.stats(), self.query_registry.stats()
+        )
+        return TextPayload(text, PROMETHEUS_CONTENT_TYPE), HTTPStatus.OK
+
+    def handle_get_queries(
+        self, **_kwargs
+    ) -> tuple[dict[str, Any], HTTPStatus]:
+        """
+        Get statistics and captured query plans of the registered
+        statements and the latest slow executions.
+        """
+        return self.query_registry.report(), HTTPStatus.OK
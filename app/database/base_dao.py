@@ -1,47 +1,145 @@
 import sqlite3
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
 
+from .change_tracker import change_tracker
 from .db_session import db_session
+from .query_registry import Query, query_registry
 
 
 class BaseDAO:
     """
     Base class for DAO. Encapsulates cursor and connection logic.
+
+    Statements are defined once with ``register_query`` and executed by
+    the helpers below, which count and time every execution. Writes
+    name the table they change, so the change tracker can tell them
+    apart from writes of other processes.
     """
 
     @staticmethod
-    def _execute(sql: str, params: tuple | None = None) -> None:
+    def register_query(name: str, sql: str) -> Query:
+        """Define a statement in the query registry."""
+        return query_registry.register(name, sql)
+
+    @staticmethod
+    def _execute(
+        query: Query,
+        params: tuple | None = None,
+        changes: str | None = None,
+    ) -> None:
         """Execute statement without returning rows
         (INSERT/UPDATE/DELETE/DDL).
         """
-        with db_session() as cursor:
-            cursor.execute(sql, params or ())
+        params = params or ()
+        with (
+            BaseDAO._write_session(changes) as cursor,
+            query_registry.timing(query, cursor, params),
+        ):
+            cursor.execute(query.sql, params)
+
+    @staticmethod
+    def _execute_many(
+        query: Query,
+        params_seq: Iterable[tuple],
+        changes: str | None = None,
+    ) -> None:
+        """
+        Execute statement for every parameters tuple in one transaction.
+        Parameters may be a generator, they are consumed as executed.
+        """
+        with (
+            BaseDAO._write_session(changes) as cursor,
+            query_registry.timing(query, cursor, params_seq),
+        ):
+            cursor.executemany(query.sql, params_seq)
 
     @staticmethod
     def _execute_one(
-        sql: str, params: tuple | None = None
+        query: Query, params: tuple | None = None
     ) -> sqlite3.Row | None:
         """Execute SELECT and return one row or None if no results."""
-        with db_session() as cursor:
-            cursor.execute(sql, params or ())
+        params = params or ()
+        with (
+            db_session() as cursor,
+            query_registry.timing(query, cursor, params),
+        ):
+            cursor.execute(query.sql, params)
             return cursor.fetchone()
 
     @staticmethod
     def _execute_all(
-        sql: str, params: tuple | None = None
+        query: Query, params: tuple | None = None
     ) -> list[sqlite3.Row]:
         """Execute SELECT query and return all rows as list (maybe empty)."""
-        with db_session() as cursor:
-            cursor.execute(sql, params or ())
+        params = params or ()
+        with (
+            db_session() as cursor,
+            query_registry.timing(query, cursor, params),
+        ):
+            cursor.execute(query.sql, params)
             return cursor.fetchall()
 
     @staticmethod
     def _execute_returning_lastrowid(
-        sql: str, params: tuple | None = None
+        query: Query,
+        params: tuple | None = None,
+        changes: str | None = None,
     ) -> int:
         """Execute a statement and return the last inserted row id."""
-        with db_session() as cursor:
-            cursor.execute(sql, params or ())
+        params = params or ()
+        with (
+            BaseDAO._write_session(changes) as cursor,
+            query_registry.timing(query, cursor, params),
+        ):
+            cursor.execute(query.sql, params)
             if cursor.lastrowid is None:
                 raise RuntimeError("No last row id was returned "
                                    "from the database")
             return cursor.lastrowid
+
+    @staticmethod
+    @contextmanager
+    def _write_session(changes: str | None) -> Iterator[sqlite3.Cursor]:
+        """
+        Session of a write to the ``changes`` table, if given. The write
+        is recorded in the change tracker once committed.
+        """
+        if changes is None:
+            with db_session() as cursor:
+                yield cursor
+            return
+        with db_session() as cursor:
+            before = change_tracker.begin_write(cursor, changes)
+            yield cursor
+            after = change_tracker.read_counter(cursor, changes)
+        change_tracker.record_write(changes, before, after)
+
+    @staticmethod
+    def _iter_pages(
+        page_query: Query,
+        after: int | None,
+        limit: int | None,
+        page_size: int,
+    ) -> Iterator[sqlite3.Row]:
+        """
+        Iterate rows of a keyset paginated SELECT page by page.
+
+        ``page_query`` must select ``id``, be ordered by it and take
+        (after id, limit) parameters. Every page is read in its own
+        session, so no connection is held while the rows are consumed
+        and memory is bounded by the page size.
+        """
+        after_id = -1 if after is None else after
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(
+                page_size, remaining
+            )
+            rows = BaseDAO._execute_all(page_query, (after_id, size))
+            yield from rows
+            if len(rows) < size:
+                return
+            after_id = rows[-1]["id"]
+            if remaining is not None:
+                remaining -= len(rows)
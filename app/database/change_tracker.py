@@ -0,0 +1,135 @@
+"""
+Detection of writes made by other processes sharing the database.
+
+Triggers count the written rows of every tracked table in
+ChangeCounters. Writes of this process record the counter they have
+brought a table to, so polling the counters tells writes of other
+processes apart: only for tables whose counter has moved otherwise are
+the subscribed in-process states (caches, snapshots) dropped.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+
+from app.config import config
+from app.exceptions import DatabaseError
+
+from .data_version import data_version
+from .db_session import db_session
+from .query_registry import query_registry
+
+logger = logging.getLogger(__name__)
+
+CURRENCIES_TABLE = "Currencies"
+EXCHANGE_RATES_TABLE = "ExchangeRates"
+
+SELECT_CHANGE_COUNTERS_QUERY = query_registry.register(
+    "change_counters.select_all",
+    "SELECT table_name, counter FROM ChangeCounters",
+)
+
+SELECT_CHANGE_COUNTER_QUERY = query_registry.register(
+    "change_counters.select",
+    "SELECT counter FROM ChangeCounters WHERE table_name = ?",
+)
+
+
+class ChangeTracker:
+    def __init__(self, poll_interval: float | None = 0.1) -> None:
+        # None disables polling, 0 polls on every call
+        self.poll_interval = poll_interval
+        # table -> counter the in-process state reflects
+        self._known: dict[str, int] = {}
+        # table -> callbacks dropping the state derived from it
+        self._subscribers: dict[str, list[Callable[[], None]]] = {}
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+        # Held while polling, concurrent callers don't wait for it
+        self._poll_lock = threading.Lock()
+
+    def subscribe(self, table: str, callback: Callable[[], None]) -> None:
+        """Call back when another process has written the table."""
+        self._subscribers.setdefault(table, []).append(callback)
+
+    def load(self) -> None:
+        """Take the current counters as known, e.g. after startup."""
+        counters = self._read_counters()
+        with self._lock:
+            self._known = counters
+
+    def poll(self) -> None:
+        """
+        Check the counters if the poll interval has passed and drop the
+        state of the tables other processes have written.
+        """
+        if self.poll_interval is None:
+            return
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_poll = now + self.poll_interval
+            try:
+                counters = self._read_counters()
+            except (sqlite3.Error, DatabaseError):
+                # Requests go on, the next poll tries again
+                logger.warning(
+                    "Failed to read change counters", exc_info=True
+                )
+                return
+            with self._lock:
+                changed = [
+                    table for table, counter in counters.items()
+                    if self._known.get(table) != counter
+                ]
+                self._known.update(counters)
+            if changed:
+                data_version.bump()
+            for table in changed:
+                for callback in self._subscribers.get(table, ()):
+                    callback()
+        finally:
+            self._poll_lock.release()
+
+    @staticmethod
+    def begin_write(cursor: sqlite3.Cursor, table: str) -> int:
+        """
+        Take the write lock and return the counter of the table before
+        the write, within the write transaction.
+        """
+        if not cursor.connection.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        return ChangeTracker.read_counter(cursor, table)
+
+    @staticmethod
+    def read_counter(cursor: sqlite3.Cursor, table: str) -> int:
+        query = SELECT_CHANGE_COUNTER_QUERY
+        params = (table,)
+        with query_registry.timing(query, cursor, params):
+            row = cursor.execute(query.sql, params).fetchone()
+        return row[0]
+
+    def record_write(self, table: str, before: int, after: int) -> None:
+        """
+        Record a committed write of this process. If the state already
+        reflected the counter before it, it reflects the write too, the
+        writer updates it. Otherwise other processes have written in
+        between and the next poll drops the state.
+        """
+        with self._lock:
+            if self._known.get(table) == before:
+                self._known[table] = after
+
+    @staticmethod
+    def _read_counters() -> dict[str, int]:
+        query = SELECT_CHANGE_COUNTERS_QUERY
+        with db_session() as cursor, query_registry.timing(query, cursor, ()):
+            rows = cursor.execute(query.sql).fetchall()
+        return {table: counter for table, counter in rows}
+
+
+change_tracker = ChangeTracker(poll_interval=config.db_change_poll_interval)
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from app.config import config
+from app.exceptions import DatabaseError
+
+from .query_registry import query_registry
+
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+
+    Connections are opened lazily up to ``size``, configured with the
+    pragmas once and then reused. A connection that has been idle for longer
+    than ``health_check_interval`` seconds is checked with a trivial query
+    before it is handed out; broken connections are discarded and replaced.
+    Threads waiting for a connection are woken when one is released or a
+    discarded one frees its slot.
+    """
+
+    def __init__(
+        self,
+        db_path: Path | str,
+        size: int = config.db_pool_size,
+        timeout: float = config.db_pool_timeout,
+        health_check_interval: float = config.db_pool_health_check_interval,
+    ) -> None:
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        # (connection, released at), taken from the end: LIFO keeps the
+        # most recently used (warm) connections busy
+        self._idle: list[tuple[sqlite3.Connection, float]] = []
+        # Guards the idle list and the open count, notified when either
+        # frees up
+        self._available = threading.Condition()
+        self._opened = 0
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply per-connection pragmas."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.db_busy_timeout,
+            check_same_thread=False,
+            # Every registered statement stays prepared on the connection
+            cached_statements=max(
+                config.db_statement_cache_size, len(query_registry)
+            ),
+        )
+        conn.row_factory = sqlite3.Row
+        # Enforce foreign key constraints in SQLite
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA journal_mode = {config.db_journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {config.db_synchronous}")
+        conn.execute(f"PRAGMA mmap_size = {config.db_mmap_size}")
+        conn.execute(f"PRAGMA cache_size = {config.db_cache_size}")
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, open a new one or wait for a free one."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._available:
+                while True:
+                    if self._closed:
+                        raise DatabaseError("Connection pool is closed")
+                    if self._idle:
+                        conn, released_at = self._idle.pop()
+                        break
+                    if self._opened < self.size:
+                        self._opened += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DatabaseError(
+                            "Database error: no free connection in the pool"
+                        )
+                    self._available.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    self._free_slot()
+                    raise
+            if (
+                time.monotonic() - released_at < self.health_check_interval
+                or self._is_healthy(conn)
+            ):
+                return conn
+            self._discard(conn)
+
+    def release(
+        self, conn: sqlite3.Connection, broken: bool = False
+    ) -> None:
+        """Return connection to the pool, or close it if it is broken."""
+        with self._available:
+            if not broken and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._available.notify()
+                return
+        self._discard(conn)
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self._free_slot()
+
+    def _free_slot(self) -> None:
+        """Give up a slot, a waiting thread may open a replacement."""
+        with self._available:
+            self._opened -= 1
+            self._available.notify()
+
+    def close(self) -> None:
+        """Close all idle connections; busy ones are closed on release."""
+        with self._available:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+            # Waiting threads fail right away
+            self._available.notify_all()
+        for conn, _released_at in idle:
+            self._discard(conn)
+
+
+_pool: ConnectionPool | None = None
+_pool_pid: int | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide pool.
+
+    SQLite connections must not cross fork(), so a forked worker process
+    gets its own pool on first use.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(config.db_path)
+            _pool_pid = pid
+        return _pool
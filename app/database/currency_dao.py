@@ -1,48 +1,104 @@
 import sqlite3
+from collections.abc import Iterator
 
+from app.config import config
 from app.exceptions import CurrencyAlreadyExistsError
 from app.mappers.currency_mapper import CurrencyMapper
 from app.models.currency import Currency
 
 from .base_dao import BaseDAO
+from .change_tracker import CURRENCIES_TABLE
+from .currency_registry import currency_registry
+from .data_version import data_version
+
+SELECT_CURRENCIES_QUERY = BaseDAO.register_query(
+    "currencies.select_all", "SELECT id, code, name, sign FROM Currencies"
+)
+
+SELECT_CURRENCIES_PAGE_QUERY = BaseDAO.register_query(
+    "currencies.select_page",
+    """SELECT id, code, name, sign
+FROM Currencies
+WHERE id > ?
+ORDER BY id
+LIMIT ?""",
+)
+
+SELECT_CURRENCY_IDS_QUERY = BaseDAO.register_query(
+    "currencies.select_ids", "SELECT id, code FROM Currencies"
+)
+
+INSERT_CURRENCY_QUERY = BaseDAO.register_query(
+    "currencies.insert",
+    "INSERT INTO Currencies (code, name, sign) VALUES(?, ?, ?)",
+)
 
 
 class CurrencyDAO(BaseDAO):
     def __init__(self, currency_mapper: CurrencyMapper):
         self.currency_mapper = currency_mapper
 
-    def get_currencies(self) -> list[Currency]:
-        """Get all currencies from database."""
-        sql = "SELECT id, code, name, sign FROM Currencies"
-        rows = self._execute_all(sql)
+    def get_currencies(
+        self, after: int | None = None, limit: int | None = None
+    ) -> list[Currency]:
+        """
+        Get all currencies from database, or a page of at most ``limit``
+        of them ordered by id, starting after id ``after``.
+        """
+        if after is None and limit is None:
+            rows = self._execute_all(SELECT_CURRENCIES_QUERY)
+        else:
+            rows = self._execute_all(
+                SELECT_CURRENCIES_PAGE_QUERY,
+                (
+                    -1 if after is None else after,
+                    -1 if limit is None else limit,
+                ),
+            )
 
         return [self.currency_mapper.row_to_entity(row) for row in rows]
 
+    def iter_currencies(
+        self, after: int | None = None, limit: int | None = None
+    ) -> Iterator[Currency]:
+        """Iterate currencies ordered by id, reading them in pages."""
+        for row in self._iter_pages(
+            SELECT_CURRENCIES_PAGE_QUERY, after, limit, config.stream_page_size
+        ):
+            yield self.currency_mapper.row_to_entity(row)
+
+    def get_currency_ids(self) -> dict[str, int]:
+        """Get ids of all currencies by code."""
+        rows = self._execute_all(SELECT_CURRENCY_IDS_QUERY)
+        return {row["code"]: row["id"] for row in rows}
+
     def get_currency(self, code: str) -> Currency | None:
-        """Get currency by code."""
-        sql = "SELECT id, code, name, sign FROM Currencies WHERE code = ?"
-        row = self._execute_one(sql, (code,))
-        return self.currency_mapper.row_to_entity(row) if row else None
+        """Get currency by code from the currency registry."""
+        return currency_registry.get(code)
 
     def get_currency_by_id(self, currency_id: int) -> Currency | None:
-        """Get currency by id."""
-        sql = "SELECT id, code, name, sign FROM Currencies WHERE id = ?"
-        row = self._execute_one(sql, (currency_id,))
-        return self.currency_mapper.row_to_entity(row) if row else None
+        """Get currency by id from the currency registry."""
+        return currency_registry.get_by_id(currency_id)
 
     def post_currency(self, currency: Currency) -> Currency:
-        """Insert new currency and return inserted entity."""
-        sql = "INSERT INTO Currencies (code, name, sign) VALUES(?, ?, ?)"
+        """Insert new currency, register it and return the inserted entity."""
         try:
             inserted_id = self._execute_returning_lastrowid(
-                sql, (currency.code, currency.name, currency.sign)
+                INSERT_CURRENCY_QUERY,
+                (currency.code, currency.name, currency.sign),
+                changes=CURRENCIES_TABLE,
             )
         except sqlite3.IntegrityError as e:
             raise CurrencyAlreadyExistsError(
                 f"Currency with code {currency.code} already exists."
             ) from e
+        data_version.bump()
 
-        inserted_currency = self.get_currency_by_id(inserted_id)
-        if not inserted_currency:
-            raise RuntimeError("Failed to retrieve inserted currency")
+        inserted_currency = Currency(
+            id=inserted_id,
+            name=currency.name,
+            code=currency.code,
+            sign=currency.sign,
+        )
+        currency_registry.add(inserted_currency)
         return inserted_currency
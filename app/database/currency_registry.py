@@ -0,0 +1,85 @@
+import threading
+
+from app.mappers.currency_mapper import CurrencyMapper
+from app.models.currency import Currency
+
+from .base_dao import BaseDAO
+from .query_registry import Query
+
+SELECT_CURRENCY_SQL = "SELECT id, code, name, sign FROM Currencies"
+
+LOAD_CURRENCIES_QUERY = BaseDAO.register_query(
+    "currency_registry.load", SELECT_CURRENCY_SQL
+)
+
+SELECT_CURRENCY_BY_CODE_QUERY = BaseDAO.register_query(
+    "currency_registry.select_by_code", f"{SELECT_CURRENCY_SQL} WHERE code = ?"
+)
+
+SELECT_CURRENCY_BY_ID_QUERY = BaseDAO.register_query(
+    "currency_registry.select_by_id", f"{SELECT_CURRENCY_SQL} WHERE id = ?"
+)
+
+
+class CurrencyRegistry(BaseDAO):
+    """
+    In-process index of currencies by code and by id.
+
+    Loaded by ``init_db`` and updated by ``CurrencyDAO.post_currency``,
+    so translating codes to ids and filling in currency data of exchange
+    rates needs no query. Currencies are never changed or deleted, only
+    added; one added by another process is read from the database on the
+    first miss. Lookups are single dict reads and don't lock.
+    """
+
+    def __init__(self) -> None:
+        self._by_code: dict[str, Currency] = {}
+        self._by_id: dict[int, Currency] = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """Replace the registry contents with all stored currencies."""
+        currencies = [
+            CurrencyMapper.row_to_entity(row)
+            for row in self._execute_all(LOAD_CURRENCIES_QUERY)
+        ]
+        with self._lock:
+            self._by_code = {c.code: c for c in currencies}
+            self._by_id = {c.id: c for c in currencies}
+
+    def add(self, currency: Currency) -> None:
+        """Register a currency that has just been stored."""
+        with self._lock:
+            self._by_code[currency.code] = currency
+            self._by_id[currency.id] = currency
+
+    def get(self, code: str) -> Currency | None:
+        """Get currency by code, None if it doesn't exist."""
+        currency = self._by_code.get(code)
+        if currency is None:
+            currency = self._read(SELECT_CURRENCY_BY_CODE_QUERY, code)
+        return currency
+
+    def get_by_id(self, currency_id: int) -> Currency | None:
+        """Get currency by id, None if it doesn't exist."""
+        currency = self._by_id.get(currency_id)
+        if currency is None:
+            currency = self._read(SELECT_CURRENCY_BY_ID_QUERY, currency_id)
+        return currency
+
+    def get_id(self, code: str) -> int | None:
+        """Get id of a currency code, None if it doesn't exist."""
+        currency = self.get(code)
+        return currency.id if currency is not None else None
+
+    def _read(self, query: Query, key: str | int) -> Currency | None:
+        """Read a currency missing from the registry and register it."""
+        row = self._execute_one(query, (key,))
+        if row is None:
+            return None
+        currency = CurrencyMapper.row_to_entity(row)
+        self.add(currency)
+        return currency
+
+
+currency_registry = CurrencyRegistry()
@@ -0,0 +1,39 @@
+import os
+import threading
+import time
+
+
+class DataVersion:
+    """
+    Monotonically increasing version of the stored data.
+
+    DAOs bump it after every committed write, so responses rendered at
+    the same version are the same and can be validated by it. Versions
+    are only comparable within one process, the ``epoch`` tells them
+    apart: it is new in every process, forked ones included.
+    """
+
+    def __init__(self) -> None:
+        self._version = 1
+        self._modified_at = time.time()
+        self._lock = threading.Lock()
+        self._new_epoch()
+        os.register_at_fork(after_in_child=self._new_epoch)
+
+    def _new_epoch(self) -> None:
+        self.epoch = f"{os.getpid():x}.{time.time_ns():x}"
+
+    def current(self) -> tuple[str, float]:
+        """Get current version tag and the time of the last write."""
+        with self._lock:
+            return f"{self.epoch}-{self._version}", self._modified_at
+
+    def bump(self) -> int:
+        """Record a write and return the new version."""
+        with self._lock:
+            self._version += 1
+            self._modified_at = time.time()
+            return self._version
+
+
+data_version = DataVersion()
@@ -1,27 +1,20 @@
+from decimal import Decimal
+
+from app.mappers.exchange_rate_mapper import ExchangeRateMapper
+
+from .change_tracker import change_tracker
+from .currency_registry import currency_registry
 from .db_session import db_session
+from .migrations import migrate
 
 
 def init_db() -> None:
-    """Initialize database and add default data."""
+    """
+    Migrate database schema, add default data and load the currency
+    registry and the change counters.
+    """
     with db_session() as cursor:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS Currencies(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                sign TEXT NOT NULL
-            )""")
-
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS ExchangeRates(
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                base_currency_id INTEGER NOT NULL,
-                target_currency_id INTEGER NOT NULL,
-                rate TEXT NOT NULL,
-                FOREIGN KEY (base_currency_id) REFERENCES Currencies(id),
-                FOREIGN KEY (target_currency_id) REFERENCES Currencies(id),
-                UNIQUE (base_currency_id, target_currency_id)
-            )""")
+        migrate(cursor)
 
         # Check if table is empty
         cursor.execute("SELECT 1 FROM Currencies LIMIT 1")
@@ -43,13 +36,19 @@ def init_db() -> None:
         if not cursor.fetchone():
             # Insert default data
             default_exchange_rates_data = [
-                (2, 3, 0.92),  # USD->EUR
-                (2, 4, 0.0073),  # USD->JPY
-                (3, 4, 0.0079),  # EUR->JPY
+                (2, 3, Decimal("0.92")),  # USD->EUR
+                (2, 4, Decimal("0.0073")),  # USD->JPY
+                (3, 4, Decimal("0.0079")),  # EUR->JPY
             ]
             cursor.executemany(
                 "INSERT OR IGNORE INTO ExchangeRates "
                 "(base_currency_id, target_currency_id, rate)"
                 "VALUES(?,?,?)",
-                default_exchange_rates_data,
+                [
+                    (base, target, ExchangeRateMapper.rate_to_column(rate))
+                    for base, target, rate in default_exchange_rates_data
+                ],
             )
+
+    currency_registry.load()
+    change_tracker.load()
@@ -1,28 +1,43 @@
 import sqlite3
+import time
 from collections.abc import Iterator
 from contextlib import contextmanager
 
-from app.config import config
 from app.exceptions import DatabaseError
+from app.metrics import metrics
+
+from .connection_pool import get_pool
 
 
 @contextmanager
 def db_session() -> Iterator[sqlite3.Cursor]:
-    """Database session with auto commit/rollback and dict-like rows."""
+    """
+    Database session with auto commit/rollback and dict-like rows.
+
+    Connection is borrowed from the pool and returned after the session.
+    Waiting for the connection and the whole session are timed.
+    """
+    start = time.perf_counter()
+    pool = get_pool()
     try:
-        conn = sqlite3.connect(config.db_path)
-        conn.row_factory = sqlite3.Row
-        # Enforce foreign key constraints in SQLite
-        conn.execute("PRAGMA foreign_keys = ON")
-        cursor = conn.cursor()
+        conn = pool.acquire()
     except sqlite3.Error as e:
         raise DatabaseError(f"Database error: {e}") from e
+    acquired = time.perf_counter()
 
+    broken = False
     try:
+        cursor = conn.cursor()
         yield cursor
         conn.commit()
     except Exception:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            broken = True
         raise
     finally:
-        conn.close()
+        pool.release(conn, broken=broken)
+        metrics.observe_db_session(
+            acquired - start, time.perf_counter() - start
+        )
@@ -1,6 +1,12 @@
 import sqlite3
+from collections.abc import Iterable, Iterator, Sequence
 
+from app.config import config
 from app.database.base_dao import BaseDAO
+from app.database.change_tracker import EXCHANGE_RATES_TABLE
+from app.database.currency_registry import currency_registry
+from app.database.data_version import data_version
+from app.event_broker import rate_events
 from app.exceptions import (
     CurrencyNotFoundError,
     ExchangeRateAlreadyExistsError,
@@ -8,94 +14,246 @@ from app.exceptions import (
 from app.mappers.exchange_rate_mapper import ExchangeRateMapper
 from app.read_models.exchange_rate_view import ExchangeRateView
 
-SELECT_EXCHANGE_RATE_QUERY = """SELECT
+# Server-sent events of written rates, the topic of a rate event is the
+# currency pair, e.g. USDEUR
+RATE_EVENT = "rate"
+RATES_IMPORTED_EVENT = "rates-imported"
+
+# Currency data of the rates comes from the currency registry
+SELECT_EXCHANGE_RATE_SQL = """SELECT
+    id, base_currency_id, target_currency_id, rate
+FROM ExchangeRates"""
+
+# Rates in effect at a moment (Unix ms, the first parameter), one history
+# index seek per pair. The rate is NULL for pairs created after it.
+SELECT_EXCHANGE_RATE_AT_SQL = """SELECT
     er.id,
-    bc.id   AS base_currency_id,
-    bc.name AS base_currency_name,
-    bc.code AS base_currency_code,
-    bc.sign AS base_currency_sign,
-    tc.id   AS target_currency_id,
-    tc.name AS target_currency_name,
-    tc.code AS target_currency_code,
-    tc.sign AS target_currency_sign,
-    er.rate
-FROM ExchangeRates er
-JOIN Currencies bc ON er.base_currency_id = bc.id
-JOIN Currencies tc ON er.target_currency_id = tc.id"""
+    er.base_currency_id,
+    er.target_currency_id,
+    (
+        SELECT h.rate
+        FROM ExchangeRateHistory h
+        WHERE h.base_currency_id = er.base_currency_id
+          AND h.target_currency_id = er.target_currency_id
+          AND h.valid_from <= ?
+        ORDER BY h.valid_from DESC
+        LIMIT 1
+    ) AS rate
+FROM ExchangeRates er"""
+
+SELECT_EXCHANGE_RATES_QUERY = BaseDAO.register_query(
+    "exchange_rates.select_all", f"{SELECT_EXCHANGE_RATE_SQL};"
+)
+
+SELECT_EXCHANGE_RATES_PAGE_QUERY = BaseDAO.register_query(
+    "exchange_rates.select_page",
+    f"""{SELECT_EXCHANGE_RATE_SQL}
+WHERE id > ?
+ORDER BY id
+LIMIT ?;""",
+)
+
+SELECT_EXCHANGE_RATE_BY_PAIR_QUERY = BaseDAO.register_query(
+    "exchange_rates.select_by_pair",
+    f"""{SELECT_EXCHANGE_RATE_SQL}
+WHERE base_currency_id = ? AND target_currency_id = ?;""",
+)
+
+SELECT_EXCHANGE_RATE_BY_ID_QUERY = BaseDAO.register_query(
+    "exchange_rates.select_by_id",
+    f"""{SELECT_EXCHANGE_RATE_SQL}
+WHERE id = ?;""",
+)
+
+SELECT_EXCHANGE_RATE_AT_BY_PAIR_QUERY = BaseDAO.register_query(
+    "exchange_rates.select_at_by_pair",
+    f"""{SELECT_EXCHANGE_RATE_AT_SQL}
+WHERE er.base_currency_id = ? AND er.target_currency_id = ?;""",
+)
+
+SELECT_EXCHANGE_RATES_AT_QUERY = BaseDAO.register_query(
+    "exchange_rates.select_all_at",
+    f"""SELECT * FROM ({SELECT_EXCHANGE_RATE_AT_SQL})
+WHERE rate IS NOT NULL;""",
+)
+
+# Rates at a moment between three currencies, in either direction
+SELECT_EXCHANGE_RATES_AT_AMONG_QUERY = BaseDAO.register_query(
+    "exchange_rates.select_at_among",
+    f"""SELECT * FROM ({SELECT_EXCHANGE_RATE_AT_SQL}
+WHERE er.base_currency_id IN (?, ?, ?)
+  AND er.target_currency_id IN (?, ?, ?))
+WHERE rate IS NOT NULL;""",
+)
+
+SELECT_CURRENCY_ID_PAIRS_QUERY = BaseDAO.register_query(
+    "exchange_rates.select_currency_id_pairs",
+    "SELECT base_currency_id, target_currency_id FROM ExchangeRates;",
+)
+
+INSERT_EXCHANGE_RATE_QUERY = BaseDAO.register_query(
+    "exchange_rates.insert",
+    """INSERT INTO ExchangeRates
+    (base_currency_id, target_currency_id, rate)
+VALUES (?, ?, ?);""",
+)
+
+UPDATE_EXCHANGE_RATE_QUERY = BaseDAO.register_query(
+    "exchange_rates.update_rate",
+    """UPDATE ExchangeRates
+SET rate = ?
+WHERE base_currency_id = ? AND target_currency_id = ?;""",
+)
+
+UPSERT_EXCHANGE_RATE_QUERY = BaseDAO.register_query(
+    "exchange_rates.upsert",
+    """INSERT INTO ExchangeRates
+    (base_currency_id, target_currency_id, rate)
+VALUES (?, ?, ?)
+ON CONFLICT (base_currency_id, target_currency_id)
+DO UPDATE SET rate = excluded.rate;""",
+)
 
 
 class ExchangeRateDAO(BaseDAO):
     def __init__(self, exchange_rates_mapper: ExchangeRateMapper):
         self.exchange_rates_mapper = exchange_rates_mapper
 
-    def get_exchange_rates(self) -> list[ExchangeRateView]:
-        """Get all exchange rates from database with joined currency data."""
-        sql = f"{SELECT_EXCHANGE_RATE_QUERY};"
-        rows = self._execute_all(sql)
+    def get_exchange_rates(
+        self, after: int | None = None, limit: int | None = None
+    ) -> list[ExchangeRateView]:
+        """
+        Get all exchange rates from database with joined currency data,
+        or a page of at most ``limit`` of them ordered by id, starting
+        after id ``after``.
+        """
+        if after is None and limit is None:
+            rows = self._execute_all(SELECT_EXCHANGE_RATES_QUERY)
+        else:
+            rows = self._execute_all(
+                SELECT_EXCHANGE_RATES_PAGE_QUERY,
+                (
+                    -1 if after is None else after,
+                    -1 if limit is None else limit,
+                ),
+            )
+
+        return [self._row_to_view(row) for row in rows]
 
-        return [self.exchange_rates_mapper.row_to_view(row) for row in rows]
+    def iter_exchange_rates(
+        self, after: int | None = None, limit: int | None = None
+    ) -> Iterator[ExchangeRateView]:
+        """Iterate exchange rates ordered by id, reading them in pages."""
+        for row in self._iter_pages(
+            SELECT_EXCHANGE_RATES_PAGE_QUERY,
+            after,
+            limit,
+            config.stream_page_size,
+        ):
+            yield self._row_to_view(row)
 
     def get_exchange_rate(
         self, base_currency: str, target_currency: str
     ) -> ExchangeRateView | None:
         """Get exchange rate by base and target currency codes."""
-        sql = f"""{SELECT_EXCHANGE_RATE_QUERY}
-                WHERE bc.code = ? AND tc.code = ?;
-                """
-        row = self._execute_one(sql, (base_currency, target_currency))
-        return self.exchange_rates_mapper.row_to_view(row) if row else None
+        currency_ids = self._get_currency_ids(base_currency, target_currency)
+        if currency_ids is None:
+            return None
+        row = self._execute_one(
+            SELECT_EXCHANGE_RATE_BY_PAIR_QUERY, currency_ids
+        )
+        return self._row_to_view(row) if row else None
+
+    def get_exchange_rate_at(
+        self, base_currency: str, target_currency: str, at: int
+    ) -> ExchangeRateView | None:
+        """
+        Get exchange rate by currency codes as it was at ``at`` Unix
+        milliseconds, None if the pair had no rate yet.
+        """
+        currency_ids = self._get_currency_ids(base_currency, target_currency)
+        if currency_ids is None:
+            return None
+        row = self._execute_one(
+            SELECT_EXCHANGE_RATE_AT_BY_PAIR_QUERY, (at, *currency_ids)
+        )
+        if row is None or row["rate"] is None:
+            return None
+        return self._row_to_view(row)
+
+    def get_exchange_rates_at(self, at: int) -> list[ExchangeRateView]:
+        """Get all exchange rates in effect at ``at`` Unix milliseconds."""
+        rows = self._execute_all(SELECT_EXCHANGE_RATES_AT_QUERY, (at,))
+        return [self._row_to_view(row) for row in rows]
+
+    def get_exchange_rates_at_among(
+        self, codes: Sequence[str], at: int
+    ) -> list[ExchangeRateView]:
+        """
+        Get the exchange rates in effect at ``at`` Unix milliseconds
+        between up to three currencies, unknown codes are skipped.
+        """
+        ids = [
+            currency_id
+            for currency_id in map(currency_registry.get_id, codes)
+            if currency_id is not None
+        ]
+        if not ids:
+            return []
+        # The query takes exactly three ids, repeated ones change nothing
+        ids = (ids * 3)[:3]
+        rows = self._execute_all(
+            SELECT_EXCHANGE_RATES_AT_AMONG_QUERY, (at, *ids, *ids)
+        )
+        return [self._row_to_view(row) for row in rows]
 
     def get_exchange_rate_by_id(self, rate_id: int) -> ExchangeRateView | None:
         """Get exchange rate by its ID."""
-        sql = f"""{SELECT_EXCHANGE_RATE_QUERY}
-                WHERE er.id = ?;
-                """
-        row = self._execute_one(sql, (rate_id,))
-        return self.exchange_rates_mapper.row_to_view(row) if row else None
+        row = self._execute_one(SELECT_EXCHANGE_RATE_BY_ID_QUERY, (rate_id,))
+        return self._row_to_view(row) if row else None
 
     def post_exchange_rate(
-        self, base_code: str, target_code: str, rate_str: str
+        self, base_code: str, target_code: str, rate: int
     ) -> ExchangeRateView:
         """Insert new exchange rate and return inserted entity."""
-        sql = """INSERT INTO ExchangeRates (base_currency_id,
-                                            target_currency_id, rate)
-                        SELECT bc.id, tc.id, ?
-                        FROM Currencies bc CROSS JOIN Currencies tc
-                        WHERE bc.code = ? AND tc.code = ?;
-        """
+        currency_ids = self._get_currency_ids(base_code, target_code)
+        if currency_ids is None:
+            raise CurrencyNotFoundError(
+                "One or both currencies for the exchange rate not found."
+            )
         try:
             inserted_id = self._execute_returning_lastrowid(
-                sql, (rate_str, base_code, target_code)
+                INSERT_EXCHANGE_RATE_QUERY,
+                (*currency_ids, rate),
+                changes=EXCHANGE_RATES_TABLE,
             )
-            if inserted_id == 0:
-                raise CurrencyNotFoundError(
-                    "One or both currencies for the exchange rate not found."
-                )
         except sqlite3.IntegrityError as e:
             raise ExchangeRateAlreadyExistsError(
                 f"Exchange rate for {base_code}-{target_code} already exists."
             ) from e
+        data_version.bump()
 
         inserted_rate = self.get_exchange_rate_by_id(inserted_id)
         if not inserted_rate:
             raise RuntimeError("Failed to retrieve inserted exchange rate")
+        self._publish_rate(inserted_rate)
         return inserted_rate
 
     def patch_exchange_rate(
-        self, base_code: str, target_code: str, rate_str: str
+        self, base_code: str, target_code: str, rate: int
     ) -> ExchangeRateView:
         """Update an existing exchange rate."""
-        sql = """UPDATE ExchangeRates
-                        SET rate = ?
-                        WHERE id = (
-                            SELECT er.id
-                            FROM ExchangeRates er
-                            JOIN Currencies bc ON er.base_currency_id = bc.id
-                            JOIN Currencies tc ON er.target_currency_id = tc.id
-                            WHERE bc.code = ? AND tc.code = ?
-                        );
-"""
-        self._execute(sql, (rate_str, base_code, target_code))
+        currency_ids = self._get_currency_ids(base_code, target_code)
+        if currency_ids is None:
+            raise CurrencyNotFoundError(
+                "One or both currencies for the exchange rate not found."
+            )
+        self._execute(
+            UPDATE_EXCHANGE_RATE_QUERY,
+            (rate, *currency_ids),
+            changes=EXCHANGE_RATES_TABLE,
+        )
+        data_version.bump()
 
         updated_rate = self.get_exchange_rate(base_code, target_code)
         if not updated_rate:
@@ -103,4 +261,78 @@ class ExchangeRateDAO(BaseDAO):
                 "Failed to retrieve updated exchange rate, "
                 "the currency pair may not exist."
             )
+        self._publish_rate(updated_rate)
         return updated_rate
+
+    def update_exchange_rates(
+        self, exchange_rates: Sequence[ExchangeRateView]
+    ) -> None:
+        """Write rates of existing exchange rates in one transaction."""
+        self._execute_many(
+            UPDATE_EXCHANGE_RATE_QUERY,
+            (
+                (
+                    self.exchange_rates_mapper.rate_to_column(er_view.rate),
+                    er_view.base_currency_id,
+                    er_view.target_currency_id,
+                )
+                for er_view in exchange_rates
+            ),
+            changes=EXCHANGE_RATES_TABLE,
+        )
+        data_version.bump()
+        for er_view in exchange_rates:
+            self._publish_rate(er_view)
+
+    def get_currency_id_pairs(self) -> set[tuple[int, int]]:
+        """Get (base, target) currency ids of all stored exchange rates."""
+        rows = self._execute_all(SELECT_CURRENCY_ID_PAIRS_QUERY)
+        return {(row[0], row[1]) for row in rows}
+
+    def upsert_exchange_rates(
+        self, rates: Iterable[tuple[int, int, int]]
+    ) -> None:
+        """
+        Insert or update (base id, target id, rate) exchange rates in one
+        transaction. Rates may be a generator, it is consumed as written.
+        """
+        self._execute_many(
+            UPSERT_EXCHANGE_RATE_QUERY, rates, changes=EXCHANGE_RATES_TABLE
+        )
+        data_version.bump()
+        # Sent to every subscriber instead of an event per imported rate
+        rate_events.publish(
+            RATES_IMPORTED_EVENT,
+            {"message": "Exchange rates were imported, reload the rates."},
+        )
+
+    @staticmethod
+    def _get_currency_ids(
+        base_code: str, target_code: str
+    ) -> tuple[int, int] | None:
+        """Translate currency codes to ids, None if one doesn't exist."""
+        base_id = currency_registry.get_id(base_code)
+        target_id = currency_registry.get_id(target_code)
+        if base_id is None or target_id is None:
+            return None
+        return base_id, target_id
+
+    def _publish_rate(self, er_view: ExchangeRateView) -> None:
+        """Push a written rate to the subscribers of its pair."""
+        rate_events.publish(
+            RATE_EVENT,
+            self.exchange_rates_mapper.view_to_dto(er_view),
+            topic=er_view.base_currency_code + er_view.target_currency_code,
+        )
+
+    def _row_to_view(self, row: sqlite3.Row) -> ExchangeRateView:
+        """Map a rate row to a view with currencies from the registry."""
+        base_currency = currency_registry.get_by_id(row["base_currency_id"])
+        target_currency = currency_registry.get_by_id(
+            row["target_currency_id"]
+        )
+        if base_currency is None or target_currency is None:
+            raise RuntimeError("Exchange rate refers to a missing currency")
+        return self.exchange_rates_mapper.row_to_view(
+            row, base_currency, target_currency
+        )
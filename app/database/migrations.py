@@ -0,0 +1,197 @@
+"""
+Versioned schema migrations.
+
+The schema version is kept in ``PRAGMA user_version``. Every migration
+brings the schema from the version before it to its own (its position in
+MIGRATIONS, counting from 1) and is applied once, in one transaction
+together with the version update. Databases created before versioning
+have version 0, the first migration is written to accept them.
+"""
+import sqlite3
+from collections.abc import Callable
+
+from app.mappers.exchange_rate_mapper import RATE_SCALE
+
+# Current time as integer Unix milliseconds
+NOW_MS_SQL = (
+    "CAST(ROUND((julianday('now') - 2440587.5) * 86400000) AS INTEGER)"
+)
+
+
+def migrate(cursor: sqlite3.Cursor) -> int:
+    """Apply pending migrations and return the schema version."""
+    if not cursor.connection.in_transaction:
+        # Take the write lock before reading the version, so concurrent
+        # processes don't apply the same migration twice
+        cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+    for number, migration in enumerate(
+        MIGRATIONS[version:], start=version + 1
+    ):
+        migration(cursor)
+        cursor.execute(f"PRAGMA user_version = {number}")
+    return max(version, len(MIGRATIONS))
+
+
+def _create_base_schema(cursor: sqlite3.Cursor) -> None:
+    """Currencies, exchange rates stored as TEXT and their history."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS Currencies(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            sign TEXT NOT NULL
+        )""")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ExchangeRates(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            base_currency_id INTEGER NOT NULL,
+            target_currency_id INTEGER NOT NULL,
+            rate TEXT NOT NULL,
+            FOREIGN KEY (base_currency_id) REFERENCES Currencies(id),
+            FOREIGN KEY (target_currency_id) REFERENCES Currencies(id),
+            UNIQUE (base_currency_id, target_currency_id)
+        )""")
+
+    # Append-only history of exchange rates, filled by triggers on every
+    # insert and rate change of ExchangeRates. Rows are keyed by
+    # (base, target, valid_from) in a WITHOUT ROWID table, so the primary
+    # key is the only, covering, index and the rate in effect at a moment
+    # is found with one index seek.
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master "
+        "WHERE type = 'table' AND name = 'ExchangeRateHistory'"
+    )
+    is_new = cursor.fetchone() is None
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ExchangeRateHistory(
+            base_currency_id INTEGER NOT NULL,
+            target_currency_id INTEGER NOT NULL,
+            valid_from INTEGER NOT NULL,
+            rate TEXT NOT NULL,
+            PRIMARY KEY (base_currency_id, target_currency_id, valid_from)
+        ) WITHOUT ROWID""")
+    _create_rate_history_triggers(cursor)
+
+    if is_new:
+        # When they were set is unknown, treat existing rates as in
+        # effect since the epoch
+        cursor.execute("""
+            INSERT INTO ExchangeRateHistory
+            SELECT base_currency_id, target_currency_id, 0, rate
+            FROM ExchangeRates""")
+
+
+def _store_rates_as_integers(cursor: sqlite3.Cursor) -> None:
+    """
+    Store rates as INTEGER scaled by RATE_SCALE.
+
+    Tables are rebuilt, SQLite can't change a column type. Stored rates
+    have at most max_decimal_rate_places decimals and don't exceed
+    max_rate, so scaling their REAL value and rounding is exact.
+    """
+    cursor.execute("""
+        CREATE TABLE ExchangeRates_new(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            base_currency_id INTEGER NOT NULL,
+            target_currency_id INTEGER NOT NULL,
+            rate INTEGER NOT NULL,
+            FOREIGN KEY (base_currency_id) REFERENCES Currencies(id),
+            FOREIGN KEY (target_currency_id) REFERENCES Currencies(id),
+            UNIQUE (base_currency_id, target_currency_id)
+        )""")
+    cursor.execute(f"""
+        INSERT INTO ExchangeRates_new
+        SELECT id, base_currency_id, target_currency_id,
+               CAST(ROUND(CAST(rate AS REAL) * {RATE_SCALE}) AS INTEGER)
+        FROM ExchangeRates
+        ORDER BY id""")
+    # Keep the AUTOINCREMENT counter, ids of deleted rates aren't reused
+    cursor.execute(
+        "DELETE FROM sqlite_sequence WHERE name = 'ExchangeRates_new'"
+    )
+    cursor.execute("""
+        UPDATE sqlite_sequence SET name = 'ExchangeRates_new'
+        WHERE name = 'ExchangeRates'""")
+    # Drops the history triggers too
+    cursor.execute("DROP TABLE ExchangeRates")
+    cursor.execute("ALTER TABLE ExchangeRates_new RENAME TO ExchangeRates")
+
+    cursor.execute("""
+        CREATE TABLE ExchangeRateHistory_new(
+            base_currency_id INTEGER NOT NULL,
+            target_currency_id INTEGER NOT NULL,
+            valid_from INTEGER NOT NULL,
+            rate INTEGER NOT NULL,
+            PRIMARY KEY (base_currency_id, target_currency_id, valid_from)
+        ) WITHOUT ROWID""")
+    cursor.execute(f"""
+        INSERT INTO ExchangeRateHistory_new
+        SELECT base_currency_id, target_currency_id, valid_from,
+               CAST(ROUND(CAST(rate AS REAL) * {RATE_SCALE}) AS INTEGER)
+        FROM ExchangeRateHistory
+        ORDER BY base_currency_id, target_currency_id, valid_from""")
+    cursor.execute("DROP TABLE ExchangeRateHistory")
+    cursor.execute(
+        "ALTER TABLE ExchangeRateHistory_new RENAME TO ExchangeRateHistory"
+    )
+    _create_rate_history_triggers(cursor)
+
+
+def _create_rate_history_triggers(cursor: sqlite3.Cursor) -> None:
+    """Record every insert and rate change of ExchangeRates in history."""
+    # Several writes of a pair within one millisecond keep the last rate
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS exchange_rates_history_insert
+        AFTER INSERT ON ExchangeRates
+        BEGIN
+            INSERT OR REPLACE INTO ExchangeRateHistory
+            VALUES (NEW.base_currency_id, NEW.target_currency_id,
+                    {NOW_MS_SQL}, NEW.rate);
+        END""")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS exchange_rates_history_update
+        AFTER UPDATE OF rate ON ExchangeRates
+        WHEN NEW.rate IS NOT OLD.rate
+        BEGIN
+            INSERT OR REPLACE INTO ExchangeRateHistory
+            VALUES (NEW.base_currency_id, NEW.target_currency_id,
+                    {NOW_MS_SQL}, NEW.rate);
+        END""")
+
+
+def _count_table_changes(cursor: sqlite3.Cursor) -> None:
+    """
+    Count written rows of Currencies and ExchangeRates in ChangeCounters,
+    so processes sharing the database notice each other's writes.
+    """
+    cursor.execute("""
+        CREATE TABLE ChangeCounters(
+            table_name TEXT PRIMARY KEY,
+            counter INTEGER NOT NULL
+        ) WITHOUT ROWID""")
+    for table, trigger_prefix in (
+        ("Currencies", "currencies"),
+        ("ExchangeRates", "exchange_rates"),
+    ):
+        cursor.execute(
+            "INSERT INTO ChangeCounters VALUES (?, 0)", (table,)
+        )
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER {trigger_prefix}_count_{operation.lower()}
+                AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE ChangeCounters SET counter = counter + 1
+                    WHERE table_name = '{table}';
+                END""")
+
+
+MIGRATIONS: list[Callable[[sqlite3.Cursor], None]] = [
+    _create_base_schema,
+    _store_rates_as_integers,
+    _count_table_changes,
+]
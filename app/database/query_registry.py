@@ -0,0 +1,248 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Query:
+    """SQL statement registered under a unique name."""
+
+    name: str
+    sql: str
+
+
+class QueryRegistry:
+    """
+    Statements of the DAOs, each defined once at import time, with their
+    execution counts and timings.
+
+    sqlite3 keeps compiled statements in a per-connection cache keyed by
+    the SQL text. Pooled connections are long-lived and their cache is
+    sized to hold every registered statement, so each statement is
+    prepared once per connection and reused afterwards.
+
+    Executions taking ``slow_threshold`` seconds or longer are logged
+    with their parameters redacted to types and kept in a ring of the
+    latest ``slow_log_size``. The query plan of a slow statement is
+    captured with EXPLAIN QUERY PLAN once per SQL text.
+    """
+
+    def __init__(
+        self,
+        slow_threshold: float | None = None,
+        slow_log_size: int = 100,
+    ) -> None:
+        self.slow_threshold = slow_threshold
+        self._queries: dict[str, Query] = {}
+        # name -> [executions, total seconds, max seconds, slow executions]
+        self._timings: dict[str, list[float]] = {}
+        self._slow_queries: deque[dict[str, Any]] = deque(
+            maxlen=slow_log_size
+        )
+        # SQL text -> query plan lines
+        self._plans: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._queries)
+
+    def register(self, name: str, sql: str) -> Query:
+        """Define a statement, names must be unique."""
+        with self._lock:
+            if name in self._queries:
+                raise ValueError(f"Query {name} is already registered")
+            query = Query(name, sql)
+            self._queries[name] = query
+            self._timings[name] = [0, 0.0, 0.0, 0]
+            return query
+
+    def timing(
+        self,
+        query: Query,
+        cursor: sqlite3.Cursor | None = None,
+        params: tuple | Iterable[tuple] | None = None,
+    ) -> "_Timing":
+        """
+        Context manager counting an execution of the statement and
+        recording its duration. The cursor and parameters are used to
+        report the execution if it is slow.
+        """
+        return _Timing(self, query, cursor, params)
+
+    def record(self, query: Query, seconds: float) -> None:
+        with self._lock:
+            timings = self._timings[query.name]
+            timings[0] += 1
+            timings[1] += seconds
+            if seconds > timings[2]:
+                timings[2] = seconds
+
+    def record_slow(
+        self,
+        query: Query,
+        seconds: float,
+        cursor: sqlite3.Cursor | None,
+        params: tuple | Iterable[tuple] | None,
+    ) -> None:
+        """Log a slow execution and capture the plan of its SQL."""
+        redacted = _redact(params)
+        logger.warning(
+            "Slow query %s took %.1f ms, parameters %s",
+            query.name, seconds * 1000, redacted,
+        )
+        with self._lock:
+            self._timings[query.name][3] += 1
+            self._slow_queries.append({
+                "query": query.name,
+                "ms": seconds * 1000,
+                "parameters": redacted,
+                "at": datetime.now(timezone.utc).isoformat(
+                    timespec="milliseconds"
+                ),
+            })
+            needs_plan = query.sql not in self._plans
+        if needs_plan and cursor is not None:
+            plan = _explain(cursor.connection, query.sql, params)
+            with self._lock:
+                self._plans.setdefault(query.sql, plan)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        Get executions, total, mean and max milliseconds and slow
+        executions of every registered statement.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "executions": count,
+                    "total_ms": total * 1000,
+                    "mean_ms": total * 1000 / count if count else 0.0,
+                    "max_ms": max_seconds * 1000,
+                    "slow": slow,
+                }
+                for name, (count, total, max_seconds, slow)
+                in self._timings.items()
+            }
+
+    def report(self) -> dict[str, Any]:
+        """
+        Get statistics, SQL and captured plan of every statement and the
+        latest slow executions, newest first.
+        """
+        stats = self.stats()
+        with self._lock:
+            plans = dict(self._plans)
+            slow_queries = list(reversed(self._slow_queries))
+        return {
+            "slowQueryThresholdMs": (
+                self.slow_threshold * 1000
+                if self.slow_threshold is not None
+                else None
+            ),
+            "queries": [
+                {
+                    "name": name,
+                    "sql": " ".join(query.sql.split()),
+                    **stats[name],
+                    "plan": plans.get(query.sql),
+                }
+                for name, query in sorted(self._queries.items())
+            ],
+            "slowQueries": slow_queries,
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for timings in self._timings.values():
+                timings[:] = [0, 0.0, 0.0, 0]
+            self._slow_queries.clear()
+
+
+class _Timing:
+    """Cheaper than a generator based context manager, it wraps every
+    statement execution."""
+
+    __slots__ = ("registry", "query", "cursor", "params", "start")
+
+    def __init__(
+        self,
+        registry: QueryRegistry,
+        query: Query,
+        cursor: sqlite3.Cursor | None,
+        params: tuple | Iterable[tuple] | None,
+    ) -> None:
+        self.registry = registry
+        self.query = query
+        self.cursor = cursor
+        self.params = params
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type: type | None, *exc_info: object) -> None:
+        seconds = time.perf_counter() - self.start
+        self.registry.record(self.query, seconds)
+        threshold = self.registry.slow_threshold
+        if (
+            threshold is not None
+            and seconds >= threshold
+            and exc_type is None
+        ):
+            self.registry.record_slow(
+                self.query, seconds, self.cursor, self.params
+            )
+
+
+def _redact(params: tuple | Iterable[tuple] | None) -> str:
+    """Show parameter types only, values may be sensitive."""
+    if params is None:
+        return "()"
+    if not isinstance(params, (tuple, list)):
+        return "(executemany)"
+    return "(" + ", ".join(f"<{type(p).__name__}>" for p in params) + ")"
+
+
+def _explain(
+    connection: sqlite3.Connection,
+    sql: str,
+    params: tuple | Iterable[tuple] | None,
+) -> list[str]:
+    """
+    Get the query plan as indented lines. Statements executed for many
+    parameter tuples are explained with NULL parameters.
+    """
+    if not isinstance(params, (tuple, list)):
+        params = (None,) * sql.count("?")
+    try:
+        rows = connection.execute(
+            f"EXPLAIN QUERY PLAN {sql}", params
+        ).fetchall()
+    except sqlite3.Error as e:
+        return [f"EXPLAIN QUERY PLAN failed: {e}"]
+    # Rows are (id, parent id, unused, detail), children follow parents
+    depths = {0: -1}
+    lines = []
+    for node_id, parent_id, _unused, detail in rows:
+        depth = depths[node_id] = depths.get(parent_id, -1) + 1
+        lines.append("  " * depth + detail)
+    return lines
+
+
+query_registry = QueryRegistry(
+    slow_threshold=(
+        config.db_slow_query_ms / 1000
+        if config.db_slow_query_ms is not None
+        else None
+    ),
+    slow_log_size=config.db_slow_query_log_size,
+)
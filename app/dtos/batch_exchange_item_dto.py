@@ -0,0 +1,9 @@
+from dataclasses import dataclass
+
+from .calculated_exchange_dto import CalculatedExchangeDTO
+
+
+@dataclass(frozen=True)
+class BatchExchangeItemDTO:
+    result: CalculatedExchangeDTO | None
+    error: str | None
@@ -0,0 +1,10 @@
+from dataclasses import dataclass
+
+from .import_row_error_dto import ImportRowErrorDTO
+
+
+@dataclass(frozen=True)
+class ImportReportDTO:
+    created: int
+    updated: int
+    errors: list[ImportRowErrorDTO]
@@ -0,0 +1,7 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ImportRowErrorDTO:
+    line: int
+    error: str
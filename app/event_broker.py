@@ -0,0 +1,294 @@
+"""
+Server-sent events pushed to subscribed clients.
+
+Writers publish events to a topic, and every subscriber of that topic,
+or of all topics, gets the encoded event appended to its own bounded
+queue. An event is encoded once, however many subscribers get it. A
+subscriber whose queue is full is dropped: it receives a last "dropped"
+event and its stream ends, so a slow client can't hold events or the
+writers back.
+
+Streams are read by the threaded front end, which blocks a worker
+thread, or by the asyncio front end, which waits on the event loop
+without a thread per subscriber. Subscribers of one event loop are woken
+with a single callback per event.
+"""
+import asyncio
+import threading
+from collections import deque
+from collections.abc import Iterable
+from typing import Any
+
+from app.config import config
+from app.exceptions import EventStreamUnavailableError
+from app.view.json_serializer import serialize
+
+EVENT_STREAM_CONTENT_TYPE = "text/event-stream; charset=utf-8"
+
+# Sent while no events come, keeps proxies from closing the connection
+# and lets the threaded front end notice clients that have gone away
+HEARTBEAT_FRAME = b": heartbeat\n\n"
+
+
+class EventStream:
+    """
+    Events of one subscriber, as chunks of the response body.
+
+    Iterating blocks the thread, async iterating waits on the running
+    event loop. Ends once the broker closes, or after the "dropped"
+    event when the subscriber has fallen behind.
+    """
+
+    def __init__(
+        self,
+        broker: "EventBroker",
+        topics: frozenset[str] | None,
+        queue_size: int,
+        heartbeat: float,
+    ) -> None:
+        self.broker = broker
+        self.topics = topics
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._frames: deque[bytes] = deque()
+        self._started = False
+        self._dropped = False
+        self._closed = False
+        # Wakes a reading thread
+        self._ready = threading.Event()
+        # Wakes a reading coroutine, set up on the first async iteration
+        self.async_ready: asyncio.Event | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    def __iter__(self) -> "EventStream":
+        return self
+
+    def __next__(self) -> bytes:
+        while True:
+            chunk = self._take()
+            if chunk is not None:
+                return chunk
+            if self._closed:
+                raise StopIteration
+            self._ready.clear()
+            if self._frames or self._dropped or self._closed:
+                continue
+            if not self._ready.wait(self.heartbeat):
+                return HEARTBEAT_FRAME
+
+    def __aiter__(self) -> "EventStream":
+        if self.loop is None:
+            # Set before the loop, a publisher seeing the loop wakes it
+            self.async_ready = asyncio.Event()
+            self.loop = asyncio.get_running_loop()
+        return self
+
+    async def __anext__(self) -> bytes:
+        assert self.async_ready is not None
+        while True:
+            chunk = self._take()
+            if chunk is not None:
+                return chunk
+            if self._closed:
+                raise StopAsyncIteration
+            self.async_ready.clear()
+            if self._frames or self._dropped or self._closed:
+                continue
+            try:
+                await asyncio.wait_for(
+                    self.async_ready.wait(), self.heartbeat
+                )
+            except asyncio.TimeoutError:
+                return HEARTBEAT_FRAME
+
+    def close(self) -> None:
+        """Unsubscribe and end the stream, from any thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self.broker.unsubscribe(self)
+        self.wake()
+
+    async def aclose(self) -> None:
+        self.close()
+
+    def offer(self, frame: bytes) -> bool:
+        """
+        Queue an encoded event, False if the queue is full and the
+        subscriber is dropped instead. Called by the broker.
+        """
+        if self._dropped:
+            return False
+        if len(self._frames) >= self.queue_size:
+            self._dropped = True
+            # The client has to reload the rates anyway
+            self._frames.clear()
+            return False
+        self._frames.append(frame)
+        return True
+
+    def wake(self) -> None:
+        """Wake the reader up, from any thread."""
+        loop = self.loop
+        if loop is None:
+            self._ready.set()
+            return
+        try:
+            loop.call_soon_threadsafe(self.async_ready.set)
+        except RuntimeError:
+            # The event loop is closed, nobody reads anymore
+            pass
+
+    def _take(self) -> bytes | None:
+        """Get the queued events as one chunk, None if there are none."""
+        if not self._started:
+            self._started = True
+            return b"retry: %d\n\n" % config.sse_retry_ms
+        if self._frames:
+            frames = []
+            try:
+                while True:
+                    frames.append(self._frames.popleft())
+            except IndexError:
+                pass
+            return b"".join(frames)
+        if self._dropped and not self._closed:
+            self.close()
+            return encode_event(
+                "dropped",
+                {"message": "Too many undelivered events, reload the rates."},
+            )
+        return None
+
+
+class EventBroker:
+    def __init__(
+        self,
+        queue_size: int = 256,
+        max_subscribers: int = 10000,
+        heartbeat: float = 15.0,
+    ) -> None:
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._streams: set[EventStream] = set()
+        # Subscribers of every topic, and subscribers by topic
+        self._everything: set[EventStream] = set()
+        self._by_topic: dict[str, set[EventStream]] = {}
+        self._event_id = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics: Iterable[str] | None = None) -> EventStream:
+        """Open a stream of events of the topics, of all if None."""
+        stream = EventStream(
+            self,
+            frozenset(topics) if topics is not None else None,
+            self.queue_size,
+            self.heartbeat,
+        )
+        with self._lock:
+            if self._closed:
+                raise EventStreamUnavailableError(
+                    "The server is shutting down."
+                )
+            if self.max_subscribers == 0:
+                raise EventStreamUnavailableError(
+                    "Event streams are not served in this server mode."
+                )
+            if len(self._streams) >= self.max_subscribers:
+                raise EventStreamUnavailableError(
+                    "Too many event stream subscribers, try again later."
+                )
+            self._streams.add(stream)
+            if stream.topics is None:
+                self._everything.add(stream)
+            else:
+                for topic in stream.topics:
+                    self._by_topic.setdefault(topic, set()).add(stream)
+        return stream
+
+    def unsubscribe(self, stream: EventStream) -> None:
+        with self._lock:
+            if stream not in self._streams:
+                return
+            self._streams.remove(stream)
+            if stream.topics is None:
+                self._everything.remove(stream)
+                return
+            for topic in stream.topics:
+                subscribers = self._by_topic[topic]
+                subscribers.remove(stream)
+                if not subscribers:
+                    del self._by_topic[topic]
+
+    def publish(
+        self, event: str, data: Any, topic: str | None = None
+    ) -> None:
+        """
+        Send an event to the subscribers of its topic and of all topics,
+        or to every subscriber if the topic is None.
+        """
+        # Nothing is encoded while nobody listens
+        if not self._streams:
+            return
+        with self._lock:
+            self._event_id += 1
+            frame = encode_event(event, data, self._event_id)
+            if topic is None:
+                streams = set(self._streams)
+            else:
+                streams = self._everything | self._by_topic.get(topic, set())
+            # Queued under the lock, so events are queued in id order
+            dropped = [
+                stream for stream in streams if not stream.offer(frame)
+            ]
+        for stream in dropped:
+            self.unsubscribe(stream)
+        self._wake(streams)
+
+    def close(self) -> None:
+        """End all streams and refuse new subscribers."""
+        with self._lock:
+            self._closed = True
+            streams = list(self._streams)
+        for stream in streams:
+            stream.close()
+
+    @staticmethod
+    def _wake(streams: Iterable[EventStream]) -> None:
+        """Wake readers, with one callback per event loop."""
+        by_loop: dict[asyncio.AbstractEventLoop, list[asyncio.Event]] = {}
+        for stream in streams:
+            loop = stream.loop
+            if loop is None:
+                stream.wake()
+            else:
+                by_loop.setdefault(loop, []).append(stream.async_ready)
+        for loop, ready_events in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(_set_all, ready_events)
+            except RuntimeError:
+                # The event loop is closed, nobody reads anymore
+                pass
+
+
+def _set_all(ready_events: list[asyncio.Event]) -> None:
+    for ready in ready_events:
+        ready.set()
+
+
+def encode_event(event: str, data: Any, event_id: int | None = None) -> bytes:
+    """Encode an event with JSON data in the text/event-stream format."""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    # Serialized JSON has no line breaks
+    lines.append(f"data: {serialize(data)}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+rate_events = EventBroker(
+    queue_size=config.sse_queue_size,
+    max_subscribers=config.sse_max_subscribers,
+    heartbeat=config.sse_heartbeat_interval,
+)
@@ -39,3 +39,17 @@ class DatabaseError(ApplicationException): ...
 class UnsupportedHTTPMethodError(ValidationError): ...
 
 class SameCurrencyError(ValidationError): ...
+
+class InvalidRequestBodyError(ValidationError): ...
+
+class InvalidBatchError(ValidationError): ...
+
+class InvalidPaginationError(ValidationError): ...
+
+class InvalidImportError(ValidationError): ...
+
+class InvalidTimestampError(ValidationError): ...
+
+class RouteDefinitionError(ApplicationException): ...
+
+class EventStreamUnavailableError(ApplicationException): ...
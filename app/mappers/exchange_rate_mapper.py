@@ -2,21 +2,40 @@ import sqlite3
 from decimal import Decimal
 from typing import Any
 
+from app.config import config
 from app.dtos.create_exchange_rate_dto import CreateExchangeRateDTO
 from app.dtos.currency_dto import CurrencyDTO
 from app.dtos.exchange_rate_dto import ExchangeRateDTO
+from app.models.currency import Currency
 from app.read_models.exchange_rate_view import ExchangeRateView
 
+# Rates are stored as INTEGER scaled by 10**max_decimal_rate_places,
+# changing the setting needs a migration of the stored rates
+RATE_SCALE = 10**config.max_decimal_rate_places
+RATE_UNIT = Decimal(1).scaleb(-config.max_decimal_rate_places)
+
 
 class ExchangeRateMapper:
     @staticmethod
-    def row_to_view(row: sqlite3.Row) -> ExchangeRateView:
-        """Converts database row to ExchangeRateView read model."""
-        data = dict(row)
-        # Ensure rate is Decimal (row contains TEXT)
-        if "rate" in data and data["rate"] is not None:
-            data["rate"] = Decimal(str(data["rate"]))
-        return ExchangeRateView(**data)
+    def row_to_view(
+        row: sqlite3.Row, base_currency: Currency, target_currency: Currency
+    ) -> ExchangeRateView:
+        """
+        Converts database row of a rate and its currencies to
+        ExchangeRateView read model.
+        """
+        return ExchangeRateView(
+            id=row["id"],
+            base_currency_id=base_currency.id,
+            base_currency_name=base_currency.name,
+            base_currency_code=base_currency.code,
+            base_currency_sign=base_currency.sign,
+            target_currency_id=target_currency.id,
+            target_currency_name=target_currency.name,
+            target_currency_code=target_currency.code,
+            target_currency_sign=target_currency.sign,
+            rate=ExchangeRateMapper.column_to_rate(row["rate"]),
+        )
 
     @staticmethod
     def view_to_dto(er_view: ExchangeRateView) -> ExchangeRateDTO:
@@ -51,10 +70,26 @@ class ExchangeRateMapper:
     @staticmethod
     def dto_to_insert_args(
         dto: CreateExchangeRateDTO,
-    ) -> tuple[str, str, str]:
-        """Normalize DTO for DAO insert (rate as TEXT)."""
+    ) -> tuple[str, str, int]:
+        """Normalize DTO for DAO insert (rate as scaled INTEGER)."""
         return (
             dto.base_currency_code,
             dto.target_currency_code,
-            str(dto.rate),
+            ExchangeRateMapper.rate_to_column(dto.rate),
         )
+
+    @staticmethod
+    def column_to_rate(rate: int) -> Decimal:
+        """Unscale a stored INTEGER rate."""
+        return Decimal(rate) * RATE_UNIT
+
+    @staticmethod
+    def rate_to_column(rate: Decimal) -> int:
+        """Scale a validated rate to its stored INTEGER."""
+        scaled = rate.scaleb(config.max_decimal_rate_places)
+        if scaled != scaled.to_integral_value():
+            raise ValueError(
+                f"Rate {rate} has more than "
+                f"{config.max_decimal_rate_places} decimal places"
+            )
+        return int(scaled)
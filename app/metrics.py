@@ -0,0 +1,363 @@
+"""
+Request metrics exposed in the Prometheus text format.
+
+Every thread accumulates into its own shard, which only that thread
+writes, so recording takes no locks. A scrape merges the shards; it may
+miss an observation that is being recorded at that moment, but counters
+never go backwards. Shards of finished threads are kept, server threads
+are long-lived.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterable, Mapping
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+# Request stages, in the order they run. "dao" is the time spent in
+# database sessions during the handler, which is not counted in
+# "handler". Streamed bodies are read while they are rendered and
+# written, their reads count to "render" and "write".
+STAGES = ("routing", "parse", "handler", "dao", "render", "write")
+ROUTING, PARSE, HANDLER, DAO, RENDER, WRITE = range(len(STAGES))
+
+# Route label of requests that matched no route
+UNMATCHED_ROUTE = "unmatched"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histograms are lists of per bucket counts, the +Inf bucket count and
+# the sum of observed values
+_HISTOGRAM_SIZE = len(LATENCY_BUCKETS) + 2
+
+
+def _new_histogram() -> list[float]:
+    return [0] * _HISTOGRAM_SIZE
+
+
+class RequestTimer:
+    """
+    Stage durations of one request.
+
+    ``mark`` adds the time since the previous mark to a stage. Stages
+    that did not run stay None and are not observed.
+    """
+
+    __slots__ = ("method", "route", "stages", "db_seconds", "_last")
+
+    def __init__(self, method: str) -> None:
+        self.method = method
+        self.route = UNMATCHED_ROUTE
+        self.stages: list[float | None] = [None] * len(STAGES)
+        self.db_seconds = 0.0
+        self._last = time.perf_counter()
+
+    def mark(self, stage: int) -> None:
+        now = time.perf_counter()
+        seconds = self.stages[stage]
+        elapsed = now - self._last
+        self.stages[stage] = elapsed if seconds is None else seconds + elapsed
+        self._last = now
+
+    def restart(self) -> None:
+        """Don't count the time since the last mark in any stage."""
+        self._last = time.perf_counter()
+
+
+class _Shard:
+    """Metrics recorded by one thread."""
+
+    __slots__ = ("routes", "requests", "db_acquire", "timer")
+
+    def __init__(self) -> None:
+        # route -> histograms of every stage and of the whole request
+        self.routes: dict[str, list[list[float]]] = {}
+        # (method, route, status) -> count
+        self.requests: dict[tuple[str, str, int], int] = {}
+        self.db_acquire = _new_histogram()
+        # Timer of the request whose handler runs on the thread
+        self.timer: RequestTimer | None = None
+
+
+class Metrics:
+    """Request, database and response cache metrics of the process."""
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._shards: list[_Shard] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            return self._add_shard()
+
+    def _add_shard(self) -> _Shard:
+        shard = self._local.shard = _Shard()
+        with self._lock:
+            self._shards.append(shard)
+        return shard
+
+    def begin_handler(self, timer: RequestTimer) -> None:
+        """Count database sessions of the thread to the request."""
+        self._shard().timer = timer
+
+    def end_handler(self, timer: RequestTimer) -> None:
+        self._shard().timer = None
+        timer.mark(HANDLER)
+
+    def finish_request(self, timer: RequestTimer, status: int) -> None:
+        """Record stage durations and the response status of a request."""
+        shard = self._shard()
+        stages = timer.stages
+        handler_seconds = stages[HANDLER]
+        if handler_seconds is not None:
+            db_seconds = min(timer.db_seconds, handler_seconds)
+            stages[HANDLER] = handler_seconds - db_seconds
+            stages[DAO] = db_seconds
+
+        route = timer.route
+        histograms = shard.routes.get(route)
+        if histograms is None:
+            histograms = [_new_histogram() for _ in range(len(STAGES) + 1)]
+            shard.routes[route] = histograms
+        total = 0.0
+        for histogram, seconds in zip(histograms, stages):
+            if seconds is not None:
+                total += seconds
+                histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+                histogram[-1] += seconds
+        histogram = histograms[-1]
+        histogram[bisect_left(LATENCY_BUCKETS, total)] += 1
+        histogram[-1] += total
+
+        key = (timer.method, route, int(status))
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+
+    def observe_db_session(
+        self, acquire_seconds: float, session_seconds: float
+    ) -> None:
+        """
+        Record the time a session waited for a pooled connection, and
+        count the whole session to the request handled by the thread.
+        """
+        # Inlined _shard, called for every statement
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._add_shard()
+        histogram = shard.db_acquire
+        histogram[bisect_left(LATENCY_BUCKETS, acquire_seconds)] += 1
+        histogram[-1] += acquire_seconds
+        if shard.timer is not None:
+            shard.timer.db_seconds += session_seconds
+
+    def render(
+        self,
+        cache_stats: Mapping[str, int | float] | None = None,
+        query_stats: Mapping[str, Mapping[str, float]] | None = None,
+    ) -> str:
+        """
+        Merge the shards and render them, with response cache and query
+        registry statistics when given, in the Prometheus text format.
+        """
+        routes: dict[str, list[list[float]]] = {}
+        requests: dict[tuple[str, str, int], int] = {}
+        db_acquire = _new_histogram()
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # Copies are taken at once, the owning thread may be writing
+            for route, histograms in dict(shard.routes).items():
+                merged = routes.setdefault(
+                    route, [_new_histogram() for _ in histograms]
+                )
+                for into, histogram in zip(merged, histograms):
+                    _merge(into, histogram)
+            for key, count in dict(shard.requests).items():
+                requests[key] = requests.get(key, 0) + count
+            _merge(db_acquire, shard.db_acquire)
+
+        errors: dict[tuple[str, int], int] = {}
+        for (_method, route, status), count in requests.items():
+            if status >= 400:
+                key = (route, status)
+                errors[key] = errors.get(key, 0) + count
+
+        lines: list[str] = []
+        _counter(
+            lines,
+            "http_requests_total",
+            "Requests by method, route and response status.",
+            (
+                ({"method": m, "route": r, "status": s}, count)
+                for (m, r, s), count in sorted(requests.items())
+            ),
+        )
+        _counter(
+            lines,
+            "http_request_errors_total",
+            "Responses with a 4xx or 5xx status by route and status.",
+            (
+                ({"route": r, "status": s}, count)
+                for (r, s), count in sorted(errors.items())
+            ),
+        )
+        _histogram(
+            lines,
+            "http_request_duration_seconds",
+            "Time from the parsed request to the written response.",
+            (
+                ({"route": route}, histograms[-1])
+                for route, histograms in sorted(routes.items())
+            ),
+        )
+        _histogram(
+            lines,
+            "http_request_stage_seconds",
+            "Time spent in each stage of a request: "
+            + ", ".join(STAGES) + ".",
+            (
+                ({"route": route, "stage": stage}, histogram)
+                for route, histograms in sorted(routes.items())
+                for stage, histogram in zip(STAGES, histograms)
+                # Stages the requests of the route never reached
+                if any(histogram[:-1])
+            ),
+        )
+        _histogram(
+            lines,
+            "db_connection_acquire_seconds",
+            "Time a database session waited for a pooled connection.",
+            [({}, db_acquire)],
+        )
+
+        if query_stats is not None:
+            _counter(
+                lines,
+                "db_query_executions_total",
+                "Executions of registered queries.",
+                (
+                    ({"query": name}, stats["executions"])
+                    for name, stats in sorted(query_stats.items())
+                ),
+            )
+            _counter(
+                lines,
+                "db_query_seconds_total",
+                "Time spent executing registered queries.",
+                (
+                    ({"query": name}, stats["total_ms"] / 1000)
+                    for name, stats in sorted(query_stats.items())
+                ),
+            )
+            _counter(
+                lines,
+                "db_query_slow_total",
+                "Executions of registered queries over the slow query "
+                "threshold.",
+                (
+                    ({"query": name}, stats["slow"])
+                    for name, stats in sorted(query_stats.items())
+                ),
+            )
+
+        if cache_stats is not None:
+            _counter(
+                lines,
+                "response_cache_hits_total",
+                "Responses served from the response cache.",
+                [({}, cache_stats["hits"])],
+            )
+            _counter(
+                lines,
+                "response_cache_misses_total",
+                "Cacheable responses missing from the response cache.",
+                [({}, cache_stats["misses"])],
+            )
+            _gauge(
+                lines,
+                "response_cache_hit_ratio",
+                "Share of response cache lookups that were hits.",
+                [({}, cache_stats["hit_rate"])],
+            )
+            _gauge(
+                lines,
+                "response_cache_entries",
+                "Responses in the response cache.",
+                [({}, cache_stats["size"])],
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _merge(into: list[float], histogram: list[float]) -> None:
+    for index, value in enumerate(list(histogram)):
+        into[index] += value
+
+
+def _labels(labels: Mapping[str, object]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels.items()
+    )
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    )
+
+
+def _header(lines: list[str], name: str, help_text: str, kind: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+
+
+def _counter(
+    lines: list[str],
+    name: str,
+    help_text: str,
+    samples: Iterable[tuple[Mapping[str, object], float]],
+    kind: str = "counter",
+) -> None:
+    _header(lines, name, help_text, kind)
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+
+def _gauge(
+    lines: list[str],
+    name: str,
+    help_text: str,
+    samples: Iterable[tuple[Mapping[str, object], float]],
+) -> None:
+    _counter(lines, name, help_text, samples, kind="gauge")
+
+
+def _histogram(
+    lines: list[str],
+    name: str,
+    help_text: str,
+    samples: Iterable[tuple[Mapping[str, object], list[float]]],
+) -> None:
+    _header(lines, name, help_text, "histogram")
+    for labels, histogram in samples:
+        cumulative = 0
+        for bound, count in zip(
+            (*LATENCY_BUCKETS, "+Inf"), histogram[:-1]
+        ):
+            cumulative += count
+            bucket_labels = _labels({**labels, "le": bound})
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram[-1]}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+
+metrics = Metrics()
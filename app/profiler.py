@@ -0,0 +1,154 @@
+"""
+Opt-in profiling of request handlers.
+
+A sampled fraction of requests, and requests carrying the configured
+profiling token, run their handler under cProfile and tracemalloc. Each
+profiled request leaves a pstats dump and a text report of the slowest
+functions and the top allocating lines in the profiling directory. Reports
+of a route are kept in a ring of ``max_reports`` slots, so the directory
+doesn't grow. tracemalloc is process wide, so only one request is
+profiled at a time and others are served without profiling meanwhile.
+"""
+import cProfile
+import hmac
+import io
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable, Mapping
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+# Lower-cased request header that asks for profiling
+PROFILE_TOKEN_HEADER = "x-profile-token"
+# Response header with the name of the written report
+PROFILE_REPORT_HEADER = "X-Profile-Report"
+# Stack frames stored per traced allocation
+TRACEMALLOC_FRAMES = 1
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        directory: Path,
+        sample_rate: float = 0.0,
+        token: str | None = None,
+        max_reports: int = 20,
+        top_entries: int = 30,
+    ) -> None:
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token
+        self.max_reports = max_reports
+        self.top_entries = top_entries
+        # Held while a request is profiled
+        self._lock = threading.Lock()
+        # route -> reports written, the next ring slot
+        self._reports: dict[str, int] = {}
+
+    def should_profile(self, headers: Mapping[str, str]) -> bool:
+        """Check if the request carries the token or is sampled."""
+        if self.token is not None:
+            supplied = headers.get(PROFILE_TOKEN_HEADER)
+            if supplied is not None and hmac.compare_digest(
+                supplied.encode(), self.token.encode()
+            ):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def profile(
+        self,
+        route: str,
+        handler: Callable[..., Any],
+        params: Mapping[str, Any],
+    ) -> tuple[Any, str | None]:
+        """
+        Call the handler under the profilers and return its result and
+        the report name, None if another request is being profiled or the
+        report couldn't be written. Streamed payloads are produced after
+        the handler returns, that work is not in the report.
+        """
+        if not self._lock.acquire(blocking=False):
+            return handler(**params), None
+        try:
+            profiler = cProfile.Profile()
+            # Keep tracing started elsewhere, e.g. by PYTHONTRACEMALLOC
+            was_tracing = tracemalloc.is_tracing()
+            if not was_tracing:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            start = time.perf_counter()
+            try:
+                result = profiler.runcall(handler, **params)
+            finally:
+                seconds = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                _current, peak = tracemalloc.get_traced_memory()
+                if not was_tracing:
+                    tracemalloc.stop()
+                report = self._write_report(
+                    route, profiler, snapshot, peak, seconds
+                )
+            return result, report
+        finally:
+            self._lock.release()
+
+    def _write_report(
+        self,
+        route: str,
+        profiler: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        peak_bytes: int,
+        seconds: float,
+    ) -> str | None:
+        """Write pstats dump and text report into the next ring slot."""
+        written = self._reports.get(route, 0)
+        self._reports[route] = written + 1
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        name = f"{slug}.{written % self.max_reports}"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(self.directory / f"{name}.prof")
+            (self.directory / f"{name}.txt").write_text(
+                self._render_report(
+                    route, profiler, snapshot, peak_bytes, seconds
+                ),
+                encoding="utf-8",
+            )
+        except OSError:
+            return None
+        return name
+
+    def _render_report(
+        self,
+        route: str,
+        profiler: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        peak_bytes: int,
+        seconds: float,
+    ) -> str:
+        stats_text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stats_text)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+        stats.print_stats(self.top_entries)
+
+        # Allocations of other threads running meanwhile are included
+        allocations = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        ).statistics("lineno")[:self.top_entries]
+        created_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        lines = [
+            f"Route: {route}",
+            f"Profiled at: {created_at}",
+            f"Handler time: {seconds * 1000:.3f} ms (under the profilers)",
+            f"Traced memory peak: {peak_bytes} bytes",
+            "",
+            f"Top {self.top_entries} functions by cumulative time:",
+            stats_text.getvalue(),
+            f"Top {self.top_entries} allocating lines:",
+            *(str(statistic) for statistic in allocations),
+        ]
+        return "\n".join(lines) + "\n"
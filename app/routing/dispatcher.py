@@ -0,0 +1,361 @@
+import hmac
+import json
+from collections.abc import Iterator, Mapping
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from app.database.change_tracker import ChangeTracker
+from app.database.data_version import DataVersion
+from app.exceptions import (
+    AlreadyExistsError,
+    ApplicationException,
+    DatabaseError,
+    EventStreamUnavailableError,
+    InvalidRequestBodyError,
+    NotFoundError,
+    ValidationError,
+)
+from app.metrics import PARSE, RENDER, ROUTING, RequestTimer, metrics
+from app.profiler import PROFILE_REPORT_HEADER, RequestProfiler
+from app.routing.router import Router
+from app.view.response import Response
+from app.view.response_cache import ResponseCache
+
+# Map application exceptions to HTTP status codes
+EXCEPTION_TO_STATUS = {
+    ValidationError: HTTPStatus.BAD_REQUEST,
+    NotFoundError: HTTPStatus.NOT_FOUND,
+    AlreadyExistsError: HTTPStatus.CONFLICT,
+    DatabaseError: HTTPStatus.INTERNAL_SERVER_ERROR,
+    EventStreamUnavailableError: HTTPStatus.SERVICE_UNAVAILABLE,
+}
+
+SUPPORTED_METHODS = ("GET", "POST", "PATCH", "OPTIONS")
+
+# Bodies passed to handlers as they are, as ``raw_body`` and ``media_type``
+RAW_BODY_MEDIA_TYPES = (
+    "text/csv",
+    "application/x-ndjson",
+    "application/ndjson",
+)
+
+# Lower-cased request header authorizing admin routes
+ADMIN_TOKEN_HEADER = "x-admin-token"
+
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, PATCH, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+}
+
+
+class RequestDispatcher:
+    """
+    Transport independent request processing.
+
+    Takes an already parsed HTTP request, resolves the handler from the
+    router, executes it and renders the response. Used by both the
+    ``http.server`` based RequestHandler and the asyncio front end.
+    Successful responses of cacheable routes are served from the
+    response cache. Successful GET responses carry ETag and Last-Modified
+    of the data version, conditional GETs are answered with 304 before
+    the handler runs. Durations of the processing stages are recorded
+    in the request timer. Sampled or requested handler calls are
+    profiled. Writes of other processes sharing the database are looked
+    for before a request is processed. Admin routes are answered with 404
+    unless the request carries the admin token.
+    """
+
+    def __init__(
+        self,
+        router: Router,
+        response_renderer: Response,
+        response_cache: ResponseCache | None = None,
+        data_version: DataVersion | None = None,
+        profiler: RequestProfiler | None = None,
+        change_tracker: ChangeTracker | None = None,
+        admin_token: str | None = None,
+    ) -> None:
+        self.router = router
+        self.response_renderer = response_renderer
+        self.response_cache = response_cache
+        self.data_version = data_version
+        self.profiler = profiler
+        self.change_tracker = change_tracker
+        self.admin_token = admin_token
+
+    def dispatch(
+        self,
+        method: str,
+        target: str,
+        headers: Mapping[str, str],
+        body: bytes = b"",
+        timer: RequestTimer | None = None,
+    ) -> tuple[bytes | Iterator[bytes], int, dict[str, str]]:
+        """
+        Process HTTP request and return rendered (body, status, headers).
+
+        Header names in ``headers`` are expected to be lower-cased. The
+        body is an iterator of bytes for streamed responses.
+        """
+        if timer is None:
+            timer = RequestTimer(method)
+        if method == "OPTIONS":
+            return (
+                b"",
+                HTTPStatus.NO_CONTENT,
+                {**CORS_HEADERS, "Content-Length": "0"},
+            )
+
+        # Before the validators are taken, writes of other processes
+        # change them
+        if self.change_tracker is not None:
+            self.change_tracker.poll()
+        path, query_params = self._parse_url(target)
+        handler, path_params = self.router.resolve(method, path)
+        timer.mark(ROUTING)
+
+        if not handler:
+            response = self._handle_unresolved(path)
+            timer.mark(RENDER)
+            return self._with_cors(response)
+        template = self.router.get_template(handler)
+        timer.route = template
+        if self.router.is_admin(method, template) and not self._is_admin(
+            headers
+        ):
+            response = self._render_response(
+                {"message": "Endpoint not found"}, HTTPStatus.NOT_FOUND
+            )
+            timer.mark(RENDER)
+            return self._with_cors(response)
+
+        # Conditional GETs and response cache lookups count as routing
+        validators = None
+        if (
+            method == "GET"
+            and self.data_version is not None
+            and self.router.is_versioned(method, template)
+        ):
+            # Taken before reading, a write in between only makes the
+            # validators older than the response
+            validators = self.response_renderer.validator_headers(
+                *self.data_version.current()
+            )
+            if self._is_not_modified(headers, validators):
+                timer.mark(ROUTING)
+                return self._with_cors(
+                    self.response_renderer.not_modified(validators)
+                )
+
+        cache_key = None
+        if (
+            self.response_cache is not None
+            and self.response_cache.enabled
+            and not query_params
+        ):
+            cache_key = self.router.get_cache_key(method, path)
+        if cache_key is not None:
+            cached, generation = self.response_cache.get(cache_key)
+            if cached is not None:
+                # Writes that don't touch the cached data still change
+                # the version, the stored validators may be outdated
+                if validators is not None:
+                    cached[2].update(validators)
+                timer.mark(ROUTING)
+                return self._with_cors(cached)
+        timer.mark(ROUTING)
+
+        try:
+            all_params = {**(path_params or {}), **query_params}
+            post_data = self._parse_form_data(method, headers, body)
+            all_params.update(post_data)
+            timer.mark(PARSE)
+            report = None
+            metrics.begin_handler(timer)
+            try:
+                if (
+                    self.profiler is not None
+                    and self.profiler.should_profile(headers)
+                ):
+                    (payload, status), report = self.profiler.profile(
+                        template, handler, all_params
+                    )
+                else:
+                    payload, status = handler(**all_params)
+            finally:
+                metrics.end_handler(timer)
+            response = self._render_response(payload, status)
+            if response[1] == HTTPStatus.OK:
+                if validators is not None:
+                    response[2].update(validators)
+                if cache_key is not None and isinstance(response[0], bytes):
+                    self.response_cache.put(cache_key, response, generation)
+            # Added after caching, the cache stores a copy of the headers
+            # and hits must not name the report of another request
+            if report is not None:
+                response[2][PROFILE_REPORT_HEADER] = report
+        except ApplicationException as e:
+            response = self._handle_application_exception(e)
+        except Exception:
+            response = self._render_response(
+                {"message": "Internal server error"},
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+            )
+        timer.mark(RENDER)
+        return self._with_cors(response)
+
+    def _is_admin(self, headers: Mapping[str, str]) -> bool:
+        """Check the admin token, admin routes are off without one."""
+        if self.admin_token is None:
+            return False
+        supplied = headers.get(ADMIN_TOKEN_HEADER)
+        return supplied is not None and hmac.compare_digest(
+            supplied.encode(), self.admin_token.encode()
+        )
+
+    @staticmethod
+    def _is_not_modified(
+        headers: Mapping[str, str], validators: dict[str, str]
+    ) -> bool:
+        """
+        Evaluate If-None-Match, or If-Modified-Since when there is no
+        If-None-Match, against the current validators (RFC 9110 13.2.2).
+        """
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            etag = validators["ETag"]
+            return any(
+                tag.strip().removeprefix("W/") == etag
+                for tag in if_none_match.split(",")
+            )
+
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since is None or "Last-Modified" not in validators:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        last_modified = parsedate_to_datetime(validators["Last-Modified"])
+        return last_modified <= since
+
+    @staticmethod
+    def _parse_url(target: str) -> tuple[str, dict[str, str]]:
+        """
+        Parse the URL and query parameters.
+
+        Important: Multi-valued query parameters
+        are normalized to the first value.
+        """
+        parsed_path = urlparse(target)
+        path = parsed_path.path
+        raw_query_params = parse_qs(parsed_path.query)
+        query_params = {
+            key: value[0] for key, value in raw_query_params.items()
+        }
+        return path, query_params
+
+    @staticmethod
+    def _parse_form_data(
+        method: str, headers: Mapping[str, str], body: bytes
+    ) -> dict[str, Any]:
+        """Parse data from POST or PATCH request body.
+
+        Only processes requests with:
+        - Method: POST or PATCH
+        - Content-Type: application/x-www-form-urlencoded,
+          application/json, text/csv or application/x-ndjson
+        - Non-empty body
+
+        Form fields named ``key[]`` keep all their values as a list under
+        ``key``, other fields are normalized to the first value. A JSON
+        object is merged into the parameters, its values must be strings
+        or numbers, except for an ``items`` array. A JSON array is passed
+        as ``items``. JSON numbers are kept as their source text. CSV and
+        NDJSON bodies are passed unparsed.
+        """
+        if method not in ("POST", "PATCH") or not body:
+            return {}
+        content_type = headers.get("content-type", "")
+        media_type = content_type.split(";", 1)[0].strip().lower()
+
+        if media_type == "application/x-www-form-urlencoded":
+            post_data = parse_qs(body.decode("utf-8"))
+            return {
+                key[:-2] if key.endswith("[]") else key: (
+                    value if key.endswith("[]") else value[0]
+                )
+                for key, value in post_data.items()
+            }
+
+        if media_type in RAW_BODY_MEDIA_TYPES:
+            return {"raw_body": body, "media_type": media_type}
+
+        if media_type == "application/json":
+            try:
+                json_data = json.loads(
+                    body.decode("utf-8"), parse_float=str, parse_int=str
+                )
+            except (UnicodeDecodeError, ValueError):
+                raise InvalidRequestBodyError("Request body is not valid JSON")
+            if isinstance(json_data, dict):
+                for key, value in json_data.items():
+                    # Handlers validate strings, items are batch items
+                    if not isinstance(value, str) and not (
+                        key == "items" and isinstance(value, list)
+                    ):
+                        raise InvalidRequestBodyError(
+                            f"JSON field {key} must be a string or a number"
+                        )
+                return json_data
+            if isinstance(json_data, list):
+                return {"items": json_data}
+            raise InvalidRequestBodyError(
+                "JSON request body must be an object or an array"
+            )
+        return {}
+
+    def _render_response(
+        self, payload: dict, status: HTTPStatus
+    ) -> tuple[bytes | Iterator[bytes], int, dict[str, str]]:
+        return self.response_renderer.render(payload, status)
+
+    def _handle_unresolved(
+        self, path: str
+    ) -> tuple[bytes, int, dict[str, str]]:
+        """Render 405 with Allow if path has routes of other methods,
+        404 otherwise."""
+        allowed_methods = self.router.allowed_methods(path)
+        if not allowed_methods:
+            return self._render_response(
+                {"message": "Endpoint not found"}, HTTPStatus.NOT_FOUND
+            )
+        body, status, headers = self._render_response(
+            {"message": "Method not allowed"}, HTTPStatus.METHOD_NOT_ALLOWED
+        )
+        headers["Allow"] = ", ".join(allowed_methods + ["OPTIONS"])
+        return body, status, headers
+
+    def _handle_application_exception(
+        self, e: ApplicationException
+    ) -> tuple[bytes, int, dict[str, str]]:
+        """Render response for application exceptions."""
+        status = HTTPStatus.INTERNAL_SERVER_ERROR
+        for exc_type, http_status in EXCEPTION_TO_STATUS.items():
+            if isinstance(e, exc_type):
+                status = http_status
+                break
+        return self._render_response({"message": e.message}, status)
+
+    @staticmethod
+    def _with_cors(
+        response: tuple[bytes | Iterator[bytes], int, dict[str, str]]
+    ) -> tuple[bytes | Iterator[bytes], int, dict[str, str]]:
+        body, status, headers = response
+        headers["Access-Control-Allow-Origin"] = "*"
+        return body, status, headers
@@ -1,92 +1,71 @@
+from collections.abc import Iterator
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler
-from urllib.parse import parse_qs, urlparse
-
-from app.exceptions import (
-    AlreadyExistsError,
-    ApplicationException,
-    DatabaseError,
-    NotFoundError,
-    ValidationError,
-)
-from app.routing.router import Router
-from app.view.response import Response
 
-# Map application exceptions to HTTP status codes
-EXCEPTION_TO_STATUS = {
-    ValidationError: HTTPStatus.BAD_REQUEST,
-    NotFoundError: HTTPStatus.NOT_FOUND,
-    AlreadyExistsError: HTTPStatus.CONFLICT,
-    DatabaseError: HTTPStatus.INTERNAL_SERVER_ERROR,
-}
+from app.config import config
+from app.metrics import WRITE, RequestTimer, metrics
+from app.routing.dispatcher import RequestDispatcher
+from app.view.response import Response
 
 
 class RequestHandler(BaseHTTPRequestHandler):
-    """Custom request handler for handling HTTP requests."""
+    """Custom request handler for handling HTTP requests.
 
-    router: Router | None = None
-    response_renderer: Response | None = None
+    Speaks HTTP/1.1, so connections are persistent by default. Pipelined
+    requests are served one after another from the buffered input stream,
+    which is why the request body is always consumed in full.
+    """
 
-    @classmethod
-    def configurate(cls, router: Router, response_renderer: Response) -> None:
-        """Configure the request handler with router and response renderer."""
-        cls.router = router
-        cls.response_renderer = response_renderer
+    protocol_version = "HTTP/1.1"
+    # Idle keep-alive connections are dropped after this many seconds
+    timeout = config.keep_alive_timeout
+    # Headers and body are written separately, don't let Nagle delay them
+    disable_nagle_algorithm = True
 
-    def _parse_url(self) -> tuple[str, dict[str, str]]:
-        """
-        Parse the URL and query parameters.
+    dispatcher: RequestDispatcher | None = None
+    # Off closes every connection after its response, an idle persistent
+    # connection would block a single-threaded server
+    keep_alive = True
 
-        Important: Multi-valued query parameters
-        are normalized to the first value.
-        """
-        parsed_path = urlparse(self.path)
-        path = parsed_path.path
-        raw_query_params = parse_qs(parsed_path.query)
-        query_params = {
-            key: value[0] for key, value in raw_query_params.items()
-        }
-        return path, query_params
+    @classmethod
+    def configurate(
+        cls, dispatcher: RequestDispatcher, keep_alive: bool = True
+    ) -> None:
+        """Configure the request handler with the request dispatcher."""
+        cls.dispatcher = dispatcher
+        cls.keep_alive = keep_alive
+
+    def handle(self) -> None:
+        """Handle requests of one connection until it is closed."""
+        self.requests_served = 0
+        super().handle()
 
     def _handle_request(self, method: str) -> None:
         """
-        Process HTTP request by resolving the handler from the router
-        and executing it.
+        Read the request body and pass the request to the dispatcher.
+        Stage durations and the status are recorded once it is sent.
         """
-        if self.router is None:
+        body = self._read_body()
+        if body is None:
+            return
+        if self.dispatcher is None:
             self._send_response(
-                self._render_response(
+                Response.render(
                     {"message": "Router not initialized"},
                     HTTPStatus.INTERNAL_SERVER_ERROR,
                 )
             )
             return
 
-        path, query_params = self._parse_url()
-        handler, path_params = self.router.resolve(method, path)
-
-        if not handler:
-            self._send_response(
-                self._render_response(
-                    {"message": "Endpoint not found"}, HTTPStatus.NOT_FOUND
-                )
-            )
-            return
-
-        try:
-            all_params = {**(path_params or {}), **query_params}
-            post_data = self._parse_form_data(method)
-            all_params.update(post_data)
-            payload, status = handler(**all_params)
-            response = self._render_response(payload, status)
-        except ApplicationException as e:
-            response = self._handle_application_exception(e)
-        except Exception:
-            response = self._render_response(
-                {"message": "Internal server error"},
-                HTTPStatus.INTERNAL_SERVER_ERROR,
-            )
+        timer = RequestTimer(method)
+        headers = {key.lower(): value for key, value in self.headers.items()}
+        response = self.dispatcher.dispatch(
+            method, self.path, headers, body, timer
+        )
+        timer.restart()
         self._send_response(response)
+        timer.mark(WRITE)
+        metrics.finish_request(timer, response[1])
 
     def do_GET(self) -> None:
         self._handle_request("GET")
@@ -98,62 +77,91 @@ class RequestHandler(BaseHTTPRequestHandler):
         self._handle_request("PATCH")
 
     def do_OPTIONS(self) -> None:
-        self.send_response(HTTPStatus.NO_CONTENT)
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header(
-            "Access-Control-Allow-Methods",
-            "GET, POST, PATCH, OPTIONS"
-        )
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
-        self.end_headers()
+        self._handle_request("OPTIONS")
 
-    def _render_response(
-        self, payload: dict, status: HTTPStatus
-    ) -> tuple[bytes, int, dict[str, str]]:
-        if not self.response_renderer:
-            raise RuntimeError("Response renderer not configured")
-        return self.response_renderer.render(payload, status)
-
-    def _handle_application_exception(
-        self, e: ApplicationException
-    ) -> tuple[bytes, int, dict[str, str]]:
-        """Render response for application exceptions."""
-        status = HTTPStatus.INTERNAL_SERVER_ERROR
-        for exc_type, http_status in EXCEPTION_TO_STATUS.items():
-            if isinstance(e, exc_type):
-                status = http_status
-                break
-        return self._render_response({"message": e.message}, status)
-
-    def _parse_form_data(self, method: str) -> dict[str, str]:
-        """Parse data from POST or PATCH request body.
-
-        Only processes requests with:
-        - Method: POST or PATCH
-        - Content-Type: application/x-www-form-urlencoded
-        - Positive Content-Length
+    def _read_body(self) -> bytes | None:
         """
-        if method not in ("POST", "PATCH"):
-            return {}
-        content_length = int(self.headers.get("Content-Length", 0))
-        if (
-            content_length > 0
-            and self.headers.get("Content-Type")
-            == "application/x-www-form-urlencoded"
-        ):
-            raw_post_data = self.rfile.read(content_length)
-            post_data = parse_qs(raw_post_data.decode("utf-8"))
-            return {key: value[0] for key, value in post_data.items()}
-        return {}
+        Read request body of Content-Length bytes.
+
+        Returns None if an error response was already sent, in this case
+        the connection is closed since the body framing is unknown.
+        """
+        if self.headers.get("Transfer-Encoding"):
+            self.send_error(
+                HTTPStatus.NOT_IMPLEMENTED, "Unsupported Transfer-Encoding"
+            )
+            return None
+        raw_length = self.headers.get("Content-Length", "0")
+        # int() would take signs and whitespace, a negative length would
+        # leave the body to be read as the next request
+        if not (raw_length.isascii() and raw_length.isdigit()):
+            self.send_error(HTTPStatus.BAD_REQUEST, "Bad Content-Length")
+            return None
+        content_length = int(raw_length)
+        if content_length > config.max_request_body_bytes:
+            self.send_error(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large"
+            )
+            return None
+        if content_length > 0:
+            return self.rfile.read(content_length)
+        return b""
 
     def _send_response(
-        self, response: tuple[bytes, int, dict[str, str]]
+        self, response: tuple[bytes | Iterator[bytes], int, dict[str, str]]
     ) -> None:
-        """Send an HTTP response to client."""
+        """
+        Send an HTTP response to client. A streamed body is sent with
+        chunked transfer encoding, or until the connection is closed to
+        HTTP/1.0 clients.
+        """
         body, status, headers = response
+        streamed = not isinstance(body, bytes)
+        chunked = streamed and self.request_version != "HTTP/1.0"
+        self.requests_served += 1
         self.send_response(status)
-        headers["Access-Control-Allow-Origin"] = "*"
         for header, value in headers.items():
             self.send_header(header, value)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        if (
+            not self.keep_alive
+            or self.requests_served >= config.keep_alive_max_requests
+            or (streamed and not chunked)
+        ):
+            # Also marks the connection to be closed after this response
+            self.send_header("Connection", "close")
+        elif (
+            not self.close_connection
+            and self.request_version == "HTTP/1.0"
+        ):
+            self.send_header("Connection", "keep-alive")
         self.end_headers()
-        self.wfile.write(body)
+        if streamed:
+            self._send_stream(body, chunked)
+        else:
+            self.wfile.write(body)
+
+    def _send_stream(self, chunks: Iterator[bytes], chunked: bool) -> None:
+        """
+        Write body chunks as they are produced. If producing fails midway
+        the connection is closed without the last chunk, so the client
+        sees the response is incomplete. The chunks are closed once
+        written, which ends an event stream subscription right away.
+        """
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if chunked:
+                    chunk = b"%x\r\n%b\r\n" % (len(chunk), chunk)
+                self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except Exception as e:
+            self.close_connection = True
+            self.log_error("Streaming response failed: %r", e)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
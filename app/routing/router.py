@@ -1,11 +1,37 @@
 from collections.abc import Callable
+from typing import Any
 
-from app.exceptions import UnsupportedHTTPMethodError
+from app.exceptions import RouteDefinitionError, UnsupportedHTTPMethodError
 
 
-class Router:
-    PATH_PARAM_INDEX = 2
+def _to_int(segment: str) -> int | None:
+    return int(segment) if segment.isascii() and segment.isdigit() else None
+
+
+# Path parameter types: {name} or {name:str} matches any segment,
+# {name:int} only digits and passes an int to the handler. Converters
+# return None for segments that don't match.
+PARAM_CONVERTERS: dict[str, Callable[[str], Any]] = {
+    "str": str,
+    "int": _to_int,
+}
+
+
+class _Node:
+    """Segment trie node, handlers are stored by method at the node of
+    the last segment of their template."""
+
+    __slots__ = ("static", "params", "handlers")
+
+    def __init__(self) -> None:
+        self.static: dict[str, _Node] = {}
+        # (converter, node) of parameter segments in registration order
+        self.params: list[tuple[Callable[[str], Any], _Node]] = []
+        # method -> (handler, names of the template parameters)
+        self.handlers: dict[str, tuple[Callable, list[str]]] = {}
 
+
+class Router:
     def __init__(self) -> None:
         """Initialize the Router with empty routing tables for HTTP methods."""
         self.routes: dict[str, dict[str, Callable]] = {
@@ -13,61 +39,186 @@ class Router:
             "POST": {},
             "PATCH": {},
         }
+        # (method, path) -> response cache key of cacheable routes
+        self.cache_keys: dict[tuple[str, str], str] = {}
+        # handler -> path template, names the route in metrics
+        self.templates: dict[Callable, str] = {}
+        # (method, template) of routes whose responses don't depend only
+        # on stored data, they are sent without data version validators
+        self.unversioned: set[tuple[str, str]] = set()
+        # (method, template) of routes served only to admin requests
+        self.admin: set[tuple[str, str]] = set()
+        self._static_routes: dict[str, dict[str, Callable]] | None = None
+        self._root: _Node | None = None
 
-    def add_route(self, method: str, path: str, handler: Callable) -> None:
-        """Register a handler function for a specific HTTP method and path."""
+    def add_route(
+        self,
+        method: str,
+        path: str,
+        handler: Callable,
+        cache_key: str | None = None,
+        versioned: bool = True,
+        admin: bool = False,
+    ) -> None:
+        """
+        Register a handler function for a specific HTTP method and path.
+        Responses of routes with a ``cache_key`` are cached when rendered.
+        Routes that are not ``versioned`` get no ETag or Last-Modified.
+        ``admin`` routes are served only to requests with the admin token.
+        """
         method = method.upper()
         if method not in self.routes:
             raise UnsupportedHTTPMethodError(f"Unsupported HTTP method: "
                                              f"{method}")
+        for segment in path.split("/"):
+            self._parse_param(segment)
         self.routes[method][path] = handler
+        self.templates[handler] = path
+        if cache_key is not None:
+            self.cache_keys[(method, path)] = cache_key
+        if not versioned:
+            self.unversioned.add((method, path))
+        if admin:
+            self.admin.add((method, path))
+        # Recompiled on the next resolve
+        self._root = None
 
-    def _find_handler_by_template(
-        self, method_routes: dict[str, Callable], path: str
-    ) -> tuple[Callable, dict[str, str]] | tuple[None, None]:
-        """
-        Finds a handler by matching the path against registered templates
-        (e.g., /path/{param}).
-        """
-        path_parts = path.split("/")
+    def get_cache_key(self, method: str, path: str) -> str | None:
+        """Get response cache key of a route or None if not cacheable."""
+        return self.cache_keys.get((method.upper(), path))
 
-        for template, handler in method_routes.items():
-            if "{" not in template:
-                continue
+    def get_template(self, handler: Callable) -> str | None:
+        """Get path template the handler is registered with."""
+        return self.templates.get(handler)
 
-            template_parts = template.split("/")
-            if len(template_parts) != len(path_parts):
-                continue
+    def is_versioned(self, method: str, template: str | None) -> bool:
+        """Check if responses of a route carry data version validators."""
+        return (method.upper(), template) not in self.unversioned
 
-            params = {}
-            is_match = True
-            for template_part, path_part in zip(template_parts, path_parts):
-                if template_part.startswith("{") and template_part.endswith(
-                    "}"
-                ):
-                    param_name = template_part.strip("{}")
-                    params[param_name] = path_part
-                elif template_part != path_part:
-                    is_match = False
-                    break
-
-            if is_match:
-                return handler, params
-
-        return None, None
+    def is_admin(self, method: str, template: str | None) -> bool:
+        """Check if a route is served only to admin requests."""
+        return (method.upper(), template) in self.admin
 
+    def compile(self) -> None:
+        """
+        Compile registered routes into a lookup table of static paths and
+        a segment trie of templates, resolution then takes time
+        proportional to the path length instead of the number of routes.
+        """
+        static_routes: dict[str, dict[str, Callable]] = {}
+        root = _Node()
+        for method, method_routes in self.routes.items():
+            for template, handler in method_routes.items():
+                segments = template.split("/")
+                if not any(self._parse_param(s) for s in segments):
+                    static_routes.setdefault(template, {})[method] = handler
+                    continue
+                node = root
+                names = []
+                for segment in segments:
+                    node = self._child(node, segment)
+                    param = self._parse_param(segment)
+                    if param is not None:
+                        names.append(param[0])
+                node.handlers[method] = (handler, names)
+        self._static_routes = static_routes
+        self._root = root
 
     def resolve(
         self, method: str, path: str
     ) -> (
-            tuple[Callable, dict[str, str]] |
+            tuple[Callable, dict[str, Any]] |
             tuple[Callable, None] |
             tuple[None, None]
     ):
         """Resolve the handler function for a given HTTP method and path."""
         method = method.upper()
-        method_routes = self.routes.get(method, {})
-        if path in method_routes:
-            return method_routes[path], None
+        static_routes, root = self._compiled()
+        handlers = static_routes.get(path)
+        if handlers is not None and method in handlers:
+            return handlers[method], None
+
+        values: list[Any] = []
+        node = self._match(root, path.split("/"), 0, values, method)
+        if node is None:
+            return None, None
+        handler, names = node.handlers[method]
+        return handler, dict(zip(names, values))
+
+    def allowed_methods(self, path: str) -> list[str]:
+        """Get methods with a route for the path, empty if there is none."""
+        static_routes, root = self._compiled()
+        methods = set(static_routes.get(path, ()))
+        for method in self.routes:
+            if method not in methods and self._match(
+                root, path.split("/"), 0, [], method
+            ):
+                methods.add(method)
+        return [method for method in self.routes if method in methods]
+
+    def _compiled(self) -> tuple[dict[str, dict[str, Callable]], _Node]:
+        static_routes, root = self._static_routes, self._root
+        if root is None or static_routes is None:
+            self.compile()
+            static_routes, root = self._static_routes, self._root
+        return static_routes, root
+
+    def _child(self, node: _Node, segment: str) -> _Node:
+        """Get or create child node of a template segment."""
+        param = self._parse_param(segment)
+        if param is None:
+            return node.static.setdefault(segment, _Node())
 
-        return self._find_handler_by_template(method_routes, path)
+        converter = PARAM_CONVERTERS[param[1]]
+        for param_converter, child in node.params:
+            if param_converter is converter:
+                return child
+        child = _Node()
+        node.params.append((converter, child))
+        return child
+
+    @staticmethod
+    def _parse_param(segment: str) -> tuple[str, str] | None:
+        """Get (name, type) of a ``{name}`` or ``{name:type}`` segment."""
+        if not (segment.startswith("{") and segment.endswith("}")):
+            return None
+        name, _, type_name = segment[1:-1].partition(":")
+        type_name = type_name or "str"
+        if not name.isidentifier() or type_name not in PARAM_CONVERTERS:
+            raise RouteDefinitionError(f"Invalid path parameter {segment}")
+        return name, type_name
+
+    def _match(
+        self,
+        node: _Node,
+        segments: list[str],
+        index: int,
+        values: list[Any],
+        method: str,
+    ) -> _Node | None:
+        """
+        Walk the trie, static segments before parameters, and return the
+        node with a handler for the method. Converted parameter values are
+        collected into ``values`` in path order. Backtracks only when
+        several branches match.
+        """
+        if index == len(segments):
+            return node if method in node.handlers else None
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match(child, segments, index + 1, values, method)
+            if found is not None:
+                return found
+
+        for converter, child in node.params:
+            value = converter(segment)
+            if value is None:
+                continue
+            values.append(value)
+            found = self._match(child, segments, index + 1, values, method)
+            if found is not None:
+                return found
+            values.pop()
+        return None
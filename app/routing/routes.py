@@ -1,9 +1,22 @@
+from app.view.response_cache import (
+    CURRENCIES_CACHE_KEY,
+    EXCHANGE_RATES_CACHE_KEY,
+)
+
+
 def setup_currency_routes(
-    router, currency_controller, exchange_rates_controller, exchange_controller
+    router,
+    currency_controller,
+    exchange_rates_controller,
+    exchange_controller,
+    metrics_controller,
 ):
     """Setup routes for endpoints."""
     router.add_route(
-        "GET", "/currencies", currency_controller.handle_get_currencies
+        "GET",
+        "/currencies",
+        currency_controller.handle_get_currencies,
+        cache_key=CURRENCIES_CACHE_KEY,
     )
     router.add_route(
         "GET", "/currency/{code}", currency_controller.handle_get_currency
@@ -12,6 +25,13 @@ def setup_currency_routes(
         "GET",
         "/exchangeRates",
         exchange_rates_controller.handle_get_exchange_rates,
+        cache_key=EXCHANGE_RATES_CACHE_KEY,
+    )
+    router.add_route(
+        "GET",
+        "/exchangeRates/events",
+        exchange_rates_controller.handle_get_exchange_rate_events,
+        versioned=False,
     )
     router.add_route(
         "GET",
@@ -23,11 +43,21 @@ def setup_currency_routes(
         "/exchange",
         exchange_controller.handle_get_exchange,
     )
+    router.add_route(
+        "POST",
+        "/exchange/batch",
+        exchange_controller.handle_post_exchange_batch,
+    )
     router.add_route(
         "POST",
         "/exchangeRates",
         exchange_rates_controller.handle_post_exchange_rate,
     )
+    router.add_route(
+        "POST",
+        "/exchangeRates/import",
+        exchange_rates_controller.handle_post_exchange_rates_import,
+    )
     router.add_route(
         "POST", "/currencies", currency_controller.handle_post_currency
     )
@@ -36,3 +66,17 @@ def setup_currency_routes(
         "/exchangeRate/{currency_code_pair}",
         exchange_rates_controller.handle_patch_exchange_rate,
     )
+    router.add_route(
+        "GET",
+        "/metrics",
+        metrics_controller.handle_get_metrics,
+        versioned=False,
+    )
+    router.add_route(
+        "GET",
+        "/admin/queries",
+        metrics_controller.handle_get_queries,
+        versioned=False,
+        admin=True,
+    )
+    router.compile()
@@ -0,0 +1,201 @@
+import os
+import signal
+import socket
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from app.async_server import serve_async
+from app.config import config
+from app.event_broker import rate_events
+from app.routing.dispatcher import RequestDispatcher
+from app.routing.request_handler import RequestHandler
+
+SERVER_MODES = ("single", "threaded", "prefork", "asyncio")
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """
+    HTTP server that hands accepted connections to a bounded thread pool.
+
+    When every worker is busy the accept loop blocks, so excess connections
+    wait in the kernel listen backlog instead of piling up in memory.
+    """
+
+    request_queue_size = config.server_request_queue_size
+
+    def __init__(
+        self,
+        server_address: tuple[str, int],
+        handler_class: type[BaseHTTPRequestHandler],
+        max_workers: int,
+    ) -> None:
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="http-worker"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def process_request(self, request, client_address) -> None:
+        """Schedule the connection on a free worker thread."""
+        self._slots.acquire()
+        try:
+            self._executor.submit(
+                self._process_request_worker, request, client_address
+            )
+        except RuntimeError:
+            # Executor is already shut down
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address) -> None:
+        """Same as ThreadingMixIn.process_request_thread."""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+class ReusePortThreadPoolHTTPServer(ThreadPoolHTTPServer):
+    """Thread pool server that binds with SO_REUSEPORT for pre-fork mode."""
+
+    allow_reuse_port = True
+
+
+def create_server(
+    handler_class: type[BaseHTTPRequestHandler],
+    mode: str = config.server_mode,
+) -> HTTPServer:
+    """Build an HTTP server instance for the given mode."""
+    address = (config.host, config.port)
+
+    if mode == "single":
+        return HTTPServer(address, handler_class)
+    if mode == "threaded":
+        return ThreadPoolHTTPServer(
+            address, handler_class, config.server_max_workers
+        )
+    if mode == "prefork":
+        return ReusePortThreadPoolHTTPServer(
+            address, handler_class, config.server_max_workers
+        )
+    raise ValueError(
+        f"Unknown server mode: {mode}. "
+        f"Expected one of: {', '.join(SERVER_MODES)}"
+    )
+
+
+def _serve(server: HTTPServer) -> None:
+    """
+    Serve until interrupted and close the listening socket. Event streams
+    are ended first, requests in progress are waited for.
+    """
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        rate_events.close()
+        server.server_close()
+
+
+def _raise_interrupt(*_args) -> None:
+    raise KeyboardInterrupt
+
+
+def _serve_prefork(
+    handler_class: type[BaseHTTPRequestHandler],
+    processes: int,
+    on_stop: Callable[[], None] | None = None,
+) -> None:
+    """
+    Fork worker processes, each binding its own listening socket to the
+    same port with SO_REUSEPORT, so the kernel balances connections.
+    Workers call ``on_stop`` once they have stopped serving.
+    """
+    if not hasattr(os, "fork") or not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError(
+            "Pre-fork mode requires os.fork and SO_REUSEPORT support"
+        )
+
+    children: list[int] = []
+    for _ in range(max(processes, 1)):
+        pid = os.fork()
+        if pid == 0:
+            # Let the parent handle Ctrl+C and stop children with SIGTERM,
+            # which finishes requests in progress like Ctrl+C does
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, _raise_interrupt)
+            exit_code = 0
+            try:
+                _serve(create_server(handler_class, "prefork"))
+                signal.signal(signal.SIGTERM, signal.SIG_IGN)
+                if on_stop is not None:
+                    on_stop()
+            except Exception as error:
+                print(f"Worker {os.getpid()} failed: {error}")
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        children.append(pid)
+
+    # Treat SIGTERM in the parent as Ctrl+C, so workers are always stopped
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+
+def serve(
+    dispatcher: RequestDispatcher,
+    mode: str = config.server_mode,
+    on_stop: Callable[[], None] | None = None,
+) -> None:
+    """
+    Start serving requests in the configured mode. ``on_stop`` is called
+    in every serving process once it has stopped.
+    """
+    if mode == "asyncio":
+        serve_async(dispatcher)
+        if on_stop is not None:
+            on_stop()
+        return
+
+    # Every subscriber holds a worker thread, the only one in single mode
+    rate_events.max_subscribers = min(
+        rate_events.max_subscribers,
+        config.sse_thread_max_subscribers if mode != "single" else 0,
+    )
+    RequestHandler.configurate(dispatcher, keep_alive=mode != "single")
+    if mode == "prefork":
+        print(
+            f"Start server on: {config.host}:{config.port} "
+            f"(prefork, {config.server_processes} processes)"
+        )
+        _serve_prefork(RequestHandler, config.server_processes, on_stop)
+        return
+
+    server = create_server(RequestHandler, mode)
+    print(f"Start server on: {config.host}:{config.port} ({mode})")
+    _serve(server)
+    if on_stop is not None:
+        on_stop()
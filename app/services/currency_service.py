@@ -1,22 +1,43 @@
+from collections.abc import Iterator
+
 from app.database.currency_dao import CurrencyDAO
 from app.dtos.create_currency_dto import CreateCurrencyDTO
 from app.dtos.currency_dto import CurrencyDTO
 from app.exceptions import CurrencyNotFoundError
 from app.mappers.currency_mapper import CurrencyMapper
+from app.view.response_cache import CURRENCIES_CACHE_KEY, ResponseCache
 
 
 class CurrencyService:
     def __init__(
-        self, currency_dao: CurrencyDAO, currency_mapper: CurrencyMapper
+        self,
+        currency_dao: CurrencyDAO,
+        currency_mapper: CurrencyMapper,
+        response_cache: ResponseCache,
     ) -> None:
         self.currency_dao = currency_dao
         self.currency_mapper = currency_mapper
+        self.response_cache = response_cache
 
-    def get_currencies(self) -> list[CurrencyDTO]:
-        """Gets all currencies, maps them to DTOs and returns them."""
-        currencies = self.currency_dao.get_currencies()
+    def get_currencies(
+        self, after: int | None = None, limit: int | None = None
+    ) -> list[CurrencyDTO]:
+        """
+        Gets all currencies or a keyset page of them, maps them to DTOs
+        and returns them.
+        """
+        currencies = self.currency_dao.get_currencies(after, limit)
         return [self.currency_mapper.entity_to_dto(c) for c in currencies]
 
+    def iter_currencies(
+        self, after: int | None = None, limit: int | None = None
+    ) -> Iterator[CurrencyDTO]:
+        """Lazily gets currencies as DTOs, for streaming."""
+        return (
+            self.currency_mapper.entity_to_dto(c)
+            for c in self.currency_dao.iter_currencies(after, limit)
+        )
+
     def get_currency(self, code: str) -> CurrencyDTO:
         """Gets a specific currency, maps it to a DTO and returns it."""
         currency_entity = self.currency_dao.get_currency(code)
@@ -29,4 +50,9 @@ class CurrencyService:
         """Posts a new currency, maps the result to a DTO and returns it."""
         currency_entity = self.currency_mapper.dto_to_entity(currency_dto)
         inserted_currency = self.currency_dao.post_currency(currency_entity)
+        self.response_cache.invalidate(CURRENCIES_CACHE_KEY)
         return self.currency_mapper.entity_to_dto(inserted_currency)
+
+    def invalidate_cached_currencies(self) -> None:
+        """Drops the cached currency list, currencies were added elsewhere."""
+        self.response_cache.invalidate(CURRENCIES_CACHE_KEY)
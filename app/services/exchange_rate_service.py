@@ -1,18 +1,38 @@
+import dataclasses
+import threading
+from collections.abc import Iterable, Iterator, Mapping, Sequence
 from decimal import ROUND_HALF_UP, Decimal
+from typing import Any
 
+from app.config import config
 from app.database.currency_dao import CurrencyDAO
+from app.database.data_version import data_version
 from app.database.exchange_rate_dao import ExchangeRateDAO
 from app.dtos.calculated_exchange_dto import CalculatedExchangeDTO
 from app.dtos.create_exchange_rate_dto import CreateExchangeRateDTO
+from app.dtos.currency_dto import CurrencyDTO
 from app.dtos.exchange_rate_dto import ExchangeRateDTO
+from app.dtos.import_report_dto import ImportReportDTO
+from app.dtos.import_row_error_dto import ImportRowErrorDTO
 from app.dtos.update_exchange_rate_dto import UpdateExchangeRateDTO
 from app.exceptions import (
+    ApplicationException,
     CurrencyNotFoundError,
     CurrencyPairNotFoundError,
     SameCurrencyError,
 )
 from app.mappers.currency_mapper import CurrencyMapper
 from app.mappers.exchange_rate_mapper import ExchangeRateMapper
+from app.read_models.exchange_rate_view import ExchangeRateView
+from app.services.fixed_point import convert_minor_units
+from app.services.rate_graph import RateGraph
+from app.services.rate_matrix import RateMatrix
+from app.services.rate_write_buffer import RateWriteBuffer
+from app.view.response_cache import EXCHANGE_RATES_CACHE_KEY, ResponseCache
+
+RateLookup = RateGraph | RateMatrix
+
+AMOUNT_QUANTUM = Decimal("0.01")
 
 
 class ExchangeRateService:
@@ -22,27 +42,70 @@ class ExchangeRateService:
         currency_dao: CurrencyDAO,
         exchange_rates_mapper: ExchangeRateMapper,
         currency_mapper: CurrencyMapper,
+        response_cache: ResponseCache,
+        write_behind_window: float = 0.0,
+        write_behind_durable: bool = False,
+        rate_matrix_enabled: bool = False,
     ) -> None:
         self.exchange_rates_dao = exchange_rates_dao
         self.currency_dao = currency_dao
         self.exchange_rates_mapper = exchange_rates_mapper
         self.currency_mapper = currency_mapper
+        self.response_cache = response_cache
+        self._rate_lookup: RateLookup | None = None
+        self._rate_lookup_lock = threading.Lock()
+        # Rate updates are buffered and coalesced when a window is set
+        self._rate_write_buffer = (
+            RateWriteBuffer(
+                self._write_buffered_rates,
+                write_behind_window,
+                on_failure=self._drop_buffered_rates,
+            )
+            if write_behind_window > 0
+            else None
+        )
+        self._write_behind_durable = write_behind_durable
+        self._rate_matrix_enabled = rate_matrix_enabled
 
-    def get_exchange_rates(self) -> list[ExchangeRateDTO]:
-        """Get all exchange rates, map them to DTOs and return."""
-        views = self.exchange_rates_dao.get_exchange_rates()
+    def get_exchange_rates(
+        self, after: int | None = None, limit: int | None = None
+    ) -> list[ExchangeRateDTO]:
+        """
+        Get all exchange rates or a keyset page of them, map them to DTOs
+        and return.
+        """
+        views = self.exchange_rates_dao.get_exchange_rates(after, limit)
         return [
             self.exchange_rates_mapper.view_to_dto(er_view)
-            for er_view in views
+            for er_view in self._with_buffered_rates(views)
         ]
 
-    def get_exchange_rate(self, currency_code_pair: str) -> ExchangeRateDTO:
-        """Gets a specific exchange rate, maps it to a DTO and returns it."""
+    def iter_exchange_rates(
+        self, after: int | None = None, limit: int | None = None
+    ) -> Iterator[ExchangeRateDTO]:
+        """Lazily get exchange rates as DTOs, for streaming."""
+        return (
+            self.exchange_rates_mapper.view_to_dto(er_view)
+            for er_view in self._with_buffered_rates(
+                self.exchange_rates_dao.iter_exchange_rates(after, limit)
+            )
+        )
+
+    def get_exchange_rate(
+        self, currency_code_pair: str, at: int | None = None
+    ) -> ExchangeRateDTO:
+        """
+        Gets a specific exchange rate, or the rate that was in effect at
+        ``at`` Unix milliseconds, maps it to a DTO and returns it.
+        """
         base_currency = currency_code_pair[:3]
         target_currency = currency_code_pair[3:]
-        view = self.exchange_rates_dao.get_exchange_rate(
-            base_currency, target_currency
-        )
+        if at is None:
+            view = self._get_current_rate(base_currency, target_currency)
+        else:
+            view = self.exchange_rates_dao.get_exchange_rate_at(
+                base_currency, target_currency, at
+            )
 
         if not view:
             raise CurrencyPairNotFoundError(
@@ -55,98 +118,399 @@ class ExchangeRateService:
         self, exchange_rate_dto: CreateExchangeRateDTO
     ) -> ExchangeRateDTO:
         """Create a new exchange rate and return it as DTO."""
-        base_code, target_code, rate_str = (
+        base_code, target_code, rate = (
             self.exchange_rates_mapper.dto_to_insert_args(exchange_rate_dto)
         )
         view = self.exchange_rates_dao.post_exchange_rate(
-            base_code, target_code, rate_str
+            base_code, target_code, rate
         )
+        self._refresh_rate_lookup([(base_code, target_code)])
+        self.response_cache.invalidate(EXCHANGE_RATES_CACHE_KEY)
         return self.exchange_rates_mapper.view_to_dto(view)
 
     def patch_exchange_rate(
         self, exchange_rate_dto: UpdateExchangeRateDTO
     ) -> ExchangeRateDTO:
-        """Update an existing exchange rate."""
+        """
+        Update an existing exchange rate. With write-behind enabled the
+        new rate is buffered and served from memory until it is written.
+        """
         base_code = exchange_rate_dto.currency_code_pair[:3]
         target_code = exchange_rate_dto.currency_code_pair[3:]
-        rate_str = str(exchange_rate_dto.rate)
+        rate = self.exchange_rates_mapper.rate_to_column(
+            exchange_rate_dto.rate
+        )
+        if self._rate_write_buffer is not None:
+            return self._buffer_rate_update(base_code, target_code, rate)
 
         view = self.exchange_rates_dao.patch_exchange_rate(
-            base_code, target_code, rate_str
+            base_code, target_code, rate
+        )
+        self._refresh_rate_lookup([(base_code, target_code)])
+        self.response_cache.invalidate(EXCHANGE_RATES_CACHE_KEY)
+        return self.exchange_rates_mapper.view_to_dto(view)
+
+    def invalidate_cached_rates(self) -> None:
+        """
+        Drop the rates snapshot and the cached rate list, e.g. after
+        another process has written rates. The snapshot is reloaded on
+        next use.
+        """
+        with self._rate_lookup_lock:
+            self._rate_lookup = None
+        self.response_cache.invalidate(EXCHANGE_RATES_CACHE_KEY)
+
+    def flush_rate_updates(self) -> None:
+        """Write buffered rate updates, called when the server stops."""
+        if self._rate_write_buffer is not None:
+            self._rate_write_buffer.close()
+
+    def _buffer_rate_update(
+        self, base_code: str, target_code: str, rate: int
+    ) -> ExchangeRateDTO:
+        """
+        Buffer the new rate of a pair, the latest update of the pair
+        wins. Waits for the commit if write-behind is durable.
+        """
+        view = self._get_current_rate(base_code, target_code)
+        if view is None:
+            raise CurrencyPairNotFoundError(
+                f"Exchange rate for currency pair {base_code}{target_code} "
+                f"not found"
+            )
+        view = dataclasses.replace(
+            view, rate=self.exchange_rates_mapper.column_to_rate(rate)
         )
+        batch = self._rate_write_buffer.put(view)
+        # Reads and conversions see the buffered rate from now on
+        self._refresh_rate_lookup([(base_code, target_code)])
+        data_version.bump()
+        self.response_cache.invalidate(EXCHANGE_RATES_CACHE_KEY)
+        if self._write_behind_durable:
+            self._rate_write_buffer.wait(batch)
         return self.exchange_rates_mapper.view_to_dto(view)
 
+    def _write_buffered_rates(self, views: list[ExchangeRateView]) -> None:
+        """Write a batch of buffered rates, the snapshot already has them."""
+        self.exchange_rates_dao.update_exchange_rates(views)
+
+    def _drop_buffered_rates(self, views: list[ExchangeRateView]) -> None:
+        """
+        Forget the rates of a batch that failed to write, the snapshot is
+        reloaded with the stored rates on next use.
+        """
+        self.invalidate_cached_rates()
+        data_version.bump()
+
+    def _get_current_rate(
+        self, base_code: str, target_code: str
+    ) -> ExchangeRateView | None:
+        """Get the buffered or else the stored rate of a pair."""
+        if self._rate_write_buffer is not None:
+            view = self._rate_write_buffer.get((base_code, target_code))
+            if view is not None:
+                return view
+        return self.exchange_rates_dao.get_exchange_rate(
+            base_code, target_code
+        )
+
+    def _with_buffered_rates(
+        self, views: Iterable[ExchangeRateView]
+    ) -> Iterable[ExchangeRateView]:
+        """Replace stored rates that have a buffered update."""
+        if self._rate_write_buffer is None:
+            return views
+        buffered = self._rate_write_buffer.pending_by_id()
+        if not buffered:
+            return views
+        return (buffered.get(view.id, view) for view in views)
+
+    def import_exchange_rates(
+        self,
+        rows: Iterable[
+            tuple[int, CreateExchangeRateDTO | ApplicationException]
+        ],
+    ) -> ImportReportDTO:
+        """
+        Insert or update many exchange rates in a single transaction.
+
+        Rows are (line number, rate or the validation error of the line)
+        and are consumed as they are written. Currency codes are resolved
+        to ids once. Rows that can't be imported are reported with their
+        line numbers, the others are imported anyway.
+        """
+        currency_ids = self.currency_dao.get_currency_ids()
+        known_pairs = self.exchange_rates_dao.get_currency_id_pairs()
+        errors: list[ImportRowErrorDTO] = []
+        counts = {"created": 0, "updated": 0}
+
+        def upsert_args() -> Iterator[tuple[int, int, int]]:
+            for line, row in rows:
+                if isinstance(row, ApplicationException):
+                    errors.append(ImportRowErrorDTO(line, row.message))
+                    continue
+                try:
+                    base_code, target_code, rate = (
+                        self.exchange_rates_mapper.dto_to_insert_args(row)
+                    )
+                except ValueError as e:
+                    # Raised in the middle of the batch it would roll
+                    # back every row
+                    errors.append(ImportRowErrorDTO(line, str(e)))
+                    continue
+                missing = [
+                    code for code in (base_code, target_code)
+                    if code not in currency_ids
+                ]
+                if missing:
+                    errors.append(
+                        ImportRowErrorDTO(
+                            line, f"Currency {missing[0]} not found"
+                        )
+                    )
+                    continue
+                pair = (currency_ids[base_code], currency_ids[target_code])
+                if pair in known_pairs:
+                    counts["updated"] += 1
+                else:
+                    counts["created"] += 1
+                    known_pairs.add(pair)
+                yield pair[0], pair[1], rate
+
+        self.exchange_rates_dao.upsert_exchange_rates(upsert_args())
+        if counts["created"] or counts["updated"]:
+            self._refresh_rate_lookup()
+            self.response_cache.invalidate(EXCHANGE_RATES_CACHE_KEY)
+        return ImportReportDTO(
+            created=counts["created"],
+            updated=counts["updated"],
+            errors=errors,
+        )
+
     def calculate_exchange(
-        self, from_code: str, to_code: str, amount: Decimal
+        self,
+        from_code: str,
+        to_code: str,
+        amount: Decimal,
+        at: int | None = None,
     ) -> CalculatedExchangeDTO:
         """
         Calculates the exchange of a given amount from one currency to another.
+        With ``at`` (Unix milliseconds) the rates in effect at that moment
+        are used.
+        """
+        if at is None:
+            rate_lookup = self._get_rate_lookup()
+        else:
+            rate_lookup = self._load_rate_graph_at(from_code, to_code, at)
+        rate, base_currency, target_currency = self._resolve_pair(
+            rate_lookup, from_code, to_code
+        )
+        return CalculatedExchangeDTO(
+            base_currency=base_currency,
+            target_currency=target_currency,
+            rate=rate,
+            amount=amount,
+            converted_amount=self._convert_amount(amount, rate),
+        )
+
+    def calculate_exchanges(
+        self, items: list[tuple[str, str, Decimal]]
+    ) -> list[CalculatedExchangeDTO | ApplicationException]:
+        """
+        Calculates exchanges of many (from, to, amount) items at once.
+
+        Every distinct pair is resolved only once against a single rates
+        snapshot. The result for an item that cannot be converted is the
+        exception describing why, results keep the input order.
+        """
+        rate_lookup = self._get_rate_lookup()
+        resolved: dict[
+            tuple[str, str],
+            tuple[Decimal, CurrencyDTO, CurrencyDTO] | ApplicationException,
+        ] = {}
+        results: list[CalculatedExchangeDTO | ApplicationException] = []
+
+        for from_code, to_code, amount in items:
+            pair = (from_code, to_code)
+            if pair not in resolved:
+                try:
+                    resolved[pair] = self._resolve_pair(
+                        rate_lookup, from_code, to_code
+                    )
+                except ApplicationException as e:
+                    resolved[pair] = e
+            resolution = resolved[pair]
+            if isinstance(resolution, ApplicationException):
+                results.append(resolution)
+                continue
+
+            rate, base_currency, target_currency = resolution
+            results.append(
+                CalculatedExchangeDTO(
+                    base_currency=base_currency,
+                    target_currency=target_currency,
+                    rate=rate,
+                    amount=amount,
+                    converted_amount=self._convert_amount(amount, rate),
+                )
+            )
+        return results
+
+    def convert_bulk(
+        self, amounts_by_pair: Mapping[tuple[str, str], Sequence[int] | Any]
+    ) -> dict[tuple[str, str], list[int] | Any | ApplicationException]:
         """
+        Converts large arrays of amounts grouped by (from, to) pair.
+
+        Amounts are integers in minor units (hundredths), results too, and
+        match calculate_exchange exactly. NumPy arrays are converted with
+        NumPy when it is installed. The result for a pair that cannot be
+        converted is the exception describing why.
+        """
+        rate_lookup = self._get_rate_lookup()
+        results: dict[
+            tuple[str, str], list[int] | Any | ApplicationException
+        ] = {}
+        for (from_code, to_code), amounts in amounts_by_pair.items():
+            try:
+                rate, _base, _target = self._resolve_pair(
+                    rate_lookup, from_code, to_code
+                )
+            except ApplicationException as e:
+                results[(from_code, to_code)] = e
+                continue
+            results[(from_code, to_code)] = convert_minor_units(
+                amounts, rate, config.max_decimal_amount_places
+            )
+        return results
+
+    @staticmethod
+    def _resolve_pair(
+        rate_lookup: RateLookup, from_code: str, to_code: str
+    ) -> tuple[Decimal, CurrencyDTO, CurrencyDTO]:
+        """Find the rate and both currencies of a conversion."""
         if from_code == to_code:
             raise SameCurrencyError(
                 "Base and target currency codes cannot be the same."
             )
-        rate = self._find_best_rate(from_code, to_code)
+        rate = rate_lookup.find_rate(from_code, to_code)
 
         if rate is None:
             raise CurrencyPairNotFoundError(
                 f"Exchange rate for {from_code}{to_code} not found"
             )
 
-        base_currency_entity = self.currency_dao.get_currency(from_code)
-        target_currency_entity = self.currency_dao.get_currency(to_code)
+        base_currency = rate_lookup.get_currency(from_code)
+        target_currency = rate_lookup.get_currency(to_code)
 
-        if not base_currency_entity or not target_currency_entity:
+        if not base_currency or not target_currency:
             raise CurrencyNotFoundError(
                 "One or both currencies for exchange not found."
             )
+        return rate, base_currency, target_currency
 
-        converted_amount = (amount * rate).quantize(
-            Decimal("0.01"), rounding=ROUND_HALF_UP
-        )
+    @staticmethod
+    def _convert_amount(amount: Decimal, rate: Decimal) -> Decimal:
+        return (amount * rate).quantize(AMOUNT_QUANTUM, rounding=ROUND_HALF_UP)
 
-        return CalculatedExchangeDTO(
-            base_currency=self.currency_mapper.entity_to_dto(
-                base_currency_entity
-            ),
-            target_currency=self.currency_mapper.entity_to_dto(
-                target_currency_entity
-            ),
-            rate=rate,
-            amount=amount,
-            converted_amount=converted_amount,
-        )
+    def _get_rate_lookup(self) -> RateLookup:
+        """
+        Get current rates snapshot, loading it on first use. It is either
+        the rate graph or, if enabled, the precomputed rate matrix.
+        """
+        rate_lookup = self._rate_lookup
+        if rate_lookup is None:
+            with self._rate_lookup_lock:
+                if self._rate_lookup is None:
+                    self._rate_lookup = self._load_rate_lookup()
+                rate_lookup = self._rate_lookup
+        return rate_lookup
 
-    def _find_best_rate(
-        self, from_code: str, to_code: str
-    ) -> Decimal | None:
+    def _refresh_rate_lookup(
+        self, changed_pairs: Sequence[tuple[str, str]] | None = None
+    ) -> None:
         """
-        Finds available exchange rate according to the logic:
-        1. Direct rate (A->B)
-        2. Inverse rate (B->A)
-        3. Cross-rate through USD (A->USD->B)
+        Update the rates snapshot after a write and swap it in one
+        assignment, readers keep using the previous snapshot until then.
+        A snapshot not loaded yet is loaded on first use.
+
+        When only the rates of ``changed_pairs`` (base, target codes) have
+        changed, the snapshot is updated copy-on-write with their current
+        rates, read under the lock so concurrent writes of a pair end with
+        its latest rate. Otherwise it is reloaded.
         """
-        direct_view = self.exchange_rates_dao.get_exchange_rate(
-            from_code, to_code
-        )
-        if direct_view:
-            return direct_view.rate
+        with self._rate_lookup_lock:
+            rate_lookup = self._rate_lookup
+            if rate_lookup is None:
+                return
+            if changed_pairs is None:
+                self._rate_lookup = self._load_rate_lookup()
+                return
+            for base_code, target_code in changed_pairs:
+                view = self._get_current_rate(base_code, target_code)
+                if view is None:
+                    self._rate_lookup = self._load_rate_lookup()
+                    return
+                rate_lookup = rate_lookup.with_updated_rate(
+                    self.exchange_rates_mapper.view_to_dto(view)
+                )
+            self._rate_lookup = rate_lookup
 
-        inverse_view = self.exchange_rates_dao.get_exchange_rate(
-            to_code, from_code
-        )
-        if inverse_view:
-            return Decimal(1) / inverse_view.rate
+    def _load_rate_lookup(self) -> RateLookup:
+        rate_graph = self._load_rate_graph()
+        if self._rate_matrix_enabled:
+            return RateMatrix(rate_graph)
+        return rate_graph
 
-        if from_code != "USD" and to_code != "USD":
-            from_usd_view = self.exchange_rates_dao.get_exchange_rate(
-                "USD", from_code
-            )
-            to_usd_view = self.exchange_rates_dao.get_exchange_rate(
-                "USD", to_code
-            )
+    def _load_rate_graph_at(
+        self, from_code: str, to_code: str, at: int
+    ) -> RateGraph:
+        """
+        Build the graph of the rates at ``at`` a conversion can use.
 
-            if from_usd_view and to_usd_view:
-                return to_usd_view.rate / from_usd_view.rate
+        Best paths take the fewest hops and the hub first, so when the
+        rates between the two currencies and the hub connect them, the
+        path is the one of the graph of all rates. Only otherwise are all
+        rates at ``at`` loaded. Unknown currencies are rejected before
+        any rates are read.
+        """
+        for code in (from_code, to_code):
+            if self.currency_dao.get_currency(code) is None:
+                raise CurrencyNotFoundError(
+                    "One or both currencies for exchange not found."
+                )
+        rate_graph = RateGraph(
+            (
+                self.exchange_rates_mapper.view_to_dto(er_view)
+                for er_view in (
+                    self.exchange_rates_dao.get_exchange_rates_at_among(
+                        (from_code, to_code, config.cross_rate_currency), at
+                    )
+                )
+            ),
+            hub_code=config.cross_rate_currency,
+            max_hops=config.rate_graph_max_hops,
+        )
+        if from_code != to_code and rate_graph.find_rate(
+            from_code, to_code
+        ) is None:
+            rate_graph = self._load_rate_graph(at)
+        return rate_graph
 
-        return None
+    def _load_rate_graph(self, at: int | None = None) -> RateGraph:
+        """Build the graph of current rates or of the rates at ``at``."""
+        if at is None:
+            exchange_rates = self.get_exchange_rates()
+        else:
+            exchange_rates = [
+                self.exchange_rates_mapper.view_to_dto(er_view)
+                for er_view in self.exchange_rates_dao.get_exchange_rates_at(
+                    at
+                )
+            ]
+        return RateGraph(
+            exchange_rates,
+            hub_code=config.cross_rate_currency,
+            max_hops=config.rate_graph_max_hops,
+        )
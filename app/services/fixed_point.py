@@ -0,0 +1,192 @@
+"""
+Exact fixed-point conversion of many amounts by one rate.
+
+Amounts are integers in minor units (hundredths for two decimal places).
+Results are bit-identical to ``(amount * rate).quantize(quantum,
+rounding=ROUND_HALF_UP)`` under the current decimal context, including
+the context rounding of the product to ``prec`` significant digits.
+NumPy is used when it is installed and the products fit into int64.
+"""
+import decimal
+from collections.abc import Sequence
+from decimal import ROUND_HALF_EVEN, ROUND_HALF_UP, Decimal
+from typing import Any
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional
+    numpy = None
+
+INT64_LIMIT = 2**63
+POWERS_OF_TEN = [10**power for power in range(128)]
+
+
+def to_minor_units(amount: Decimal, places: int = 2) -> int:
+    """Convert amount with at most ``places`` decimals to minor units."""
+    minor_units = amount.scaleb(places)
+    if minor_units != minor_units.to_integral_value():
+        raise ValueError(
+            f"Amount {amount} has more than {places} decimal places"
+        )
+    return int(minor_units)
+
+
+def from_minor_units(minor_units: int, places: int = 2) -> Decimal:
+    """Convert minor units to Decimal with exactly ``places`` decimals."""
+    return Decimal(int(minor_units)).scaleb(-places)
+
+
+def convert_minor_units(
+    amounts: Sequence[int] | Any, rate: Decimal, places: int = 2
+) -> list[int] | Any:
+    """
+    Convert amounts in minor units by ``rate``, rounding half up.
+
+    Returns a list of ints, or a NumPy array if ``amounts`` is one.
+    """
+    context = decimal.getcontext()
+    if not rate.is_finite():
+        raise ValueError(f"Rate must be a finite number, got {rate}")
+    if context.rounding != ROUND_HALF_EVEN:
+        # Products are rounded by another mode, keep the Decimal semantics
+        return _convert_with_decimal(amounts, rate, places)
+
+    sign, digits, exponent = rate.as_tuple()
+    coefficient = int("".join(map(str, digits)))
+    if sign:
+        coefficient = -coefficient
+
+    if numpy is not None and isinstance(amounts, numpy.ndarray):
+        return _convert_numpy(amounts, coefficient, exponent, context.prec)
+    return _convert_python(amounts, coefficient, exponent, context.prec)
+
+
+def _convert_python(
+    amounts: Sequence[int], coefficient: int, exponent: int, prec: int
+) -> list[int]:
+    """
+    Convert with Python ints.
+
+    The exact product ``amount * coefficient`` is in units of
+    ``10 ** (exponent - places)``; the result is in units of
+    ``10 ** -places``, so it is scaled by ``10 ** exponent`` with
+    rounding half up (away from zero).
+    """
+    limit = 10**prec
+    divisors: dict[int, int] = {}
+    results = []
+    append = results.append
+    for amount in amounts:
+        product = amount * coefficient
+        negative = product < 0
+        if negative:
+            product = -product
+
+        shift = exponent
+        if product >= limit:
+            # Decimal rounds the product to prec digits, half even.
+            # Digit count from the bit length (1233 / 4096 ~ log10(2))
+            digit_count = (product.bit_length() * 1233 >> 12) + 1
+            if digit_count >= len(POWERS_OF_TEN):
+                raise ValueError(f"Amount {amount} is too large")
+            if product < POWERS_OF_TEN[digit_count - 1]:
+                digit_count -= 1
+            drop = digit_count - prec
+            unit = POWERS_OF_TEN[drop]
+            product, remainder = divmod(product, unit)
+            doubled = remainder * 2
+            if doubled > unit or (doubled == unit and product & 1):
+                product += 1
+            shift += drop
+
+        if shift >= 0:
+            value = product * 10**shift
+        else:
+            divisor = divisors.get(shift)
+            if divisor is None:
+                divisor = divisors[shift] = 10**-shift
+            value, remainder = divmod(product, divisor)
+            if remainder * 2 >= divisor:
+                value += 1
+        append(-value if negative else value)
+    return results
+
+
+def _convert_numpy(
+    amounts: Any, coefficient: int, exponent: int, prec: int
+) -> Any:
+    """
+    Convert with int64 NumPy arrays.
+
+    Amounts whose product could overflow int64 or exceed the context
+    precision are converted with Python ints instead. The result is an
+    int64 array, or an object array if some result does not fit int64.
+    """
+    amounts = numpy.asarray(amounts, dtype=numpy.int64)
+    scale = 10**exponent if exponent > 0 else 1
+    multiplier = abs(coefficient) * scale
+    if multiplier >= INT64_LIMIT:
+        return _to_array(
+            _convert_python(amounts.tolist(), coefficient, exponent, prec)
+        )
+
+    # Products of smaller amounts fit both int64 and the precision
+    bound = (min(INT64_LIMIT, 10**prec) - 1) // max(multiplier, 1)
+    magnitudes = numpy.abs(amounts)
+    fast = magnitudes <= bound
+    products = numpy.where(fast, magnitudes, 0) * numpy.int64(multiplier)
+    if exponent >= 0:
+        values = products
+    else:
+        divisor = 10**-exponent
+        if divisor >= INT64_LIMIT:
+            # Every product is below half of the divisor
+            values = numpy.zeros_like(products)
+        else:
+            values = products // divisor
+            remainders = products - values * divisor
+            values += remainders >= (divisor + 1) // 2
+    negative = (amounts < 0) != (coefficient < 0)
+    values = numpy.where(negative, -values, values)
+    if fast.all():
+        return values
+
+    slow_indexes = numpy.flatnonzero(~fast)
+    slow_values = _convert_python(
+        amounts[slow_indexes].tolist(), coefficient, exponent, prec
+    )
+    if all(-INT64_LIMIT <= value < INT64_LIMIT for value in slow_values):
+        values[slow_indexes] = slow_values
+        return values
+    result = values.astype(object)
+    result[slow_indexes] = slow_values
+    return result
+
+
+def _to_array(values: list[int]) -> Any:
+    """Wrap Python ints into an int64 array if they fit, else object."""
+    if all(-INT64_LIMIT <= value < INT64_LIMIT for value in values):
+        return numpy.array(values, dtype=numpy.int64)
+    return numpy.array(values, dtype=object)
+
+
+def _convert_with_decimal(
+    amounts: Sequence[int] | Any, rate: Decimal, places: int
+) -> list[int] | Any:
+    quantum = Decimal(1).scaleb(-places)
+    results = [
+        to_minor_units(
+            (from_minor_units(amount, places) * rate).quantize(
+                quantum, rounding=ROUND_HALF_UP
+            ),
+            places,
+        )
+        for amount in (
+            amounts.tolist()
+            if numpy is not None and isinstance(amounts, numpy.ndarray)
+            else amounts
+        )
+    ]
+    if numpy is not None and isinstance(amounts, numpy.ndarray):
+        return _to_array(results)
+    return results
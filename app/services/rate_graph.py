@@ -0,0 +1,190 @@
+from collections.abc import Iterable
+from decimal import Decimal
+
+from app.dtos.currency_dto import CurrencyDTO
+from app.dtos.exchange_rate_dto import ExchangeRateDTO
+
+# (stored rate, True if the edge walks the stored rate backwards)
+Edge = tuple[Decimal, bool]
+# (conversion rate, currency codes of the path), None if unreachable
+Resolved = tuple[Decimal, tuple[str, ...]] | None
+
+
+class RateGraph:
+    """
+    Immutable in-memory snapshot of all exchange rates.
+
+    Every stored rate A->B gives an edge A->B and an inverse edge B->A.
+    A stored rate always wins over the inverse of the opposite one.
+    Conversions are resolved through any intermediate currencies with at
+    most ``max_hops`` edges. The path choice is deterministic: fewest hops
+    first, then intermediates compared in path order, the hub currency
+    before any other and the rest by code.
+
+    Resolved pairs are memoized. A changed rate gives a new graph sharing
+    the unchanged edges, and the pairs whose path doesn't go through the
+    changed rate stay resolved.
+    """
+
+    def __init__(
+        self,
+        exchange_rates: Iterable[ExchangeRateDTO],
+        hub_code: str,
+        max_hops: int,
+    ) -> None:
+        self.hub_code = hub_code
+        self.max_hops = max_hops
+        self._currencies: dict[str, CurrencyDTO] = {}
+        self._edges: dict[str, dict[str, Edge]] = {}
+        self._resolved: dict[tuple[str, str], Resolved] = {}
+
+        for exchange_rate in exchange_rates:
+            self._add_rate(exchange_rate)
+
+    def _add_rate(self, exchange_rate: ExchangeRateDTO) -> None:
+        base = exchange_rate.baseCurrency
+        target = exchange_rate.targetCurrency
+        self._currencies[base.code] = base
+        self._currencies[target.code] = target
+        self._edges.setdefault(base.code, {})[target.code] = (
+            exchange_rate.rate,
+            False,
+        )
+        inverse_edges = self._edges.setdefault(target.code, {})
+        if base.code not in inverse_edges or inverse_edges[base.code][1]:
+            inverse_edges[base.code] = (exchange_rate.rate, True)
+
+    def with_updated_rate(self, exchange_rate: ExchangeRateDTO) -> "RateGraph":
+        """
+        Get a graph in which the stored rate of the pair is
+        ``exchange_rate``, added if the pair is new. This graph is not
+        changed, edges of the other currencies are shared with it.
+
+        Best paths depend only on which pairs exist, so after a rate
+        change the resolved pairs whose path avoids the pair are kept. A
+        new pair may give shorter paths, all pairs are resolved again.
+        """
+        base_code = exchange_rate.baseCurrency.code
+        target_code = exchange_rate.targetCurrency.code
+        updated = RateGraph.__new__(RateGraph)
+        updated.hub_code = self.hub_code
+        updated.max_hops = self.max_hops
+        updated._currencies = dict(self._currencies)
+        updated._edges = dict(self._edges)
+        for code in (base_code, target_code):
+            updated._edges[code] = dict(self._edges.get(code, {}))
+        updated._add_rate(exchange_rate)
+
+        updated._resolved = {}
+        if self.edge(base_code, target_code) is not None:
+            # Copied first, other threads keep resolving pairs meanwhile
+            for key, resolved in self._resolved.copy().items():
+                if resolved is None or not _uses_pair(
+                    resolved[1], base_code, target_code
+                ):
+                    updated._resolved[key] = resolved
+        return updated
+
+    def get_currency(self, code: str) -> CurrencyDTO | None:
+        """Get currency that takes part in at least one exchange rate."""
+        return self._currencies.get(code)
+
+    def currencies(self) -> list[CurrencyDTO]:
+        """Get all currencies of the graph ordered by id."""
+        return sorted(
+            self._currencies.values(), key=lambda c: (c.id or 0, c.code)
+        )
+
+    def edge(self, from_code: str, to_code: str) -> Edge | None:
+        """Get edge between two adjacent currencies."""
+        return self._edges.get(from_code, {}).get(to_code)
+
+    def find_rate(self, from_code: str, to_code: str) -> Decimal | None:
+        """Find conversion rate from one currency to another or None."""
+        key = (from_code, to_code)
+        resolved = self._resolved.get(key, False)
+        if resolved is False:
+            parents = self.shortest_path_tree(from_code, to_code)
+            resolved = None
+            if to_code in parents:
+                path = self._path_codes(parents, from_code, to_code)
+                resolved = (self.path_rate(path), tuple(path))
+            self._resolved[key] = resolved
+        return resolved[0] if resolved is not None else None
+
+    def _rank(self, code: str) -> tuple[int, str]:
+        return (0, "") if code == self.hub_code else (1, code)
+
+    def shortest_path_tree(
+        self, from_code: str, to_code: str | None = None
+    ) -> dict[str, str]:
+        """
+        Find best paths from a currency, stopping early at ``to_code``.
+
+        Returns parent currency code for every reached currency. Layered
+        BFS keys are compared from the first intermediate on, so the best
+        path to a currency always extends the best path to its parent and
+        all best paths form a tree.
+        """
+        parents: dict[str, str] = {}
+        if from_code not in self._edges:
+            return parents
+
+        visited = {from_code}
+        # code -> ranks of the currencies on the best path after from_code
+        frontier: dict[str, tuple[tuple[int, str], ...]] = {from_code: ()}
+        for _ in range(self.max_hops):
+            next_frontier: dict[str, tuple[tuple[int, str], ...]] = {}
+            # Expanding the best paths first, the first one to reach
+            # a currency is the best one
+            for code, ranks in sorted(
+                frontier.items(), key=lambda item: item[1]
+            ):
+                for next_code in self._edges[code]:
+                    if next_code in visited or next_code in next_frontier:
+                        continue
+                    next_frontier[next_code] = ranks + (
+                        self._rank(next_code),
+                    )
+                    parents[next_code] = code
+
+            if not next_frontier or to_code in next_frontier:
+                break
+            visited.update(next_frontier)
+            frontier = next_frontier
+        return parents
+
+    @staticmethod
+    def _path_codes(
+        parents: dict[str, str], from_code: str, to_code: str
+    ) -> list[str]:
+        path = [to_code]
+        while path[-1] != from_code:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
+    def path_rate(self, path: list[str]) -> Decimal:
+        """
+        Multiply rates along the path of currency codes with a single final
+        division, so A->B->C via an inverse edge gives rate(B->C) / rate(B->A).
+        """
+        numerator = Decimal(1)
+        denominator = Decimal(1)
+        for from_code, to_code in zip(path, path[1:]):
+            rate, is_inverse = self._edges[from_code][to_code]
+            if is_inverse:
+                denominator *= rate
+            else:
+                numerator *= rate
+        if denominator == 1:
+            return numerator
+        return numerator / denominator
+
+
+def _uses_pair(path: tuple[str, ...], code: str, other_code: str) -> bool:
+    """Check if the path walks between the two currencies, either way."""
+    for from_code, to_code in zip(path, path[1:]):
+        if {from_code, to_code} == {code, other_code}:
+            return True
+    return False
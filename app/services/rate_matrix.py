@@ -0,0 +1,122 @@
+from array import array
+from decimal import Decimal
+
+from app.dtos.currency_dto import CurrencyDTO
+from app.dtos.exchange_rate_dto import ExchangeRateDTO
+from app.services.rate_graph import RateGraph
+
+NO_PARENT = -1
+
+
+class RateMatrix:
+    """
+    Precomputed conversion rates for every ordered pair of currencies.
+
+    Currencies get dense slots in order of their ids. Rates and the parent
+    of every pair on its best path are stored in flat ``n * n`` arrays,
+    so a lookup is two dict hits and one index. The best paths are those
+    of the RateGraph, and since they depend only on which pairs exist,
+    changing a rate keeps the parents and only touches the pairs whose
+    path goes through the changed pair.
+    """
+
+    def __init__(self, rate_graph: RateGraph) -> None:
+        self._graph = rate_graph
+        self._currencies = rate_graph.currencies()
+        self._codes = [currency.code for currency in self._currencies]
+        self._slots = {code: slot for slot, code in enumerate(self._codes)}
+        self._size = len(self._codes)
+
+        size = self._size
+        self._parents = array("i", [NO_PARENT]) * (size * size)
+        self._rates: list[Decimal | None] = [None] * (size * size)
+        for row, from_code in enumerate(self._codes):
+            offset = row * size
+            tree = rate_graph.shortest_path_tree(from_code)
+            for to_code, parent_code in tree.items():
+                self._parents[offset + self._slots[to_code]] = self._slots[
+                    parent_code
+                ]
+            for to_code in tree:
+                column = self._slots[to_code]
+                self._rates[offset + column] = self._entry_rate(row, column)
+
+    def get_currency(self, code: str) -> CurrencyDTO | None:
+        """Get currency that takes part in at least one exchange rate."""
+        slot = self._slots.get(code)
+        return self._currencies[slot] if slot is not None else None
+
+    def find_rate(self, from_code: str, to_code: str) -> Decimal | None:
+        """Look up conversion rate from one currency to another or None."""
+        row = self._slots.get(from_code)
+        column = self._slots.get(to_code)
+        if row is None or column is None:
+            return None
+        return self._rates[row * self._size + column]
+
+    def with_updated_rate(
+        self, exchange_rate: ExchangeRateDTO
+    ) -> "RateMatrix":
+        """
+        Get a matrix in which the stored rate of the pair is
+        ``exchange_rate``, on a graph built copy-on-write from this one.
+        A new pair rebuilds the whole matrix.
+
+        Only rows whose best path tree uses the changed pair are scanned and
+        only the entries below it in the tree are recalculated. The result
+        is a new matrix, readers of this one are never affected.
+        """
+        base_code = exchange_rate.baseCurrency.code
+        target_code = exchange_rate.targetCurrency.code
+        rate_graph = self._graph.with_updated_rate(exchange_rate)
+        if self._graph.edge(base_code, target_code) is None:
+            # A new pair, best paths may change
+            return RateMatrix(rate_graph)
+
+        updated = RateMatrix.__new__(RateMatrix)
+        updated._graph = rate_graph
+        updated._currencies = self._currencies
+        updated._codes = self._codes
+        updated._slots = self._slots
+        updated._size = self._size
+        updated._parents = self._parents
+        updated._rates = list(self._rates)
+
+        base = self._slots[base_code]
+        target = self._slots[target_code]
+        # Backward edge follows the changed rate unless the opposite rate
+        # is stored as well
+        backward_edge = rate_graph.edge(target_code, base_code)
+        backward_changed = backward_edge is not None and backward_edge[1]
+
+        size = self._size
+        parents = self._parents
+        for row in range(size):
+            offset = row * size
+            roots = set()
+            if parents[offset + target] == base:
+                roots.add(target)
+            if backward_changed and parents[offset + base] == target:
+                roots.add(base)
+            if not roots:
+                continue
+
+            for column in range(size):
+                slot = column
+                while slot != NO_PARENT and slot != row:
+                    if slot in roots:
+                        updated._rates[offset + column] = (
+                            updated._entry_rate(row, column)
+                        )
+                        break
+                    slot = parents[offset + slot]
+        return updated
+
+    def _entry_rate(self, row: int, column: int) -> Decimal:
+        """Calculate the rate of one pair along its best path."""
+        offset = row * self._size
+        path = [column]
+        while path[-1] != row:
+            path.append(self._parents[offset + path[-1]])
+        path.reverse()
+        return self._graph.path_rate([self._codes[slot] for slot in path])
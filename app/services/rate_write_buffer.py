@@ -0,0 +1,141 @@
+"""
+Write-behind buffer of exchange rate updates.
+
+Updates are collected per currency pair, a later update of a pair
+replaces the earlier one, and a background thread writes them ``window``
+seconds after the first one of a batch, all in one transaction. Until
+the batch is committed, the buffered rates are served from memory.
+"""
+import logging
+import threading
+from collections.abc import Callable
+
+from app.exceptions import DatabaseError
+from app.read_models.exchange_rate_view import ExchangeRateView
+
+logger = logging.getLogger(__name__)
+
+# (base currency code, target currency code)
+Pair = tuple[str, str]
+
+
+class _Batch:
+    """Updates written in one transaction."""
+
+    __slots__ = ("views", "done", "error")
+
+    def __init__(self) -> None:
+        self.views: dict[Pair, ExchangeRateView] = {}
+        # Set once the batch is written or has failed
+        self.done = threading.Event()
+        self.error: Exception | None = None
+
+
+class RateWriteBuffer:
+    def __init__(
+        self,
+        write: Callable[[list[ExchangeRateView]], None],
+        window: float,
+        on_failure: Callable[[list[ExchangeRateView]], None] | None = None,
+    ) -> None:
+        self.write = write
+        self.window = window
+        # Called with the updates of a failed batch once they are dropped
+        self.on_failure = on_failure
+        # Batch collecting updates, and the one being written. Lookups
+        # read them without locking, so the written batch is published
+        # before the collecting one is replaced.
+        self._batch = _Batch()
+        self._writing: dict[Pair, ExchangeRateView] = {}
+        self._lock = threading.Lock()
+        # Held while a batch is written, batches are written in order
+        self._write_lock = threading.Lock()
+        self._has_updates = threading.Event()
+        self._closing = threading.Event()
+        self._flusher: threading.Thread | None = None
+
+    def put(self, view: ExchangeRateView) -> _Batch:
+        """Buffer the new rate of a pair and return its batch."""
+        pair = (view.base_currency_code, view.target_currency_code)
+        with self._lock:
+            if self._closing.is_set():
+                raise DatabaseError("Exchange rate writes are shut down.")
+            batch = self._batch
+            batch.views[pair] = view
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run, name="rate-write-buffer", daemon=True
+                )
+                self._flusher.start()
+            self._has_updates.set()
+        return batch
+
+    @staticmethod
+    def wait(batch: _Batch) -> None:
+        """Wait until the batch is committed, raise if it has failed."""
+        batch.done.wait()
+        if batch.error is not None:
+            raise DatabaseError(
+                "Failed to write the exchange rate."
+            ) from batch.error
+
+    def get(self, pair: Pair) -> ExchangeRateView | None:
+        """Get the buffered rate of a pair, None if it has none."""
+        view = self._batch.views.get(pair)
+        if view is None:
+            view = self._writing.get(pair)
+        return view
+
+    def pending_by_id(self) -> dict[int, ExchangeRateView]:
+        """Get buffered rates by exchange rate id."""
+        with self._lock:
+            views = {**self._writing, **self._batch.views}
+        return {view.id: view for view in views.values()}
+
+    def flush(self) -> None:
+        """Write the buffered updates now."""
+        with self._write_lock:
+            with self._lock:
+                batch = self._batch
+                self._has_updates.clear()
+                if not batch.views:
+                    return
+                self._writing = batch.views
+                self._batch = _Batch()
+            views = list(batch.views.values())
+            try:
+                self.write(views)
+            except Exception as e:
+                # The updates are dropped, reads fall back to the database
+                batch.error = e
+                logger.exception(
+                    "Failed to write %d buffered exchange rates",
+                    len(views),
+                )
+                with self._lock:
+                    self._writing = {}
+                if self.on_failure is not None:
+                    self.on_failure(views)
+            finally:
+                with self._lock:
+                    self._writing = {}
+                batch.done.set()
+
+    def close(self) -> None:
+        """Stop the background thread and write the buffered updates."""
+        with self._lock:
+            self._closing.set()
+            # Wakes the background thread up if it is idle
+            self._has_updates.set()
+            flusher = self._flusher
+        if flusher is not None:
+            flusher.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            self._has_updates.wait()
+            # Let updates of the batch come in, closing writes them now
+            if self._closing.wait(self.window):
+                return
+            self.flush()
@@ -1,3 +1,4 @@
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal, InvalidOperation
 
 from app.config import config
@@ -5,9 +6,12 @@ from app.exceptions import (
     InvalidAmountError,
     InvalidCurrencyPairError,
     InvalidExchangeRateError,
+    InvalidTimestampError,
 )
 from app.validations.currency_validator import CurrencyValidator
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 class ExchangeRateValidator:
     def __init__(
@@ -48,6 +52,10 @@ class ExchangeRateValidator:
             raise InvalidExchangeRateError(
                 "Exchange rate must be a valid number"
             )
+        if not decimal_value.is_finite():
+            raise InvalidExchangeRateError(
+                "Exchange rate must be a valid number"
+            )
 
         if decimal_value <= 0:
             raise InvalidExchangeRateError(
@@ -59,14 +67,13 @@ class ExchangeRateValidator:
                 f"Exchange rate must not exceed {config.max_rate}"
             )
 
-        # Check decimal places
-        if "." in cleaned_rate:
-            decimal_places = len(cleaned_rate.split(".")[1])
-            if decimal_places > config.max_decimal_rate_places:
-                raise InvalidExchangeRateError(
-                    f"Exchange rate cannot have more than "
-                    f"{config.max_decimal_rate_places} decimal places"
-                )
+        # Decimal places as written, exponent notation (1e-7) included
+        decimal_places = -decimal_value.as_tuple().exponent
+        if decimal_places > config.max_decimal_rate_places:
+            raise InvalidExchangeRateError(
+                f"Exchange rate cannot have more than "
+                f"{config.max_decimal_rate_places} decimal places"
+            )
 
         return decimal_value.normalize()
 
@@ -111,3 +118,30 @@ class ExchangeRateValidator:
                                      "than 2 decimal places")
 
         return decimal_value
+
+    def validate_timestamp(self, at: str) -> int | None:
+        """
+        Validate a moment given as ISO 8601 date/time (UTC unless it has
+        an offset) or Unix seconds, return it in Unix milliseconds or
+        None if not given.
+        """
+        cleaned_at = at.strip()
+        if not cleaned_at:
+            return None
+
+        try:
+            moment = EPOCH + timedelta(seconds=float(cleaned_at))
+        except (ValueError, OverflowError):
+            try:
+                moment = datetime.fromisoformat(cleaned_at)
+            except ValueError:
+                raise InvalidTimestampError(
+                    "Timestamp must be an ISO 8601 date/time "
+                    "or Unix seconds"
+                )
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+
+        if moment < EPOCH:
+            raise InvalidTimestampError("Timestamp cannot be before 1970")
+        return (moment - EPOCH) // timedelta(milliseconds=1)
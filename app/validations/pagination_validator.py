@@ -0,0 +1,56 @@
+from app.config import config
+from app.exceptions import InvalidPaginationError
+
+TRUE_VALUES = ("1", "true", "yes")
+FALSE_VALUES = ("", "0", "false", "no")
+# Ids are SQLite 64-bit integers
+MAX_ID = 2**63
+
+
+def _is_integer(value: str) -> bool:
+    return value.isascii() and value.isdigit() and len(value) <= 19
+
+
+class PaginationValidator:
+    def validate_limit(self, limit: str) -> int | None:
+        """Validate page size, None if not given."""
+        cleaned_limit = limit.strip()
+        if not cleaned_limit:
+            return None
+        if not _is_integer(cleaned_limit) or not (
+            1 <= int(cleaned_limit) <= config.max_page_size
+        ):
+            raise InvalidPaginationError(
+                f"Limit must be an integer from 1 to {config.max_page_size}"
+            )
+        return int(cleaned_limit)
+
+    def validate_after(self, after: str) -> int | None:
+        """Validate id of the last item of the previous page."""
+        cleaned_after = after.strip()
+        if not cleaned_after:
+            return None
+        if not _is_integer(cleaned_after) or int(cleaned_after) >= MAX_ID:
+            raise InvalidPaginationError(
+                "After must be the id of the last item of the previous page"
+            )
+        return int(cleaned_after)
+
+    def validate_stream(self, stream: str) -> bool:
+        """Validate streaming flag."""
+        cleaned_stream = stream.strip().lower()
+        if cleaned_stream in TRUE_VALUES:
+            return True
+        if cleaned_stream in FALSE_VALUES:
+            return False
+        raise InvalidPaginationError("Stream must be true or false")
+
+    def validate_page_params(
+        self, limit: str, after: str, stream: str
+    ) -> tuple[int | None, int | None, bool]:
+        """Validate all list parameters at once."""
+        return (
+            self.validate_limit(limit),
+            self.validate_after(after),
+            self.validate_stream(stream),
+        )
@@ -0,0 +1,152 @@
+"""
+Single-pass JSON serialization of response payloads.
+
+Dataclasses are written as objects with camelCase keys, Decimals as
+floats and dictionary keys are camelCased as well. The output is the
+same as ``json.dumps(..., ensure_ascii=False)`` of the equivalent
+camelCased plain data. Serializers are resolved once per type and
+cached, serializers of dataclasses have their keys precomputed.
+"""
+from collections.abc import Callable
+from dataclasses import fields, is_dataclass
+from decimal import Decimal
+from json.encoder import encode_basestring
+from typing import Any
+
+Serializer = Callable[[Any], str]
+
+_serializers: dict[type, Serializer] = {}
+_camel_case_keys: dict[str, str] = {}
+
+
+def to_camel_case(snake_str: str) -> str:
+    """Convert snake_case string to camelCase."""
+    parts = snake_str.split("_")
+    return parts[0] + "".join(x.title() for x in parts[1:])
+
+
+def serialize(payload: Any) -> str:
+    """
+    Serialize payload to a JSON string.
+
+    Raises TypeError for values that can't be serialized and ValueError
+    for values that can't be represented.
+    """
+    return _serialize(payload)
+
+
+def _serialize(value: Any) -> str:
+    value_type = type(value)
+    serializer = _serializers.get(value_type)
+    if serializer is None:
+        serializer = _resolve_serializer(value_type)
+    return serializer(value)
+
+
+def _resolve_serializer(value_type: type) -> Serializer:
+    """Find serializer for a type in the order json.dumps checks them."""
+    if value_type is bool:
+        serializer = _serialize_bool
+    elif value_type is type(None):
+        serializer = _serialize_none
+    elif issubclass(value_type, str):
+        serializer = encode_basestring
+    elif issubclass(value_type, int):
+        serializer = int.__repr__
+    elif issubclass(value_type, float):
+        serializer = _serialize_float
+    elif issubclass(value_type, (list, tuple)):
+        serializer = _serialize_list
+    elif issubclass(value_type, dict):
+        serializer = _serialize_dict
+    elif issubclass(value_type, Decimal):
+        serializer = _serialize_decimal
+    elif is_dataclass(value_type):
+        serializer = _dataclass_serializer(value_type)
+    else:
+        raise TypeError(
+            f"Object of type {value_type.__name__} is not JSON serializable"
+        )
+    _serializers[value_type] = serializer
+    return serializer
+
+
+def _serialize_bool(value: bool) -> str:
+    return "true" if value else "false"
+
+
+def _serialize_none(value: None) -> str:
+    return "null"
+
+
+def _serialize_float(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "Infinity"
+    if value == float("-inf"):
+        return "-Infinity"
+    return float.__repr__(value)
+
+
+def _serialize_decimal(value: Decimal) -> str:
+    return _serialize_float(float(value))
+
+
+def _serialize_list(value: list[Any] | tuple[Any, ...]) -> str:
+    return "[" + ", ".join(map(_serialize, value)) + "]"
+
+
+def _serialize_dict(value: dict[Any, Any]) -> str:
+    # Keys may collide once converted, the last value wins at the
+    # position of the first key as with a dict built from the pairs
+    items: dict[str, Any] = {}
+    for key, item in value.items():
+        items[_camel_case_key(key)] = item
+    return "{" + ", ".join(
+        encode_basestring(key) + ": " + _serialize(item)
+        for key, item in items.items()
+    ) + "}"
+
+
+def _camel_case_key(key: Any) -> str:
+    """Convert dictionary key to the camelCased string JSON key."""
+    if isinstance(key, str):
+        camel_case_key = _camel_case_keys.get(key)
+        if camel_case_key is None:
+            camel_case_key = to_camel_case(key)
+            if len(_camel_case_keys) < 4096:
+                _camel_case_keys[key] = camel_case_key
+        return camel_case_key
+    if key is True:
+        return "true"
+    if key is False:
+        return "false"
+    if key is None:
+        return "null"
+    if isinstance(key, int):
+        return int.__repr__(key)
+    if isinstance(key, float):
+        return _serialize_float(key)
+    raise TypeError(
+        "keys must be str, int, float, bool or None, "
+        f"not {type(key).__name__}"
+    )
+
+
+def _dataclass_serializer(cls: type) -> Serializer:
+    """Build serializer of a dataclass with precomputed JSON keys."""
+    names: dict[str, str] = {}
+    for field in fields(cls):
+        names[to_camel_case(field.name)] = field.name
+    items = [
+        (encode_basestring(key) + ": ", name) for key, name in names.items()
+    ]
+
+    def serialize_dataclass(value: Any) -> str:
+        return "{" + ", ".join(
+            prefix + _serialize(getattr(value, name))
+            for prefix, name in items
+        ) + "}"
+
+    return serialize_dataclass
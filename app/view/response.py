@@ -1,55 +1,52 @@
+import itertools
 import json
-from dataclasses import asdict, is_dataclass
-from decimal import Decimal
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from email.utils import formatdate
 from http import HTTPStatus
 from typing import Any
 
+from app.config import config
+from app.event_broker import EVENT_STREAM_CONTENT_TYPE, EventStream
+from app.view.json_serializer import serialize
 
-class CustomJSONEncoder(json.JSONEncoder):
-    """
-    Custom JSON encoder to handle specific data types
-    like Decimal and dataclasses.
-    """
-    def default(self, o: Any) -> Any:
-        if isinstance(o, Decimal):
-            return float(o)
-        if is_dataclass(o) and not isinstance(o, type):
-            return asdict(o)
-        return super().default(o)
 
+@dataclass(frozen=True)
+class TextPayload:
+    """Payload sent as it is instead of being rendered as JSON."""
 
-def to_camel_case(snake_str: str) -> str:
-    """Convert snake_case string to camelCase."""
-    parts = snake_str.split("_")
-    return parts[0] + "".join(x.title() for x in parts[1:])
-
-
-def convert_keys_to_camel_case(data: Any) -> Any:
-    """Recursively convert dictionary keys from snake_case to camelCase."""
-    if isinstance(data, dict):
-        return {
-            to_camel_case(k): convert_keys_to_camel_case(v)
-            for k, v in data.items()
-        }
-    if isinstance(data, list):
-        return [convert_keys_to_camel_case(i) for i in data]
-    return data
+    text: str
+    content_type: str = "text/plain; charset=utf-8"
 
 
 class Response:
     @classmethod
     def render(
         cls, payload: Any, status: HTTPStatus
-    ) -> tuple[bytes, int, dict[str, str]]:
+    ) -> tuple[bytes | Iterator[bytes], int, dict[str, str]]:
         """
-        Render payload as JSON response.
+        Render payload as JSON response. An iterator payload is rendered
+        as a streamed JSON array, see ``render_stream``, a TextPayload as
+        its text and an EventStream as server-sent events.
         """
+        if isinstance(payload, EventStream):
+            headers = {
+                "Content-Type": EVENT_STREAM_CONTENT_TYPE,
+                "Cache-Control": "no-cache",
+            }
+            return payload, status, headers
+        if isinstance(payload, Iterator):
+            return cls.render_stream(payload, status)
+        if isinstance(payload, TextPayload):
+            body_bytes = payload.text.encode("utf-8")
+            headers = {
+                "Content-Type": payload.content_type,
+                "Content-Length": str(len(body_bytes)),
+            }
+            return body_bytes, status, headers
         try:
-            processed_payload = json.loads(
-                json.dumps(payload, ensure_ascii=False, cls=CustomJSONEncoder)
-            )
-            camel_case_payload = convert_keys_to_camel_case(processed_payload)
-            body_str = json.dumps(camel_case_payload, ensure_ascii=False)
+            body_str = serialize(payload)
         except (TypeError, ValueError):
             status = HTTPStatus.INTERNAL_SERVER_ERROR
             body_str = json.dumps(
@@ -64,6 +61,47 @@ class Response:
             headers,
         )
 
+    @classmethod
+    def render_stream(
+        cls, items: Iterable[Any], status: HTTPStatus
+    ) -> tuple[bytes | Iterator[bytes], int, dict[str, str]]:
+        """
+        Render items as a JSON array produced chunk by chunk while it is
+        sent, the body is an iterator of bytes without Content-Length.
+
+        The first chunk is produced right away, so errors of the first
+        read still become a regular error response.
+        """
+        chunks = cls._json_array_chunks(items)
+        try:
+            first_chunk = next(chunks)
+        except (TypeError, ValueError):
+            return cls.render(
+                {"message": "Failed to serialize response payload."},
+                HTTPStatus.INTERNAL_SERVER_ERROR,
+            )
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        return itertools.chain((first_chunk,), chunks), status, headers
+
+    @staticmethod
+    def _json_array_chunks(items: Iterable[Any]) -> Iterator[bytes]:
+        """Serialize items as a JSON array in chunks of about
+        ``stream_chunk_bytes``, same bytes as rendering them as a list."""
+        parts = ["["]
+        size = 1
+        separator = ""
+        for item in items:
+            part = separator + serialize(item)
+            separator = ", "
+            parts.append(part)
+            size += len(part)
+            if size >= config.stream_chunk_bytes:
+                yield "".join(parts).encode("utf-8")
+                parts = []
+                size = 0
+        parts.append("]")
+        yield "".join(parts).encode("utf-8")
+
     @staticmethod
     def _headers_dict(body_bytes: bytes) -> dict[str, str]:
         """Return response headers."""
@@ -72,3 +110,26 @@ class Response:
             "Content-Length": str(len(body_bytes)),
         }
         return headers
+
+    @staticmethod
+    def validator_headers(
+        version_tag: str, modified_at: float
+    ) -> dict[str, str]:
+        """
+        Return ETag and Last-Modified headers of a data version.
+
+        Last-Modified has a resolution of one second, so it is only sent
+        once the second of the last write is over, later writes can't
+        share it then.
+        """
+        headers = {"ETag": f'"{version_tag}"'}
+        if int(time.time()) > int(modified_at):
+            headers["Last-Modified"] = formatdate(modified_at, usegmt=True)
+        return headers
+
+    @staticmethod
+    def not_modified(
+        validators: dict[str, str]
+    ) -> tuple[bytes, int, dict[str, str]]:
+        """Return 304 response without a body."""
+        return b"", HTTPStatus.NOT_MODIFIED, dict(validators)
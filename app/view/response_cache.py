@@ -0,0 +1,70 @@
+import threading
+
+RenderedResponse = tuple[bytes, int, dict[str, str]]
+
+# Cache keys of the list endpoints
+CURRENCIES_CACHE_KEY = "currencies"
+EXCHANGE_RATES_CACHE_KEY = "exchange_rates"
+
+
+class ResponseCache:
+    """
+    Cache of rendered responses keyed by endpoint.
+
+    Services invalidate the keys their writes affect. A response rendered
+    from data read before an invalidation is never stored: ``put`` takes
+    the generation seen by ``get`` and drops the response if any
+    invalidation has happened since.
+    """
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._responses: dict[str, RenderedResponse] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[RenderedResponse | None, int]:
+        """
+        Get cached response or None, and the generation to pass to ``put``.
+        Headers of the returned response may be modified by the caller.
+        """
+        with self._lock:
+            generation = self._generation
+            response = self._responses.get(key)
+            if response is None:
+                self.misses += 1
+                return None, generation
+            self.hits += 1
+        body, status, headers = response
+        return (body, status, dict(headers)), generation
+
+    def put(
+        self, key: str, response: RenderedResponse, generation: int
+    ) -> None:
+        """Store response unless the cache was invalidated meanwhile."""
+        body, status, headers = response
+        with self._lock:
+            if generation == self._generation:
+                self._responses[key] = (body, status, dict(headers))
+
+    def invalidate(self, *keys: str) -> None:
+        """Drop cached responses of the given keys, or all of them."""
+        with self._lock:
+            self._generation += 1
+            if not keys:
+                self._responses.clear()
+            for key in keys:
+                self._responses.pop(key, None)
+
+    def stats(self) -> dict[str, int | float]:
+        """Get hit and miss counters and the number of cached responses."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._responses),
+            }
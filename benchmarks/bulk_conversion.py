@@ -0,0 +1,118 @@
+"""
+Compare bulk conversion of many amounts against the per-item Decimal path.
+
+- decimal: (amount * rate).quantize(...) per item, as calculate_exchange
+- python int: fixed-point conversion with Python ints
+- numpy: fixed-point conversion with int64 arrays (if NumPy is installed)
+
+Every strategy is checked to give exactly the Decimal results. Stored
+rates have at most 6 decimals, derived (inverse and cross) rates have up
+to 28 significant digits and don't fit the int64 fast path.
+
+Run: python -m benchmarks.bulk_conversion [positions] [pairs]
+"""
+import random
+import sys
+from decimal import ROUND_HALF_UP, Decimal
+
+# Must come first, it points the app at a temporary database
+from benchmarks.common import print_table, sample_pairs, seed_database, timed
+
+from app.container import container
+from app.services import fixed_point
+from app.services.fixed_point import from_minor_units
+
+DEFAULT_POSITIONS = 1_000_000
+DEFAULT_PAIRS = 50
+
+
+def decimal_path(
+    amounts_by_pair: dict[tuple[str, str], list[int]],
+) -> dict[tuple[str, str], list[Decimal]]:
+    service = container.exchange_rates_service
+    quantum = Decimal("0.01")
+    results = {}
+    for (from_code, to_code), amounts in amounts_by_pair.items():
+        rate = service.calculate_exchange(
+            from_code, to_code, Decimal(1)
+        ).rate
+        results[(from_code, to_code)] = [
+            (from_minor_units(amount) * rate).quantize(
+                quantum, rounding=ROUND_HALF_UP
+            )
+            for amount in amounts
+        ]
+    return results
+
+
+def run(
+    scenario: str,
+    pairs: list[tuple[str, str]],
+    positions: int,
+    rng: random.Random,
+) -> list[list[object]]:
+    service = container.exchange_rates_service
+    per_pair = positions // len(pairs)
+    amounts_by_pair = {
+        pair: [rng.randint(1, 10**rng.randint(2, 12)) for _ in range(per_pair)]
+        for pair in pairs
+    }
+    total = per_pair * len(pairs)
+
+    decimal_s, expected = timed(lambda: decimal_path(amounts_by_pair))
+    rows = [[scenario, "decimal", total, decimal_s * 1000, 1.0]]
+
+    python_s, converted = timed(lambda: service.convert_bulk(amounts_by_pair))
+    for pair, values in converted.items():
+        assert [from_minor_units(value) for value in values] == expected[pair]
+    rows.append(
+        [scenario, "python int", total, python_s * 1000, decimal_s / python_s]
+    )
+
+    numpy = fixed_point.numpy
+    if numpy is not None:
+        arrays = {
+            pair: numpy.array(amounts, dtype=numpy.int64)
+            for pair, amounts in amounts_by_pair.items()
+        }
+        numpy_s, converted = timed(lambda: service.convert_bulk(arrays))
+        for pair, values in converted.items():
+            assert [
+                from_minor_units(value) for value in values.tolist()
+            ] == expected[pair]
+        rows.append(
+            [scenario, "numpy", total, numpy_s * 1000, decimal_s / numpy_s]
+        )
+    return rows
+
+
+def main() -> None:
+    positions = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_POSITIONS
+    pair_count = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PAIRS
+
+    codes = seed_database(200)
+    service = container.exchange_rates_service
+    rng = random.Random(3)
+
+    stored_pairs = [
+        (rate.baseCurrency.code, rate.targetCurrency.code)
+        for rate in service.get_exchange_rates()
+    ][:pair_count]
+    derived_pairs = [
+        pair
+        for pair in dict.fromkeys(sample_pairs(codes, pair_count * 4))
+        if pair not in stored_pairs
+        and not isinstance(service.convert_bulk({pair: [1]})[pair], Exception)
+    ][:pair_count]
+
+    if fixed_point.numpy is None:
+        print("NumPy is not installed, skipping the NumPy strategy")
+    rows = run("stored rates", stored_pairs, positions, rng)
+    rows += run("derived rates", derived_pairs, positions, rng)
+    print_table(
+        ["rates", "strategy", "amounts", "total ms", "speedup"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
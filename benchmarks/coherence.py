@@ -0,0 +1,246 @@
+"""
+Check that servers sharing one database see each other's writes.
+
+Two servers run in separate processes on the same temporary database.
+Every round, one of them changes a rate (and every few rounds adds a
+currency) while the other has the affected responses cached: the rate
+list, the rates snapshot behind /exchange and the ETag. The other server
+is polled until all of them reflect the write, and the time it took is
+reported. A server still serving the old data after the deadline fails
+the check, and the script exits with status 1.
+
+Run: python -m benchmarks.coherence [--rounds N] [--mode threaded]
+"""
+import argparse
+import http.client
+import json
+import statistics
+import sys
+import time
+from decimal import Decimal
+from urllib.parse import urlencode
+
+# Must come first, it points the app at a temporary database
+from benchmarks.common import print_table, seed_database
+from benchmarks.load import FORM_HEADERS, HOST, running_server
+
+from app.config import config
+from app.server import SERVER_MODES
+
+CURRENCY_COUNT = 50
+# Rounds between currency additions
+CURRENCY_ROUNDS = 5
+# Seconds between reads of the polled server
+READ_INTERVAL = 0.01
+
+
+class Client:
+    """Persistent connection to one server."""
+
+    def __init__(self, name: str, port: int) -> None:
+        self.name = name
+        self.connection = http.client.HTTPConnection(HOST, port, timeout=10)
+
+    def request(
+        self,
+        method: str,
+        target: str,
+        form: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, dict[str, str], object]:
+        headers = dict(headers or {})
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers.update(FORM_HEADERS)
+        self.connection.request(method, target, body=body, headers=headers)
+        response = self.connection.getresponse()
+        raw = response.read()
+        payload = (
+            json.loads(raw, parse_float=Decimal, parse_int=Decimal)
+            if raw
+            else None
+        )
+        return response.status, dict(response.getheaders()), payload
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def rate_views(
+    client: Client, base: str, target: str
+) -> tuple[dict[str, Decimal], str]:
+    """Get the pair's rate as every cached view serves it, and the ETag."""
+    _status, headers, rates = client.request("GET", "/exchangeRates")
+    listed = next(
+        rate["rate"] for rate in rates
+        if rate["baseCurrency"]["code"] == base
+        and rate["targetCurrency"]["code"] == target
+    )
+    query = urlencode({"from": base, "to": target, "amount": "1"})
+    _status, _headers, exchange = client.request("GET", f"/exchange?{query}")
+    return {"list": listed, "exchange": exchange["rate"]}, headers["ETag"]
+
+
+def wait_for_rate(
+    client: Client,
+    base: str,
+    target: str,
+    rate: Decimal,
+    old_etag: str,
+    deadline: float,
+) -> tuple[float | None, list[str]]:
+    """
+    Read until every view serves the rate and the old ETag is no longer
+    current. Return the seconds it took, None if the deadline has passed,
+    and the views still stale then.
+    """
+    start = time.monotonic()
+    while True:
+        views, _etag = rate_views(client, base, target)
+        stale = [name for name, value in views.items() if value != rate]
+        status, _headers, _body = client.request(
+            "GET", "/exchangeRates", headers={"If-None-Match": old_etag}
+        )
+        if status == 304:
+            stale.append("etag")
+        elapsed = time.monotonic() - start
+        if not stale:
+            return elapsed, []
+        if elapsed > deadline:
+            return None, stale
+        time.sleep(READ_INTERVAL)
+
+
+def wait_for_currency(
+    client: Client, code: str, deadline: float
+) -> float | None:
+    """Read the currency list until it has the code, None if it hasn't
+    by the deadline."""
+    start = time.monotonic()
+    while True:
+        _status, _headers, currencies = client.request("GET", "/currencies")
+        elapsed = time.monotonic() - start
+        if any(currency["code"] == code for currency in currencies):
+            return elapsed
+        if elapsed > deadline:
+            return None
+        time.sleep(READ_INTERVAL)
+
+
+def new_currency_codes() -> list[str]:
+    """Codes not used by the seeded currencies, in a fixed order."""
+    letters = "ZYXWVUTSRQ"
+    return [a + b + c for a in letters for b in letters for c in letters]
+
+
+def run(rounds: int, mode: str, deadline: float) -> bool:
+    seed_database(CURRENCY_COUNT)
+    with running_server(mode) as port_a, running_server(mode) as port_b:
+        clients = [Client("A", port_a), Client("B", port_b)]
+        _status, _headers, rates = clients[0].request("GET", "/exchangeRates")
+        base = rates[0]["baseCurrency"]["code"]
+        target = rates[0]["targetCurrency"]["code"]
+        codes = iter(new_currency_codes())
+        rate_delays: list[float] = []
+        currency_delays: list[float] = []
+        failures: list[str] = []
+
+        for index in range(rounds):
+            writer, reader = (
+                clients if index % 2 == 0 else reversed(clients)
+            )
+            # Fill the reader's caches with the current data
+            _views, old_etag = rate_views(reader, base, target)
+            rate = Decimal(f"1.{index + 1:04d}")
+            status, _headers, _body = writer.request(
+                "PATCH",
+                f"/exchangeRate/{base}{target}",
+                form={"rate": str(rate)},
+            )
+            if status != 200:
+                failures.append(f"round {index}: PATCH returned {status}")
+                continue
+            elapsed, stale = wait_for_rate(
+                reader, base, target, rate, old_etag, deadline
+            )
+            if elapsed is None:
+                failures.append(
+                    f"round {index}: {reader.name} served stale "
+                    f"{', '.join(stale)} after {deadline:.1f} s"
+                )
+            else:
+                rate_delays.append(elapsed)
+
+            if index % CURRENCY_ROUNDS == 0:
+                reader.request("GET", "/currencies")
+                code = next(codes)
+                status, _headers, _body = writer.request(
+                    "POST",
+                    "/currencies",
+                    form={"name": f"Currency {code}", "code": code,
+                          "sign": code[0]},
+                )
+                if status != 201:
+                    failures.append(
+                        f"round {index}: POST /currencies returned {status}"
+                    )
+                    continue
+                elapsed = wait_for_currency(reader, code, deadline)
+                if elapsed is None:
+                    failures.append(
+                        f"round {index}: {reader.name} doesn't list {code} "
+                        f"after {deadline:.1f} s"
+                    )
+                else:
+                    currency_delays.append(elapsed)
+
+        for client in clients:
+            client.close()
+
+    print_table(
+        ["write", "checked", "mean ms", "max ms"],
+        [
+            [name, len(delays),
+             statistics.fmean(delays) * 1000 if delays else 0.0,
+             max(delays, default=0.0) * 1000]
+            for name, delays in (
+                ("rate", rate_delays), ("currency", currency_delays)
+            )
+        ],
+    )
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return not failures
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.coherence")
+    parser.add_argument("-r", "--rounds", type=int, default=40)
+    parser.add_argument(
+        "-m", "--mode", choices=SERVER_MODES, default="threaded",
+        help="server mode of both servers",
+    )
+    parser.add_argument(
+        "--deadline", type=float,
+        default=(config.db_change_poll_interval or 0.0) + 2.0,
+        help="seconds a write may take to show on the other server",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    if config.db_change_poll_interval is None:
+        sys.exit("db_change_poll_interval is None, writes aren't tracked")
+    print(
+        f"{args.rounds} rounds, {args.mode} servers, change poll interval "
+        f"{config.db_change_poll_interval * 1000:.0f} ms"
+    )
+    if not run(args.rounds, args.mode, args.deadline):
+        sys.exit(1)
+    print("OK, both servers served each other's writes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Shared helpers for benchmarks.
+
+Importing this module points the application at a fresh temporary
+database, so it must be imported before any ``app`` module.
+"""
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections.abc import Callable, Iterable
+from decimal import Decimal
+from pathlib import Path
+
+TEMP_DIR = Path(tempfile.mkdtemp(prefix="currency_exchange_bench_"))
+os.environ["CURRENCY_EXCHANGE_DB_PATH"] = str(TEMP_DIR / "database.db")
+
+from app.database.db_init import init_db  # noqa: E402
+from app.database.db_session import db_session  # noqa: E402
+from app.mappers.exchange_rate_mapper import ExchangeRateMapper  # noqa: E402
+
+HUB_CODE = "USD"
+
+
+def generate_codes(count: int) -> list[str]:
+    """Generate ``count`` currency codes, the default ones included."""
+    codes = ["AUD", "USD", "EUR", "JPY"]
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    for chars in itertools.product(letters, repeat=3):
+        if len(codes) >= count:
+            break
+        code = "".join(chars)
+        if code not in codes:
+            codes.append(code)
+    return codes[:count]
+
+
+def seed_database(
+    currency_count: int,
+    cross_pairs_per_currency: int = 2,
+    hub_coverage: float = 0.8,
+    seed: int = 42,
+) -> list[str]:
+    """
+    Fill the database with ``currency_count`` currencies. Most currencies
+    get a rate from the hub currency, plus some random cross rates.
+    """
+    rng = random.Random(seed)
+    init_db()
+    codes = generate_codes(currency_count)
+    with db_session() as cursor:
+        cursor.execute("DELETE FROM ExchangeRates")
+        cursor.execute("DELETE FROM ExchangeRateHistory")
+        cursor.executemany(
+            "INSERT OR IGNORE INTO Currencies (code, name, sign) "
+            "VALUES(?, ?, ?)",
+            [(code, f"Currency {code}", code[0]) for code in codes],
+        )
+        cursor.execute("SELECT id, code FROM Currencies")
+        ids = {row["code"]: row["id"] for row in cursor.fetchall()}
+
+        pairs: dict[tuple[str, str], str] = {}
+        for code in codes:
+            if code != HUB_CODE and rng.random() < hub_coverage:
+                pairs[(HUB_CODE, code)] = random_rate(rng)
+        for code in codes:
+            for _ in range(cross_pairs_per_currency):
+                other = rng.choice(codes)
+                if other != code and (other, code) not in pairs:
+                    pairs[(code, other)] = random_rate(rng)
+        cursor.executemany(
+            "INSERT INTO ExchangeRates "
+            "(base_currency_id, target_currency_id, rate) VALUES(?, ?, ?)",
+            [
+                (
+                    ids[base],
+                    ids[target],
+                    ExchangeRateMapper.rate_to_column(Decimal(rate)),
+                )
+                for (base, target), rate in pairs.items()
+            ],
+        )
+    return codes
+
+
+def random_rate(rng: random.Random) -> str:
+    return f"{rng.uniform(0.001, 1000):.6f}".rstrip("0").rstrip(".")
+
+
+def sample_pairs(
+    codes: list[str], count: int, seed: int = 7
+) -> list[tuple[str, str]]:
+    rng = random.Random(seed)
+    return [tuple(rng.sample(codes, 2)) for _ in range(count)]
+
+
+def timed(func: Callable[[], object]) -> tuple[float, object]:
+    """Run ``func`` once and return (seconds, result)."""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def per_call_us(
+    func: Callable[..., object], args_list: Iterable[tuple]
+) -> dict[str, float]:
+    """Time every call and return mean/p50/p99 in microseconds."""
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def print_table(headers: list[str], rows: list[list[object]]) -> None:
+    cells = [headers] + [[format_cell(cell) for cell in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for index, row in enumerate(cells):
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+        if index == 0:
+            print("  ".join("-" * width for width in widths))
+
+
+def format_cell(cell: object) -> str:
+    if isinstance(cell, float):
+        return f"{cell:.2f}"
+    return str(cell)
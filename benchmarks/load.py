@@ -0,0 +1,580 @@
+"""
+Load test the HTTP API over many keep-alive connections.
+
+Every scenario seeds the temporary database through ``init_db``, starts
+the server on it in a subprocess and drives it from ``--connections``
+threads, each with its own persistent connection, for ``--duration``
+seconds after a warm-up. Throughput and p50/p95/p99 latencies are
+printed and saved as JSON together with the commit, so runs can be
+compared across commits.
+
+Run: python -m benchmarks.load [scenarios...] [--connections N]
+         [--duration S] [--mode threaded] [--compare results.json]
+
+Only the standard library is used. The load generator shares one
+process, so its own overhead is part of the latencies; compare runs made
+with the same options on the same machine.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlencode
+
+# Must come first, it points the app at a temporary database
+from benchmarks.common import (
+    HUB_CODE,
+    TEMP_DIR,
+    print_table,
+    seed_database,
+)
+
+from app.config import BASE_DIR
+from app.database.db_session import db_session
+from app.server import SERVER_MODES
+
+RESULTS_DIR = BASE_DIR / "benchmarks" / "results"
+SERVER_LOG = TEMP_DIR / "server.log"
+HOST = "127.0.0.1"
+SERVER_START_TIMEOUT = 30.0
+PAIRS_CURRENCIES = 200
+# Sampled pairs of each kind the /exchange scenarios choose from
+MAX_PAIRS = 1000
+HOT_PAIRS = 8
+AMOUNT = "100"
+FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+# (kind, method, target, body), kind groups the latencies in results
+Request = tuple[str, str, str, bytes]
+# (random generator, connection index) -> next request of the connection
+RequestFactory = Callable[[random.Random, int], Request]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    description: str
+    # Seeds the database and returns the request factory
+    setup: Callable[[], RequestFactory]
+
+
+def seed_pairs() -> dict[str, list[tuple[str, str]]]:
+    """
+    Seed currencies with rates from USD and some cross rates, and sort
+    currency pairs by how /exchange resolves them: "direct" pairs have a
+    rate, "inverse" pairs only a rate the other way round and "cross"
+    pairs are converted through USD.
+    """
+    seed_database(PAIRS_CURRENCIES, cross_pairs_per_currency=3)
+    with db_session() as cursor:
+        cursor.execute("""
+            SELECT b.code AS base, t.code AS target
+            FROM ExchangeRates er
+            JOIN Currencies b ON b.id = er.base_currency_id
+            JOIN Currencies t ON t.id = er.target_currency_id""")
+        direct = [(row["base"], row["target"]) for row in cursor.fetchall()]
+
+    rated = set(direct)
+    inverse = [(target, base) for base, target in direct
+               if (target, base) not in rated]
+    hub_targets = sorted(target for base, target in direct
+                         if base == HUB_CODE)
+    cross = [
+        (first, second)
+        for first in hub_targets
+        for second in hub_targets
+        if first != second
+        and (first, second) not in rated
+        and (second, first) not in rated
+    ]
+    rng = random.Random(5)
+    return {
+        kind: rng.sample(pairs, min(len(pairs), MAX_PAIRS))
+        for kind, pairs in (
+            ("direct", direct), ("inverse", inverse), ("cross", cross)
+        )
+    }
+
+
+def seed_rates(count: int) -> None:
+    """Seed exactly ``count`` exchange rates."""
+    seed_database(max(10, count // 8), cross_pairs_per_currency=10)
+    with db_session() as cursor:
+        cursor.execute(
+            "DELETE FROM ExchangeRates WHERE id NOT IN "
+            "(SELECT id FROM ExchangeRates ORDER BY id LIMIT ?)",
+            (count,),
+        )
+        cursor.execute("SELECT count(*) FROM ExchangeRates")
+        stored = cursor.fetchone()[0]
+    if stored != count:
+        raise RuntimeError(f"Seeded {stored} exchange rates, not {count}")
+
+
+def exchange_request(base: str, target: str) -> Request:
+    query = urlencode({"from": base, "to": target, "amount": AMOUNT})
+    return "exchange", "GET", f"/exchange?{query}", b""
+
+
+def patch_request(rng: random.Random, base: str, target: str) -> Request:
+    body = urlencode({"rate": f"{rng.uniform(0.5, 2):.6f}"}).encode()
+    return "patch", "PATCH", f"/exchangeRate/{base}{target}", body
+
+
+def exchange_scenario(kind: str) -> Callable[[], RequestFactory]:
+    def setup() -> RequestFactory:
+        pairs = seed_pairs()[kind]
+
+        def next_request(rng: random.Random, _connection: int) -> Request:
+            return exchange_request(*rng.choice(pairs))
+
+        return next_request
+
+    return setup
+
+
+def list_scenario(rows: int, stream: bool) -> Callable[[], RequestFactory]:
+    target = "/exchangeRates?stream=1" if stream else "/exchangeRates"
+
+    def setup() -> RequestFactory:
+        seed_rates(rows)
+        return lambda _rng, _connection: ("list", "GET", target, b"")
+
+    return setup
+
+
+def setup_mixed() -> RequestFactory:
+    """Mostly conversions, some single rate reads, 10% rate updates."""
+    pairs = seed_pairs()
+    reads = pairs["direct"] + pairs["inverse"] + pairs["cross"]
+
+    def next_request(rng: random.Random, _connection: int) -> Request:
+        roll = rng.random()
+        if roll < 0.1:
+            return patch_request(rng, *rng.choice(pairs["direct"]))
+        if roll < 0.2:
+            base, target = rng.choice(pairs["direct"])
+            return "rate", "GET", f"/exchangeRate/{base}{target}", b""
+        return exchange_request(*rng.choice(reads))
+
+    return next_request
+
+
+def setup_patch_storm() -> RequestFactory:
+    """
+    Every other connection updates a few hot USD rates back to back,
+    the rest convert through USD, so every write invalidates the rates
+    the readers need.
+    """
+    pairs = seed_pairs()
+    hot = [pair for pair in pairs["direct"] if pair[0] == HUB_CODE]
+    hot = hot[:HOT_PAIRS]
+
+    def next_request(rng: random.Random, connection: int) -> Request:
+        if connection % 2 == 0:
+            return patch_request(rng, *rng.choice(hot))
+        return exchange_request(*rng.choice(pairs["cross"]))
+
+    return next_request
+
+
+SCENARIOS: dict[str, Scenario] = {
+    "exchange_direct": Scenario(
+        "GET /exchange of pairs with a rate",
+        exchange_scenario("direct"),
+    ),
+    "exchange_inverse": Scenario(
+        "GET /exchange of pairs with a reversed rate",
+        exchange_scenario("inverse"),
+    ),
+    "exchange_cross": Scenario(
+        "GET /exchange of pairs converted through USD",
+        exchange_scenario("cross"),
+    ),
+    **{
+        f"list_{label}{suffix}": Scenario(
+            f"GET /exchangeRates{query} of {rows} rates",
+            list_scenario(rows, stream=bool(query)),
+        )
+        for label, rows in (("10", 10), ("1k", 1000), ("30k", 30000))
+        # The plain list is served from the response cache, the stream
+        # is read from the database every time
+        for suffix, query in (("", ""), ("_stream", "?stream=1"))
+    },
+    "mixed": Scenario(
+        "80% /exchange, 10% /exchangeRate reads, 10% PATCH",
+        setup_mixed,
+    ),
+    "patch_storm": Scenario(
+        "half the connections PATCH hot USD rates, half convert via USD",
+        setup_patch_storm,
+    ),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running_server(mode: str) -> Iterator[int]:
+    """Run ``python -m app serve`` on the benchmark database, yield port."""
+    port = free_port()
+    env = {
+        **os.environ,
+        "CURRENCY_EXCHANGE_HOST": HOST,
+        "CURRENCY_EXCHANGE_PORT": str(port),
+        "CURRENCY_EXCHANGE_SERVER_MODE": mode,
+    }
+    # The access log goes to a file, writing it to a terminal would slow
+    # the server down
+    with open(SERVER_LOG, "ab") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app", "serve"],
+            cwd=BASE_DIR,
+            env=env,
+            stdout=log,
+            stderr=log,
+        )
+    try:
+        wait_until_listening(process, port)
+        yield port
+    finally:
+        # The server stops on Ctrl+C, prefork stops its workers too
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def wait_until_listening(process: subprocess.Popen, port: int) -> None:
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(
+                f"Server exited with code {process.returncode}, "
+                f"see {SERVER_LOG}"
+            )
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not listen on port {port}")
+
+
+def send(connection: http.client.HTTPConnection, request: Request) -> int:
+    """Send a request, read the response and return its status, 0 if the
+    connection failed. The connection reopens on the next request after
+    the server closed it."""
+    _kind, method, target, body = request
+    try:
+        connection.request(
+            method,
+            target,
+            body=body or None,
+            headers=FORM_HEADERS if body else {},
+        )
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except (OSError, http.client.HTTPException):
+        connection.close()
+        return 0
+
+
+def prime(port: int, next_request: RequestFactory, connections: int) -> None:
+    """
+    Send one request of the first two connections, which are the roles
+    scenarios have, so lazily built state like the response cache isn't
+    built by every connection at once while measuring.
+    """
+    connection = http.client.HTTPConnection(HOST, port, timeout=60)
+    for index in range(min(connections, 2)):
+        send(connection, next_request(random.Random(index), index))
+    connection.close()
+
+
+def generate_load(
+    port: int,
+    next_request: RequestFactory,
+    connections: int,
+    duration: float,
+    warmup: float,
+) -> tuple[list[tuple[str, float, int]], float]:
+    """
+    Send requests from every connection until the time is up.
+
+    Return (kind, seconds, status) of the requests that completed after
+    the warm-up, and the seconds from the end of the warm-up until the
+    last of them completed. Requests still running at the deadline are
+    waited for, so scenarios with requests longer than the duration
+    still get samples.
+    """
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+    # Per connection lists of (kind, seconds, status, completed at)
+    samples: list[list[tuple[str, float, int, float]]] = [
+        [] for _ in range(connections)
+    ]
+
+    def run_connection(index: int) -> None:
+        rng = random.Random(index)
+        connection = http.client.HTTPConnection(HOST, port, timeout=60)
+        recorded = samples[index]
+        while True:
+            request = next_request(rng, index)
+            sent = time.perf_counter()
+            if sent >= deadline:
+                break
+            status = send(connection, request)
+            completed = time.perf_counter()
+            if completed >= measure_from:
+                recorded.append(
+                    (request[0], completed - sent, status, completed)
+                )
+        connection.close()
+
+    threads = [
+        threading.Thread(target=run_connection, args=(index,))
+        for index in range(connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    measured = [sample for recorded in samples for sample in recorded]
+    if not measured:
+        return [], duration
+    elapsed = max(sample[3] for sample in measured) - measure_from
+    return [sample[:3] for sample in measured], elapsed
+
+
+def summarize(
+    samples: list[tuple[str, float, int]], seconds: float
+) -> dict[str, object]:
+    """
+    Throughput over ``seconds``, latency percentiles in ms and status
+    counts.
+    """
+    latencies = sorted(seconds for _kind, seconds, _status in samples)
+    statuses = Counter(status for _kind, _seconds, status in samples)
+    count = len(latencies)
+
+    def percentile(fraction: float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(count - 1, int(count * fraction))] * 1000
+
+    return {
+        "requests": count,
+        "throughput_rps": count / seconds,
+        "mean_ms": sum(latencies) / count * 1000 if count else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "errors": sum(
+            n for status, n in statuses.items()
+            if status == 0 or status >= 400
+        ),
+        "statuses": {str(status): n for status, n in sorted(statuses.items())},
+    }
+
+
+def run_scenario(
+    name: str, mode: str, connections: int, duration: float, warmup: float
+) -> dict[str, object]:
+    next_request = SCENARIOS[name].setup()
+    with running_server(mode) as port:
+        prime(port, next_request, connections)
+        samples, elapsed = generate_load(
+            port, next_request, connections, duration, warmup
+        )
+    result = summarize(samples, elapsed)
+    kinds = sorted({kind for kind, _seconds, _status in samples})
+    if len(kinds) > 1:
+        result["kinds"] = {
+            kind: summarize(
+                [sample for sample in samples if sample[0] == kind],
+                elapsed,
+            )
+            for kind in kinds
+        }
+    return result
+
+
+def git_revision() -> tuple[str, bool]:
+    """Get the short commit hash and whether tracked files are modified."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        changes = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(changes)
+
+
+def print_results(results: dict[str, dict]) -> None:
+    rows = []
+    for name, result in results.items():
+        rows.append(_result_row(name, result))
+        for kind, kind_result in result.get("kinds", {}).items():
+            rows.append(_result_row(f"  {kind}", kind_result))
+    print_table(
+        ["scenario", "requests", "req/s", "p50 ms", "p95 ms", "p99 ms",
+         "errors"],
+        rows,
+    )
+
+
+def _result_row(name: str, result: dict) -> list[object]:
+    return [
+        name,
+        result["requests"],
+        result["throughput_rps"],
+        result["p50_ms"],
+        result["p95_ms"],
+        result["p99_ms"],
+        result["errors"],
+    ]
+
+
+def print_comparison(baseline: dict, current: dict) -> None:
+    """Compare throughput and p99 of the scenarios both runs have."""
+    print(
+        f"\nCompared with {baseline['commit']} "
+        f"({baseline['created_at']}):"
+    )
+    rows = []
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        rows.append([
+            name,
+            before["throughput_rps"],
+            result["throughput_rps"],
+            _change(before["throughput_rps"], result["throughput_rps"]),
+            before["p99_ms"],
+            result["p99_ms"],
+            _change(before["p99_ms"], result["p99_ms"]),
+        ])
+    print_table(
+        ["scenario", "req/s before", "req/s", "change", "p99 before",
+         "p99 ms", "change"],
+        rows,
+    )
+
+
+def _change(before: float, after: float) -> str:
+    if not before:
+        return "-"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument(
+        "scenarios", nargs="*", help="scenarios to run, all by default"
+    )
+    parser.add_argument("-c", "--connections", type=int, default=16)
+    parser.add_argument(
+        "-d", "--duration", type=float, default=5.0,
+        help="measured seconds per scenario",
+    )
+    parser.add_argument(
+        "-w", "--warmup", type=float, default=1.0,
+        help="seconds of load before measuring",
+    )
+    parser.add_argument(
+        "-m", "--mode", choices=SERVER_MODES, default="threaded",
+        help="server mode",
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path,
+        help="results file, by default in benchmarks/results/",
+    )
+    parser.add_argument(
+        "--compare", type=Path, help="results file of an earlier run"
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="list scenarios and exit"
+    )
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}, see --list")
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    if args.list:
+        for name, scenario in SCENARIOS.items():
+            print(f"{name:20} {scenario.description}")
+        return
+
+    names = args.scenarios or list(SCENARIOS)
+    results = {}
+    for name in names:
+        print(f"{name}: {SCENARIOS[name].description}", flush=True)
+        results[name] = run_scenario(
+            name, args.mode, args.connections, args.duration, args.warmup
+        )
+    print()
+    print_results(results)
+
+    commit, dirty = git_revision()
+    created_at = datetime.now(timezone.utc)
+    report = {
+        "commit": commit + ("-dirty" if dirty else ""),
+        "created_at": created_at.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": {
+            "server_mode": args.mode,
+            "connections": args.connections,
+            "duration": args.duration,
+            "warmup": args.warmup,
+        },
+        "scenarios": results,
+    }
+    output = args.output or RESULTS_DIR / (
+        f"load-{report['commit']}-{created_at:%Y%m%dT%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\nResults saved to {output}")
+
+    if args.compare is not None:
+        print_comparison(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Show that looking up the exchange rate in effect at a moment stays flat
+as the rate history grows, up to tens of millions of rows.
+
+History is appended in steps, one row per pair and minute, and every
+step times GET /exchangeRate/{pair}?at= style lookups of random pairs at
+random moments of the whole history, plus /exchange?at= which reads the
+rates between the pair and the hub, and all rates of that moment only
+for pairs those don't connect.
+
+Run: python -m benchmarks.rate_history [history sizes...]
+"""
+import os
+import random
+import sys
+from decimal import Decimal
+
+# Must come first, it points the app at a temporary database
+from benchmarks.common import (
+    TEMP_DIR,
+    per_call_us,
+    print_table,
+    seed_database,
+)
+
+from app.container import container
+from app.database.db_session import db_session
+from app.exceptions import ApplicationException
+from app.mappers.exchange_rate_mapper import RATE_SCALE
+
+DEFAULT_SIZES = (100_000, 1_000_000, 10_000_000, 30_000_000)
+CURRENCIES = 200
+LOOKUPS = 2000
+EXCHANGE_LOOKUPS = 50
+# 2000-01-01 in Unix milliseconds, history goes forward from it
+HISTORY_START = 946_684_800_000
+STEP_MS = 60_000
+AMOUNT = Decimal("100")
+
+APPEND_HISTORY_QUERY = f"""
+WITH RECURSIVE minute(n) AS (
+    SELECT ? UNION ALL SELECT n + 1 FROM minute WHERE n < ?
+)
+INSERT INTO ExchangeRateHistory
+SELECT er.base_currency_id, er.target_currency_id, ? + n * ?,
+       {RATE_SCALE} * (997 + n % 997) / 997
+FROM ExchangeRates er CROSS JOIN minute
+ORDER BY er.base_currency_id, er.target_currency_id, n;"""
+
+
+def append_history(first_minute: int, last_minute: int) -> None:
+    with db_session() as cursor:
+        cursor.execute(
+            APPEND_HISTORY_QUERY,
+            (first_minute, last_minute, HISTORY_START, STEP_MS),
+        )
+
+
+def history_rows() -> int:
+    with db_session() as cursor:
+        cursor.execute("SELECT count(*) FROM ExchangeRateHistory")
+        return cursor.fetchone()[0]
+
+
+def database_bytes() -> int:
+    with db_session() as cursor:
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return sum(
+        path.stat().st_size
+        for path in TEMP_DIR.iterdir()
+        if path.name.startswith("database.db")
+    )
+
+
+def main() -> None:
+    sizes = sorted(int(arg) for arg in sys.argv[1:]) or DEFAULT_SIZES
+    codes = seed_database(CURRENCIES)
+    service = container.exchange_rates_service
+    pairs = [
+        f"{rate.baseCurrency.code}{rate.targetCurrency.code}"
+        for rate in service.get_exchange_rates()
+    ]
+    rng = random.Random(3)
+
+    rows = []
+    minutes = 0
+    for size in sizes:
+        target_minutes = max(size // len(pairs), minutes + 1)
+        append_history(minutes, target_minutes - 1)
+        minutes = target_minutes
+        end = HISTORY_START + minutes * STEP_MS
+
+        lookups = [
+            (rng.choice(pairs), rng.randrange(HISTORY_START, end))
+            for _ in range(LOOKUPS)
+        ]
+        pair_timings = per_call_us(service.get_exchange_rate, lookups)
+        exchanges = [
+            (*rng.sample(codes, 2), AMOUNT, rng.randrange(HISTORY_START, end))
+            for _ in range(EXCHANGE_LOOKUPS)
+        ]
+        exchange_timings = per_call_us(
+            lambda *args: _try_exchange(service, *args), exchanges
+        )
+        count = history_rows()
+        rows.append([
+            count,
+            database_bytes() / count,
+            pair_timings["mean"],
+            pair_timings["p99"],
+            exchange_timings["mean"] / 1000,
+            exchange_timings["p50"] / 1000,
+        ])
+
+    print_table(
+        ["history rows", "db bytes/row", "pair at us", "p99 us",
+         "exchange at ms", "p50 ms"],
+        rows,
+    )
+    print(f"{len(pairs)} pairs, database at {os.fspath(TEMP_DIR)}")
+
+
+def _try_exchange(service, from_code, to_code, amount, at) -> None:
+    try:
+        service.calculate_exchange(from_code, to_code, amount, at)
+    except ApplicationException:
+        # Pairs without a conversion path cost as much to resolve
+        pass
+
+
+if __name__ == "__main__":
+    main()
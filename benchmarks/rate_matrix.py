@@ -0,0 +1,163 @@
+"""
+Compare exchange rate resolution strategies:
+
+- legacy: the original direct / inverse / USD cross DAO queries
+- graph: RateGraph, resolving paths on demand (default)
+- matrix: precomputed RateMatrix
+
+Run: python -m benchmarks.rate_matrix [sizes...]
+"""
+import sys
+import tracemalloc
+from decimal import Decimal
+
+# Must come first, it points the app at a temporary database
+from benchmarks.common import (
+    HUB_CODE,
+    per_call_us,
+    print_table,
+    sample_pairs,
+    seed_database,
+    timed,
+)
+
+from app.config import config
+from app.container import container
+from app.database.exchange_rate_dao import ExchangeRateDAO
+from app.dtos.update_exchange_rate_dto import UpdateExchangeRateDTO
+from app.services.exchange_rate_service import ExchangeRateService
+from app.services.rate_graph import RateGraph
+from app.services.rate_matrix import RateMatrix
+
+DEFAULT_SIZES = (50, 200, 1000)
+LOOKUPS = 500
+
+
+def legacy_find_best_rate(
+    dao: ExchangeRateDAO, from_code: str, to_code: str
+) -> Decimal | None:
+    """The pre-graph ExchangeRateService._find_best_rate."""
+    direct_view = dao.get_exchange_rate(from_code, to_code)
+    if direct_view:
+        return direct_view.rate
+    inverse_view = dao.get_exchange_rate(to_code, from_code)
+    if inverse_view:
+        return Decimal(1) / inverse_view.rate
+    if from_code != HUB_CODE and to_code != HUB_CODE:
+        from_usd_view = dao.get_exchange_rate(HUB_CODE, from_code)
+        to_usd_view = dao.get_exchange_rate(HUB_CODE, to_code)
+        if from_usd_view and to_usd_view:
+            return to_usd_view.rate / from_usd_view.rate
+    return None
+
+
+def measure_build(build):
+    """Return build time in ms, retained memory in MiB and the result.
+
+    Memory is traced in a separate build, tracing slows allocations down.
+    """
+    seconds, result = timed(build)
+    tracemalloc.start()
+    retained = build()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del retained
+    return seconds * 1000, current / 1024 / 1024, result
+
+
+def run(size: int) -> list[list[object]]:
+    codes = seed_database(size)
+    pairs = sample_pairs(codes, LOOKUPS)
+    service = container.exchange_rates_service
+    dao = container.exchange_rates_dao
+    exchange_rates = service.get_exchange_rates()
+
+    def build_graph() -> RateGraph:
+        return RateGraph(
+            exchange_rates, config.cross_rate_currency,
+            config.rate_graph_max_hops,
+        )
+
+    graph_ms, graph_mb, graph = measure_build(build_graph)
+    matrix_ms, matrix_mb, matrix = measure_build(lambda: RateMatrix(graph))
+
+    legacy = per_call_us(
+        lambda a, b: legacy_find_best_rate(dao, a, b), pairs
+    )
+    graph_cold = per_call_us(graph.find_rate, pairs)
+    graph_warm = per_call_us(graph.find_rate, pairs)
+    matrix_lookup = per_call_us(matrix.find_rate, pairs)
+
+    for from_code, to_code in pairs:
+        assert graph.find_rate(from_code, to_code) == matrix.find_rate(
+            from_code, to_code
+        )
+
+    # PATCH of the busiest pair through the service: the matrix is
+    # updated copy-on-write, against reloading it from the database
+    base, target = HUB_CODE, next(
+        rate.targetCurrency.code
+        for rate in exchange_rates
+        if rate.baseCurrency.code == HUB_CODE
+    )
+    matrix_service = ExchangeRateService(
+        dao,
+        container.currency_dao,
+        container.exchange_rates_mapper,
+        container.currency_mapper,
+        container.response_cache,
+        rate_matrix_enabled=True,
+    )
+    matrix_service.calculate_exchange(base, target, Decimal(1))
+    new_rate = matrix_service.get_exchange_rate(base + target).rate * 2
+    update_s, _updated = timed(
+        lambda: matrix_service.patch_exchange_rate(
+            UpdateExchangeRateDTO(base + target, new_rate)
+        )
+    )
+
+    rebuilt = RateMatrix(
+        RateGraph(
+            service.get_exchange_rates(), config.cross_rate_currency,
+            config.rate_graph_max_hops,
+        )
+    )
+    results = matrix_service.calculate_exchanges(
+        [(from_code, to_code, Decimal(1)) for from_code, to_code in pairs]
+    )
+    for (from_code, to_code), result in zip(pairs, results):
+        rate = getattr(result, "rate", None)
+        assert rate == rebuilt.find_rate(from_code, to_code)
+
+    def reload() -> None:
+        matrix_service.invalidate_cached_rates()
+        matrix_service.calculate_exchange(base, target, Decimal(1))
+
+    rebuild_s, _reloaded = timed(reload)
+
+    return [
+        [size, "legacy", 0.0, 0.0, legacy["mean"], legacy["p99"], "-"],
+        [size, "graph (cold)", graph_ms, graph_mb, graph_cold["mean"],
+         graph_cold["p99"], "-"],
+        [size, "graph (warm)", graph_ms, graph_mb, graph_warm["mean"],
+         graph_warm["p99"], "-"],
+        [size, "matrix", matrix_ms, matrix_mb, matrix_lookup["mean"],
+         matrix_lookup["p99"],
+         f"{update_s * 1000:.1f} / {rebuild_s * 1000:.1f}"],
+    ]
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    rows = []
+    for size in sizes:
+        rows.extend(run(size))
+    print_table(
+        ["currencies", "strategy", "build ms", "memory MiB", "lookup us",
+         "p99 us", "PATCH ms (incr / reload)"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
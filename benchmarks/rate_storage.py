@@ -0,0 +1,94 @@
+"""
+Compare reading and decoding the rows of GET /exchangeRates with rates
+stored as TEXT and parsed with Decimal(str(...)) (before schema version
+2) against scaled INTEGER rates.
+
+Run: python -m benchmarks.rate_storage [currency counts...]
+"""
+import sys
+from decimal import Decimal
+
+# Must come first, it points the app at a temporary database
+from benchmarks.common import print_table, seed_database, timed
+
+from app.database.db_session import db_session
+from app.mappers.exchange_rate_mapper import RATE_UNIT
+
+DEFAULT_SIZES = (1000, 4000, 16000)
+REPEATS = 20
+
+SELECT_QUERY = """SELECT id, base_currency_id, target_currency_id, rate
+FROM {table}"""
+
+
+def copy_as_text() -> None:
+    """Store a copy of the rates in the pre-migration TEXT format."""
+    with db_session() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS ExchangeRatesText")
+        cursor.execute("""
+            CREATE TABLE ExchangeRatesText(
+                id INTEGER PRIMARY KEY,
+                base_currency_id INTEGER NOT NULL,
+                target_currency_id INTEGER NOT NULL,
+                rate TEXT NOT NULL,
+                UNIQUE (base_currency_id, target_currency_id)
+            )""")
+        cursor.execute("SELECT id, base_currency_id, target_currency_id, "
+                       "rate FROM ExchangeRates")
+        cursor.executemany(
+            "INSERT INTO ExchangeRatesText VALUES (?, ?, ?, ?)",
+            [
+                (*row[:3], str((Decimal(row[3]) * RATE_UNIT).normalize()))
+                for row in cursor.fetchall()
+            ],
+        )
+
+
+def fetch(table: str) -> list:
+    with db_session() as cursor:
+        cursor.execute(SELECT_QUERY.format(table=table))
+        return cursor.fetchall()
+
+
+def decode_text(rows: list) -> list[Decimal]:
+    return [Decimal(str(row["rate"])) for row in rows]
+
+
+def decode_integer(rows: list) -> list[Decimal]:
+    return [Decimal(row["rate"]) * RATE_UNIT for row in rows]
+
+
+def best_ms(func, *args) -> float:
+    return min(timed(lambda: func(*args))[0] for _ in range(REPEATS)) * 1000
+
+
+def run(size: int) -> list[list[object]]:
+    seed_database(size, cross_pairs_per_currency=8)
+    copy_as_text()
+    result_rows = []
+    for name, table, decode in (
+        ("TEXT", "ExchangeRatesText", decode_text),
+        ("INTEGER", "ExchangeRates", decode_integer),
+    ):
+        rows = fetch(table)
+        assert decode(rows) == decode_integer(fetch("ExchangeRates"))
+        fetch_ms = best_ms(fetch, table)
+        decode_ms = best_ms(decode, rows)
+        result_rows.append([
+            len(rows), name, fetch_ms, decode_ms, fetch_ms + decode_ms,
+        ])
+    return result_rows
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    rows = []
+    for size in sizes:
+        rows.extend(run(size))
+    print_table(
+        ["rates", "storage", "fetch ms", "decode ms", "total ms"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
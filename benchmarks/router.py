@@ -0,0 +1,118 @@
+"""
+Compare route resolution of the compiled Router against the original
+linear scan over all templates, with hundreds of routes registered.
+
+Run: python -m benchmarks.router [route counts...]
+"""
+import sys
+from collections.abc import Callable
+
+from benchmarks.common import per_call_us, print_table
+
+from app.routing.router import Router
+
+DEFAULT_ROUTE_COUNTS = (10, 100, 500)
+LOOKUPS = 5000
+
+
+class LegacyRouter:
+    """The pre-trie Router: exact match dict, then a scan of templates."""
+
+    def __init__(self) -> None:
+        self.routes: dict[str, dict[str, Callable]] = {
+            "GET": {}, "POST": {}, "PATCH": {},
+        }
+
+    def add_route(self, method: str, path: str, handler: Callable) -> None:
+        self.routes[method][path] = handler
+
+    def resolve(self, method: str, path: str):
+        method_routes = self.routes.get(method, {})
+        if path in method_routes:
+            return method_routes[path], None
+        path_parts = path.split("/")
+        for template, handler in method_routes.items():
+            if "{" not in template:
+                continue
+            template_parts = template.split("/")
+            if len(template_parts) != len(path_parts):
+                continue
+            params = {}
+            for template_part, path_part in zip(template_parts, path_parts):
+                if template_part.startswith("{") and template_part.endswith(
+                    "}"
+                ):
+                    params[template_part.strip("{}")] = path_part
+                elif template_part != path_part:
+                    break
+            else:
+                return handler, params
+        return None, None
+
+
+def build_routes(count: int) -> list[tuple[str, str]]:
+    """Resource style routes: lists, items by code and nested items."""
+    routes = []
+    for index in range(count // 4 + 1):
+        resource = f"/resource{index}"
+        routes += [
+            ("GET", resource),
+            ("POST", resource),
+            ("GET", f"{resource}/{{code}}"),
+            ("PATCH", f"{resource}/{{code}}"),
+        ]
+    return routes[:count]
+
+
+def sample_paths(routes: list[tuple[str, str]]) -> list[tuple[str, str]]:
+    """Requests spread over all templates, plus some misses."""
+    paths = []
+    for index in range(LOOKUPS):
+        method, template = routes[index * 7919 % len(routes)]
+        paths.append((method, template.replace("{code}", "USDEUR")))
+        if index % 10 == 0:
+            paths.append(("GET", f"/missing{index}/USDEUR"))
+    return paths
+
+
+def run(count: int) -> list[list[object]]:
+    routes = build_routes(count)
+    legacy = LegacyRouter()
+    compiled = Router()
+    for method, template in routes:
+        handler = (method, template)
+        legacy.add_route(method, template, handler)
+        compiled.add_route(method, template, handler)
+    compiled.compile()
+
+    paths = sample_paths(routes)
+    for method, path in paths:
+        assert legacy.resolve(method, path) == compiled.resolve(method, path)
+
+    templated = [
+        (m, p) for m, p in paths
+        if "USDEUR" in p and not p.startswith("/missing")
+    ]
+    rows = []
+    for name, router in (("legacy", legacy), ("compiled", compiled)):
+        timings = per_call_us(router.resolve, paths)
+        templated_timings = per_call_us(router.resolve, templated)
+        rows.append([
+            count, name, timings["mean"], timings["p99"],
+            templated_timings["mean"],
+        ])
+    return rows
+
+
+def main() -> None:
+    counts = [int(arg) for arg in sys.argv[1:]] or DEFAULT_ROUTE_COUNTS
+    rows = []
+    for count in counts:
+        rows.extend(run(count))
+    print_table(
+        ["routes", "router", "resolve us", "p99 us", "templated us"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
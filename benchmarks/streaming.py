@@ -0,0 +1,76 @@
+"""
+Compare peak memory and time to first byte of GET /exchangeRates
+rendered as one body against the streamed (?stream=1) response.
+
+Run: python -m benchmarks.streaming [currency counts...]
+"""
+import sys
+import time
+import tracemalloc
+
+# Must come first, it points the app at a temporary database
+from benchmarks.common import print_table, seed_database
+
+from app.container import container
+
+DEFAULT_SIZES = (1000, 4000, 16000)
+
+
+def measure(target: str) -> tuple[int, float, float, float]:
+    """
+    Dispatch the request and consume the body like a socket would.
+    Returns body size, peak MiB, ms to the first byte and total ms.
+    """
+    dispatcher = container.dispatcher
+    tracemalloc.start()
+    start = time.perf_counter()
+    body, _status, _headers = dispatcher.dispatch("GET", target, {})
+    chunks = [body] if isinstance(body, bytes) else body
+    size = 0
+    first_byte = None
+    for chunk in chunks:
+        if first_byte is None:
+            first_byte = time.perf_counter()
+        size += len(chunk)
+    total = time.perf_counter()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (
+        size,
+        peak / 1024 / 1024,
+        ((first_byte or total) - start) * 1000,
+        (total - start) * 1000,
+    )
+
+
+def run(size: int) -> list[list[object]]:
+    seed_database(size, cross_pairs_per_currency=4)
+    rates = len(container.exchange_rates_dao.get_exchange_rates())
+    rows = []
+    for name, target in (
+        ("full", "/exchangeRates"),
+        ("stream", "/exchangeRates?stream=1"),
+    ):
+        body_size, peak, first_byte, total = measure(target)
+        rows.append([
+            rates, name, body_size / 1024 / 1024, peak, first_byte, total,
+        ])
+    return rows
+
+
+def main() -> None:
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    # Measure rendering, not the cached bytes
+    container.response_cache.enabled = False
+    rows = []
+    for size in sizes:
+        rows.extend(run(size))
+    print_table(
+        ["rates", "mode", "body MiB", "peak MiB", "first byte ms",
+         "total ms"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()